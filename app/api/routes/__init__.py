@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from . import schedule, subjects, lessons, teachers, negative_filters, statistics, schedule_api, export, groups, manual
+from . import schedule, subjects, lessons, teachers, negative_filters, statistics, schedule_api, export, groups, manual, imports, bootstrap, events, jobs, metrics
 
 api_router = APIRouter()
 
@@ -15,4 +15,14 @@ api_router.include_router(export.router)
 
 api_router.include_router(groups.router)
 
-api_router.include_router(manual.router)
\ No newline at end of file
+api_router.include_router(manual.router)
+
+api_router.include_router(imports.router)
+
+api_router.include_router(bootstrap.router)
+
+api_router.include_router(events.router)
+
+api_router.include_router(jobs.router)
+
+api_router.include_router(metrics.router)
\ No newline at end of file
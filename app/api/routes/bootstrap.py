@@ -0,0 +1,27 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.services.bootstrap_service import bootstrap_service
+from app.services.data_version_service import data_version_service
+
+router = APIRouter(tags=["bootstrap"])
+
+
+@router.get("/api/bootstrap")
+async def get_bootstrap(
+        response: Response,
+        group_id: int = Query(1, description="ID группы"),
+        lessons_since: Optional[int] = Query(None, ge=0, description="Отдать только изменения уроков после этой версии"),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Все данные страницы группы одним запросом: предметы, уроки, преподаватели,
+    группы, фильтры, статистика и сохраненные расписания"""
+    try:
+        not_modified = await data_version_service.not_modified(if_none_match, response, *bootstrap_service.version_scopes(group_id))
+        if not_modified is not None:
+            return not_modified
+        return jsonable_encoder(await bootstrap_service.get_bundle(group_id, lessons_since))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка загрузки данных: {str(e)}")
@@ -0,0 +1,29 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+
+from app.services.event_hub import event_hub
+
+router = APIRouter(tags=["events"])
+
+
+@router.get("/api/events")
+async def stream_events(group_id: Optional[int] = Query(None, description="ID группы (без параметра - все группы)")):
+    """Поток событий об изменениях (Server-Sent Events).
+
+    Типы событий: lessons, subjects, filters, teachers, groups, saved_schedules,
+    availability (уроки изменились в какой-либо группе), generation, resync
+    (буфер клиента переполнен - нужно перезагрузить данные).
+    """
+    return StreamingResponse(
+        event_hub.stream(group_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/api/debug/events")
+async def events_stats():
+    """Статистика рассылки событий"""
+    return event_hub.get_stats()
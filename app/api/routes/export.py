@@ -1,15 +1,96 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
-from app.services.exel_exporter import excel_exporter
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import Response, StreamingResponse
+from typing import Dict, Optional
+from app.services.exporters import get_exporter, EXPORTERS
+from app.services.export_cache import export_cache, content_hash, etag_matches
 import json
 import urllib.parse
+from datetime import date, datetime, timedelta
 
 router = APIRouter(tags=["export"])
 
+FORMAT_DESCRIPTION = f"Формат: {', '.join(sorted(EXPORTERS))}"
+
+
+def _export_options(export_format: str, start_date: Optional[date], weeks: Optional[int],
+                    stamp: Optional[datetime] = None) -> Dict:
+    """Параметры экспортера (для iCalendar - первая неделя, число повторений и DTSTAMP)"""
+    if export_format != "ics":
+        return {}
+    start_date = start_date or date.today()
+    options = {"start_date": start_date - timedelta(days=start_date.weekday()), "weeks": weeks}
+    if stamp is not None:
+        options["stamp"] = stamp
+    return options
+
+
+def _saved_at(payload_data: Dict) -> Optional[datetime]:
+    """Время сохранения расписания из payload (None, если его нет или формат неверный)"""
+    try:
+        return datetime.fromisoformat(payload_data["saved_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _get_exporter_or_400(export_format: str):
+    try:
+        return get_exporter(export_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/api/export/institution")
+async def export_institution_excel(
+        export_format: str = Query("xlsx", alias="format", description=FORMAT_DESCRIPTION),
+        scope: str = Query("all", pattern="^(all|groups|teachers)$",
+                           description="Листы: all, groups (только группы), teachers (только преподаватели); "
+                                       "для iCalendar all означает groups"),
+        start_date: Optional[date] = Query(None, description="iCalendar: дата первой недели"),
+        weeks: Optional[int] = Query(None, ge=1, le=53, description="iCalendar: число недель")
+):
+    """Экспорт всего учебного заведения: лист на каждую группу и на каждого преподавателя"""
+    exporter = _get_exporter_or_400(export_format)
+    if exporter.format == "ics" and scope == "all":
+        # Листы преподавателей содержат те же уроки, что и листы групп -
+        # в календаре каждое занятие оказалось бы дважды
+        scope = "groups"
+    try:
+        from app.services.schedule_services import schedule_service
+        timetables = await schedule_service.get_institution_timetables()
+
+        sheets = []
+        if scope in ("all", "groups"):
+            sheets += [(name, f"Группа: {name}", lessons) for name, lessons in timetables["groups"]]
+        if scope in ("all", "teachers"):
+            sheets += [(teacher, f"Преподаватель: {teacher}", lessons)
+                       for teacher, lessons in timetables["teachers"]]
+
+        filename = urllib.parse.quote(f"schedule_{datetime.now().strftime('%Y%m%d')}.{exporter.extension}")
+
+        return StreamingResponse(
+            exporter.stream(sheets, **_export_options(exporter.format, start_date, weeks)),
+            media_type=exporter.media_type,
+            headers={
+                "Content-Disposition": f"attachment; filename*=UTF-8''{filename}",
+                "Cache-Control": "no-cache"
+            }
+        )
+
+    except Exception as e:
+        print(f"❌ Ошибка экспорта учебного заведения: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка экспорта: {str(e)}")
+
 
 @router.get("/api/export/schedule/{schedule_id}")
-async def export_schedule_excel(schedule_id: int):
-    """Экспорт сохраненного расписания в Excel"""
+async def export_schedule_excel(
+        schedule_id: int,
+        export_format: str = Query("xlsx", alias="format", description=FORMAT_DESCRIPTION),
+        start_date: Optional[date] = Query(None, description="iCalendar: дата первой недели"),
+        weeks: Optional[int] = Query(None, ge=1, le=53, description="iCalendar: число недель"),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Экспорт сохраненного расписания (XLSX, iCalendar, CSV или NDJSON)"""
+    exporter = _get_exporter_or_400(export_format)
     try:
         # Получаем имя расписания из БД
         from app.db.database import database
@@ -28,29 +109,45 @@ async def export_schedule_excel(schedule_id: int):
         payload_data = json.loads(payload)
         lessons = payload_data.get('lessons', [])
 
-        # Генерируем Excel
-        excel_data = await excel_exporter.export_schedule_to_excel(lessons, schedule_name)
-
         # Формируем имя файла (безопасное для кодировки)
         safe_filename = schedule_name.replace(' ', '_')
         safe_filename = ''.join(c for c in safe_filename if c.isalnum() or c in ('_', '-'))
         if not safe_filename:
             safe_filename = "schedule"
-        filename = f"{safe_filename}.xlsx"
+        filename = f"{safe_filename}.{exporter.extension}"
 
         # Кодируем имя файла для заголовка Content-Disposition
         encoded_filename = urllib.parse.quote(filename)
 
-        return Response(
-            content=excel_data,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
-                "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                "Cache-Control": "no-cache"
-            }
+        # Сохраненное расписание не меняется - готовый файл берем из кэша.
+        # Ключ включает хэш содержимого, поэтому устаревшая запись не отдается.
+        options = _export_options(exporter.format, start_date, weeks, _saved_at(payload_data))
+        cache_key = (schedule_id, content_hash(f"{name}\n{payload}"), exporter.format,
+                     tuple(sorted(options.items())))
+
+        # ETag зависит только от ключа - 304 отдаем без кэша и рендера.
+        # no-cache: браузер хранит файл, но перед использованием сверяет ETag
+        etag = export_cache.make_etag(cache_key)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
+        cached = await export_cache.get(cache_key)
+        if cached is not None:
+            _, data = cached
+            return Response(content=data, media_type=exporter.media_type, headers=headers)
+
+        # Промах: файл отдается потоком и по ходу собирается в кэш
+        sheets = [("Расписание", f"Расписание: {schedule_name}", lessons)]
+        return StreamingResponse(
+            export_cache.tee(cache_key, exporter.stream(sheets, **options)),
+            media_type=exporter.media_type,
+            headers=headers
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Ошибка экспорта: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка экспорта: {str(e)}")
\ No newline at end of file
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
+from app.core.locks import LeaseBusyError
 from app.services.group_service import group_service
+from app.services.data_version_service import data_version_service
 from app.db.models import StudyGroup, StudyGroupCreate
 
 router = APIRouter(tags=["groups"])
@@ -17,10 +19,18 @@ class GroupUpdateRequest(BaseModel):
     name: str
 
 
+class GroupCloneRequest(BaseModel):
+    name: str
+    include_lessons: bool = False
+
+
 @router.get("/api/groups", response_model=List[StudyGroup])
-async def get_all_groups():
+async def get_all_groups(response: Response, if_none_match: Optional[str] = Header(None)):
     """Получить все группы"""
     try:
+        not_modified = await data_version_service.not_modified(if_none_match, response, ("study_groups", 0))
+        if not_modified is not None:
+            return not_modified
         groups = await group_service.get_all_groups()
         return groups
     except Exception as e:
@@ -75,10 +85,43 @@ async def delete_group(group_id: int):
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка удаления группы: {str(e)}")
 
 
+@router.post("/api/groups/{group_id}/clone")
+async def clone_group(group_id: int, request: GroupCloneRequest):
+    """Создать копию группы (предметы и, по желанию, расписание)"""
+    try:
+        if not request.name or not request.name.strip():
+            raise HTTPException(status_code=400, detail="Название группы не может быть пустым")
+
+        result = await group_service.clone_group(group_id, request.name.strip(), request.include_lessons)
+
+        return JSONResponse(
+            status_code=201,
+            content={
+                "success": True,
+                "message": f"Группа '{result['group'].name}' создана",
+                "group": result["group"].model_dump(mode="json"),
+                "subjects_copied": result["subjects_copied"],
+                "lessons_copied": result["lessons_copied"],
+                "lessons_skipped": result["lessons_skipped"]
+            }
+        )
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка копирования группы: {str(e)}")
+
+
 @router.get("/api/groups/{group_id}/exists")
 async def check_group_exists(group_id: int):
     """Проверить существование группы"""
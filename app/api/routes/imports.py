@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi.responses import JSONResponse
+
+from app.services.import_service import import_service
+
+router = APIRouter(tags=["import"])
+
+
+@router.post("/api/import/curriculum")
+async def import_curriculum(
+        file: UploadFile = File(..., description="CSV или XLSX с преподавателями и предметами"),
+        group_id: int = Query(1, description="Группа по умолчанию (если в строке не указана)"),
+        create_teachers: bool = Query(True, description="Создавать отсутствующих преподавателей"),
+        dry_run: bool = Query(False, description="Только проверить файл, ничего не записывая")
+):
+    """Массовый импорт преподавателей и предметов из CSV/XLSX"""
+    try:
+        result = await import_service.import_curriculum(
+            file.filename, file.file,
+            group_id=group_id,
+            create_teachers=create_teachers,
+            dry_run=dry_run
+        )
+
+        # Строки с ошибками не прерывают импорт - они перечислены в result["errors"]
+        return JSONResponse(status_code=200, content=result)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Ошибка импорта: {e}")
+        raise HTTPException(status_code=500, detail=f"Ошибка импорта: {str(e)}")
+    finally:
+        await file.close()
@@ -0,0 +1,76 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.job_service import job_service, JobConflictError, MAX_GENERATION_ATTEMPTS
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.post("/api/jobs/generate", status_code=202)
+async def submit_generation_job(
+        group_id: int = Query(1, description="ID группы"),
+        attempts: int = Query(1, ge=1, le=MAX_GENERATION_ATTEMPTS, description="Число попыток расстановки")
+):
+    """Запустить генерацию расписания в фоне. Возвращает задачу (id, status)"""
+    try:
+        return await job_service.submit_generation(group_id, attempts)
+    except JobConflictError as e:
+        return JSONResponse(status_code=409, content={"detail": str(e), "job_id": e.job_id})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/api/jobs")
+async def list_jobs(
+        group_id: Optional[int] = Query(None, description="ID группы"),
+        limit: int = Query(20, ge=1, le=200)
+):
+    """Последние задачи"""
+    return await job_service.list_jobs(group_id, limit)
+
+
+@router.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Состояние задачи: status, progress (phase, attempt, pairs_placed, best_score)"""
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+
+@router.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Результат завершенной задачи (сгенерированные уроки)"""
+    job = await job_service.get_job(job_id, include_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Задача не завершена успешно (статус: {job['status']})")
+    return job["result"]
+
+
+@router.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Прогресс задачи потоком Server-Sent Events (поток закрывается по завершении)"""
+    job = await job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return StreamingResponse(
+        job_service.stream_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Отменить задачу (срабатывает между попытками расстановки)"""
+    try:
+        job = await job_service.cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
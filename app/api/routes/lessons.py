@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Form, HTTPException, Query
+from fastapi import APIRouter, Form, Header, HTTPException, Query, Response
 from fastapi.responses import RedirectResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import traceback
 
+from app.core.locks import LeaseBusyError
 from app.services.schedule_services import schedule_service
+from app.services.data_version_service import data_version_service
 from app.db.models import Lesson
 
 router = APIRouter(tags=["lessons"])
@@ -28,9 +30,16 @@ class LessonResponse(BaseModel):
 
 
 @router.get("/api/lessons", response_model=List[LessonResponse])
-async def get_all_lessons(group_id: int = Query(1, description="ID группы")):
-    """Получить все уроки группы"""
+async def get_all_lessons(
+        response: Response,
+        group_id: int = Query(1, description="ID группы"),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Получить все уроки группы (ETag по версии уроков группы)"""
     try:
+        not_modified = await data_version_service.not_modified(if_none_match, response, ("lessons", group_id))
+        if not_modified is not None:
+            return not_modified
         lessons = await schedule_service.get_all_lessons(group_id)
         return lessons
     except Exception as e:
@@ -40,6 +49,25 @@ async def get_all_lessons(group_id: int = Query(1, description="ID группы"
         )
 
 
+@router.get("/api/lessons/changes")
+async def get_lesson_changes(
+        group_id: int = Query(1, description="ID группы"),
+        since: int = Query(0, ge=0, description="Версия последней синхронизации (0 - все уроки)")
+):
+    """Изменения уроков группы после версии since: inserted, updated, deleted (ID).
+
+    Ответ содержит version - ее нужно передать в since при следующем запросе.
+    При reset=True клиент должен заменить свои уроки списком inserted.
+    """
+    try:
+        return await schedule_service.get_lesson_changes(group_id, since)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка получения изменений уроков: {str(e)}"
+        )
+
+
 # @router.post("/remove-lesson")
 # async def remove_lesson_old(day: int = Form(...), time_slot: int = Form(...)):
 #     """Старый эндпоинт для обратной совместимости (HTML формы)"""
@@ -59,6 +87,8 @@ async def remove_lesson(day: int = Form(...), time_slot: int = Form(...)):
         if not success:
             raise HTTPException(status_code=404, detail="Lesson not found")
         return RedirectResponse(url="/", status_code=303)
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -88,6 +118,8 @@ async def remove_lesson_api(
 
     except HTTPException:
         raise
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"❌ Ошибка удаления урока: {e}")
         raise HTTPException(
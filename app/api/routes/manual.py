@@ -1,11 +1,11 @@
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Literal, Optional
 
-from app.db import database
+from app.core.locks import locks, LeaseBusyError
+from app.db.database import database
 from app.services.manual_schedule_service import manual_schedule_service
-from app.services.subject_services import subject_service
 
 router = APIRouter(tags=["manual-schedule"])
 
@@ -26,6 +26,30 @@ class UpdateLessonRequest(BaseModel):
     new_subject_name: str = Field(..., min_length=1, max_length=100, description="Новое название предмета")
 
 
+class MoveLessonRequest(BaseModel):
+    """Запрос на перенос или обмен пар"""
+    day: int = Field(..., ge=0, le=6, description="День исходной ячейки (0-6)")
+    time_slot: int = Field(..., ge=0, le=3, description="Слот исходной ячейки (0-3)")
+    to_day: int = Field(..., ge=0, le=6, description="День целевой ячейки (0-6)")
+    to_time_slot: int = Field(..., ge=0, le=3, description="Слот целевой ячейки (0-3)")
+
+
+class BatchOperation(BaseModel):
+    """Одна операция пакетного редактирования"""
+    op: Literal["add", "move", "swap", "delete"] = Field(..., description="Тип операции")
+    day: int = Field(..., ge=0, le=6, description="День недели (0-6)")
+    time_slot: int = Field(..., ge=0, le=3, description="Временной слот (0-3)")
+    teacher: Optional[str] = Field(None, min_length=1, max_length=100, description="Преподаватель (для add)")
+    subject_name: Optional[str] = Field(None, min_length=1, max_length=100, description="Предмет (для add)")
+    to_day: Optional[int] = Field(None, ge=0, le=6, description="Целевой день (для move/swap)")
+    to_time_slot: Optional[int] = Field(None, ge=0, le=3, description="Целевой слот (для move/swap)")
+
+
+class BatchRequest(BaseModel):
+    """Пакет операций, применяемых атомарно"""
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=200)
+
+
 @router.post("/api/manual/lessons")
 async def add_lesson_manually(
         request: AddLessonRequest,
@@ -54,6 +78,8 @@ async def add_lesson_manually(
 
     except HTTPException:
         raise
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -70,62 +96,52 @@ async def delete_lesson_manually(
         group_id: int = Query(1, description="ID группы")
 ):
     """Удалить пару вручную"""
-    try:
-        print(f"🗑️ Ручное удаление пары: день={day}, слот={time_slot}, группа={group_id}")
+    async with locks.group(group_id):
+        try:
+            print(f"🗑️ Ручное удаление пары: день={day}, слот={time_slot}, группа={group_id}")
+
+            # 1. Получаем удаляемый урок
+            lesson = await database.fetch_one(
+                'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
+                (day, time_slot, group_id)
+            )
 
-        # 1. Получаем удаляемый урок
-        lesson = await database.fetch_one(
-            'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-            (day, time_slot, group_id)
-        )
+            if not lesson:
+                raise HTTPException(
+                    status_code=404,
+                    detail="Урок не найден"
+                )
 
-        if not lesson:
-            raise HTTPException(
-                status_code=404,
-                detail="Урок не найден"
-            )
+            teacher, subject_name = lesson
 
-        teacher, subject_name = lesson
-
-        # 2. Восстанавливаем часы предмета
-        subject = await subject_service.get_subject_by_name(teacher, subject_name, group_id)
-        if subject:
-            await database.execute(
-                '''UPDATE subjects 
-                   SET remaining_hours = remaining_hours + 2,
-                       remaining_pairs = (remaining_hours + 2) / 2
-                   WHERE id = ?''',
-                (subject.id,)
+            # 2. Удаляем урок (часы предмета восстановит триггер)
+            result = await database.execute(
+                'DELETE FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
+                (day, time_slot, group_id)
             )
 
-        # 3. Удаляем урок
-        result = await database.execute(
-            'DELETE FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-            (day, time_slot, group_id)
-        )
+            if result.rowcount == 0:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Не удалось удалить урок"
+                )
 
-        if result.rowcount == 0:
+            return JSONResponse(
+                status_code=200,
+                content={
+                    "success": True,
+                    "message": "Пара успешно удалена"
+                }
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
             raise HTTPException(
                 status_code=500,
-                detail="Не удалось удалить урок"
+                detail=f"Ошибка удаления пары: {str(e)}"
             )
 
-        return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
-                "message": "Пара успешно удалена"
-            }
-        )
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Ошибка удаления пары: {str(e)}"
-        )
-
 
 @router.patch("/api/manual/lessons")
 async def update_lesson_manually(
@@ -164,6 +180,8 @@ async def update_lesson_manually(
 
     except HTTPException:
         raise
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"💥 Неожиданная ошибка: {e}")
         import traceback
@@ -175,6 +193,94 @@ async def update_lesson_manually(
     finally:
         print("=" * 50)
 
+@router.post("/api/manual/lessons/move")
+async def move_lesson_manually(
+        request: MoveLessonRequest,
+        group_id: int = Query(1, description="ID группы")
+):
+    """Перенести пару в свободную ячейку"""
+    try:
+        result = await manual_schedule_service.move_lesson(
+            day=request.day,
+            time_slot=request.time_slot,
+            to_day=request.to_day,
+            to_time_slot=request.to_time_slot,
+            group_id=group_id
+        )
+
+        if result["success"]:
+            return JSONResponse(status_code=200, content=result)
+        raise HTTPException(status_code=400, detail=result["message"])
+
+    except HTTPException:
+        raise
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка переноса пары: {str(e)}"
+        )
+
+
+@router.post("/api/manual/lessons/swap")
+async def swap_lessons_manually(
+        request: MoveLessonRequest,
+        group_id: int = Query(1, description="ID группы")
+):
+    """Поменять местами две пары"""
+    try:
+        result = await manual_schedule_service.swap_lessons(
+            day=request.day,
+            time_slot=request.time_slot,
+            to_day=request.to_day,
+            to_time_slot=request.to_time_slot,
+            group_id=group_id
+        )
+
+        if result["success"]:
+            return JSONResponse(status_code=200, content=result)
+        raise HTTPException(status_code=400, detail=result["message"])
+
+    except HTTPException:
+        raise
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка обмена пар: {str(e)}"
+        )
+
+
+@router.post("/api/manual/batch")
+async def apply_batch(
+        request: BatchRequest,
+        group_id: int = Query(1, description="ID группы"),
+        dry_run: bool = Query(False, description="Только проверить, не применяя")
+):
+    """Применить пакет операций add/move/swap/delete одной транзакцией"""
+    try:
+        result = await manual_schedule_service.apply_batch(
+            group_id=group_id,
+            operations=[operation.model_dump() for operation in request.operations],
+            dry_run=dry_run
+        )
+
+        return JSONResponse(
+            status_code=200 if result["success"] else 409,
+            content=result
+        )
+
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка пакетного редактирования: {str(e)}"
+        )
+
+
 @router.get("/api/manual/check-availability")
 async def check_availability(
         teacher: str = Query(..., description="Преподаватель"),
@@ -207,6 +313,52 @@ async def check_availability(
         )
 
 
+@router.get("/api/manual/check-slot")
+async def check_slot(
+        teacher: str = Query(..., description="Преподаватель"),
+        day: int = Query(..., ge=0, le=6, description="День недели"),
+        time_slot: int = Query(..., ge=0, le=3, description="Временной слот"),
+        subject_name: Optional[str] = Query(None, description="Название предмета"),
+        group_id: int = Query(1, description="ID группы")
+):
+    """Полная проверка ячейки одним запросом: преподаватель, предмет, занятость слота"""
+    try:
+        return await manual_schedule_service.check_slot(
+            teacher=teacher,
+            subject_name=subject_name,
+            day=day,
+            time_slot=time_slot,
+            group_id=group_id
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка проверки ячейки: {str(e)}"
+        )
+
+
+@router.get("/api/manual/availability-matrix")
+async def get_availability_matrix(
+        group_id: int = Query(1, description="ID группы"),
+        teacher: Optional[str] = Query(None, description="Преподаватель (по умолчанию - все)"),
+        subject_name: Optional[str] = Query(None, description="Название предмета (по умолчанию - все)")
+):
+    """Матрица доступности день × слот для предмета или всех предметов группы"""
+    try:
+        return await manual_schedule_service.get_availability_matrix(
+            group_id=group_id,
+            teacher=teacher,
+            subject_name=subject_name
+        )
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Ошибка построения матрицы доступности: {str(e)}"
+        )
+
+
 @router.get("/api/manual/available-subjects")
 async def get_available_subjects(
         group_id: int = Query(1, description="ID группы")
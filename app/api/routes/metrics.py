@@ -0,0 +1,71 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.executors import executors
+from app.core.locks import locks
+from app.core.metrics import metrics
+from app.db.database import database
+from app.services.event_hub import event_hub
+from app.services.export_cache import export_cache
+from app.services.job_service import job_service
+from app.services.subject_services import subject_service
+
+router = APIRouter(tags=["metrics"])
+
+# Значения, которые читаются из сервисов в момент запроса
+_pool_connections = metrics.gauge('schedule_db_pool_connections', 'Соединения пула БД по состоянию', ('state',))
+_pool_size = metrics.gauge('schedule_db_pool_size', 'Максимум соединений пула БД')
+_pool_waiting = metrics.gauge('schedule_db_pool_waiting', 'Запросы, ожидающие соединение пула БД')
+_cache_hits = metrics.counter('schedule_cache_hits_total', 'Попадания в кэш', ('cache',))
+_cache_misses = metrics.counter('schedule_cache_misses_total', 'Промахи кэша', ('cache',))
+_cache_hit_ratio = metrics.gauge('schedule_cache_hit_ratio', 'Доля попаданий в кэш с момента запуска', ('cache',))
+_executor_queue = metrics.gauge('schedule_executor_queue_depth', 'Задачи в очереди пула вычислений', ('pool',))
+_executor_running = metrics.gauge('schedule_executor_running', 'Выполняемые задачи пула вычислений', ('pool',))
+_lock_waiting = metrics.gauge('schedule_lock_waiting', 'Задачи, ожидающие блокировку', ('lock',))
+_lock_contended = metrics.counter('schedule_lock_contended_total', 'Захваты блокировки с ожиданием', ('lock',))
+_sse_subscribers = metrics.gauge('schedule_sse_subscribers', 'Открытые потоки событий SSE')
+_jobs_running = metrics.gauge('schedule_jobs_running', 'Фоновые задачи, выполняемые этим процессом')
+
+
+def _collect():
+    pool = database.get_pool_stats()
+    _pool_connections.set(pool["in_use"], state="in_use")
+    _pool_connections.set(pool["idle"], state="idle")
+    _pool_size.set(pool["size"])
+    _pool_waiting.set(pool["waiting"])
+
+    caches = {
+        "subjects": subject_service.get_cache_stats(),
+        "exports": export_cache.get_stats()
+    }
+    for name, stats in caches.items():
+        hits = stats["hits"] + stats.get("disk_hits", 0)
+        _cache_hits.set_total(hits, cache=name)
+        _cache_misses.set_total(stats["misses"], cache=name)
+        _cache_hit_ratio.set(stats["hit_rate"], cache=name)
+
+    for pool_name, stats in executors.get_stats().items():
+        _executor_queue.set(stats["queue_depth"], pool=pool_name)
+        _executor_running.set(stats["running"], pool=pool_name)
+
+    # Блокировки групп агрегируем, чтобы число рядов не росло с числом групп
+    waiting, contended = {}, {}
+    for name, stats in locks.get_stats().items():
+        kind = name.split(':', 1)[0]
+        waiting[kind] = waiting.get(kind, 0) + stats["waiting"]
+        contended[kind] = contended.get(kind, 0) + stats["contended"]
+    for kind in waiting:
+        _lock_waiting.set(waiting[kind], lock=kind)
+        _lock_contended.set_total(contended[kind], lock=kind)
+
+    _sse_subscribers.set(event_hub.get_stats()["subscribers"])
+    _jobs_running.set(job_service.get_stats()["running"])
+
+
+metrics.add_collector(_collect)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Form, Query
+from fastapi import APIRouter, HTTPException, Form, Header, Query, Response
 from fastapi.responses import JSONResponse, RedirectResponse
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 from app.services.negative_filters_service import negative_filters_service
+from app.services.data_version_service import data_version_service
 
 router = APIRouter(tags=["negative-filters"])
 
@@ -36,9 +37,12 @@ async def add_negative_filter_api(request: NegativeFilterRequest):
 
 
 @router.get("/api/negative-filters")
-async def get_negative_filters_api():
+async def get_negative_filters_api(response: Response, if_none_match: Optional[str] = Header(None)):
     """Получить ВСЕ глобальные ограничения"""
     try:
+        not_modified = await data_version_service.not_modified(if_none_match, response, ("negative_filters", 0))
+        if not_modified is not None:
+            return not_modified
         filters = await negative_filters_service.get_negative_filters()
         print(f"✅ API: Отправлено {len(filters)} глобальных фильтров")
         return filters
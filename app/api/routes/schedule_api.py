@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from fastapi.responses import JSONResponse
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
 import json
 
+from app.core.locks import leases, LeaseBusyError
 from app.services.schedule_services import schedule_service
+from app.services.data_version_service import data_version_service
 from app.db.database import database
 from app.db.models import Lesson
 
@@ -63,8 +65,9 @@ async def generate_schedule(group_id: int = Query(1, description="ID групп
 
         print(f"⚡ Генерация расписания для группы {group_id}")
 
-        # Генерируем расписание
-        lessons = await schedule_generator.generate_schedule(group_id)
+        # Генерируем расписание (генерацию группы в другом процессе исключает аренда)
+        async with leases.hold(f"generate:{group_id}", "Для группы уже выполняется генерация"):
+            lessons = await schedule_generator.generate_schedule(group_id)
 
         # Конвертируем в словари для JSON
         lessons_data = []
@@ -86,6 +89,8 @@ async def generate_schedule(group_id: int = Query(1, description="ID групп
             message=f"Сгенерировано {len(lessons)} пар для группы {group_id}"
         )
 
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"❌ Ошибка генерации расписания: {e}")
         import traceback
@@ -97,35 +102,18 @@ async def generate_schedule(group_id: int = Query(1, description="ID групп
 
 
 @router.get("/api/schedules", response_model=List[SavedScheduleResponse])
-async def get_saved_schedules(group_id: int = Query(1, description="ID группы")):
+async def get_saved_schedules(
+        response: Response,
+        group_id: int = Query(1, description="ID группы"),
+        if_none_match: Optional[str] = Header(None)
+):
     """Получить список сохраненных расписаний группы"""
     try:
-        rows = await database.fetch_all('''
-            SELECT id, name, created_at, payload 
-            FROM saved_schedules 
-            WHERE group_id = ?
-            ORDER BY created_at DESC
-        ''', (group_id,))
-
-        schedules = []
-        for row in rows:
-            id, name, created_at, payload = row
-            lesson_count = 0
-
-            try:
-                payload_data = json.loads(payload)
-                lesson_count = len(payload_data.get("lessons", []))
-            except:
-                pass
-
-            schedules.append(SavedScheduleResponse(
-                id=id,
-                name=name,
-                created_at=created_at,
-                lesson_count=lesson_count
-            ))
-
-        return schedules
+        not_modified = await data_version_service.not_modified(if_none_match, response, ("saved_schedules", group_id))
+        if not_modified is not None:
+            return not_modified
+        schedules = await schedule_service.get_saved_schedules(group_id)
+        return [SavedScheduleResponse(**schedule) for schedule in schedules]
 
     except Exception as e:
         raise HTTPException(
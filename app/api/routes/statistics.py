@@ -2,8 +2,9 @@ from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-from app.db import database
+from app.core.locks import LeaseBusyError
 from app.services.schedule_services import schedule_service
+from app.services.subject_services import subject_service
 
 router = APIRouter(tags=["statistics"])
 
@@ -27,40 +28,21 @@ async def get_statistics(group_id: int = Query(1, description="ID группы")
         raise HTTPException(status_code=500, detail=f"Ошибка получения статистики: {str(e)}")
 
 
+@router.get("/api/statistics/all")
+async def get_all_statistics():
+    """Сводная статистика по всем группам и по учебному заведению"""
+    try:
+        return await schedule_service.get_all_statistics()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения сводной статистики: {str(e)}")
+
+
 @router.post("/api/statistics/recalculate")
 async def recalculate_statistics(group_id: int = Query(1, description="ID группы")):
     """Пересчитать статистику часов для группы"""
     try:
-        # Пересчитываем оставшиеся часы на основе запланированных пар
-        lessons = await database.fetch_all(
-            'SELECT teacher, subject_name, COUNT(*) as count FROM lessons WHERE group_id = ? GROUP BY teacher, subject_name',
-            (group_id,)
-        )
-
-        # Сбрасываем все часы к исходным значениям
-        await database.execute(
-            '''UPDATE subjects 
-               SET remaining_hours = total_hours,
-                   remaining_pairs = total_hours / 2 
-               WHERE group_id = ?''',
-            (group_id,)
-        )
-
-        # Вычитаем часы для запланированных пар
-        for lesson in lessons:
-            teacher, subject_name, count = lesson
-            hours_to_subtract = count * 2
-
-            result = await database.execute(
-                '''UPDATE subjects 
-                   SET remaining_hours = remaining_hours - ?, 
-                       remaining_pairs = remaining_pairs - ? 
-                   WHERE teacher = ? AND subject_name = ? AND group_id = ?''',
-                (hours_to_subtract, count, teacher, subject_name, group_id)
-            )
-
-            if result.rowcount == 0:
-                print(f"⚠️ Предмет не найден: {teacher} - {subject_name} в группе {group_id}")
+        # Часы поддерживают триггеры; здесь - принудительная сверка по урокам
+        await subject_service.reconcile_hours(group_id)
 
         # Получаем обновленную статистику
         stats = await schedule_service.get_statistics(group_id)
@@ -73,6 +55,8 @@ async def recalculate_statistics(group_id: int = Query(1, description="ID гру
                 "statistics": stats
             }
         )
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка пересчета статистики: {str(e)}")
 
@@ -83,55 +67,11 @@ async def fix_hours_calculation(group_id: int = Query(1, description="ID гру
     try:
         print(f"🔧 Исправление расчета часов для группы {group_id}")
 
-        # 1. Сбрасываем все часы к исходным значениям
-        await database.execute(
-            '''UPDATE subjects 
-               SET remaining_hours = total_hours,
-                   remaining_pairs = total_hours / 2 
-               WHERE group_id = ?''',
-            (group_id,)
-        )
-
-        # 2. Считаем сколько пар запланировано для каждого предмета
-        lessons = await database.fetch_all(
-            '''SELECT teacher, subject_name, COUNT(*) as pair_count 
-               FROM lessons 
-               WHERE group_id = ? 
-               GROUP BY teacher, subject_name''',
-            (group_id,)
-        )
+        # 1. Пересчитываем часы по фактически запланированным парам
+        updated = await subject_service.reconcile_hours(group_id)
+        print(f"📝 Пересчитано предметов: {updated}")
 
-        print(f"📊 Найдено запланированных пар: {len(lessons)}")
-
-        # 3. Вычитаем часы для запланированных пар
-        for lesson in lessons:
-            teacher, subject_name, pair_count = lesson
-            hours_to_subtract = pair_count * 2  # 2 часа на пару
-
-            # Находим предмет
-            subject = await database.fetch_one(
-                '''SELECT id, remaining_hours, total_hours 
-                   FROM subjects 
-                   WHERE teacher = ? AND subject_name = ? AND group_id = ?''',
-                (teacher, subject_name, group_id)
-            )
-
-            if subject:
-                subject_id, current_hours, total_hours = subject
-                new_hours = max(0, current_hours - hours_to_subtract)
-                new_pairs = new_hours // 2
-
-                await database.execute(
-                    '''UPDATE subjects 
-                       SET remaining_hours = ?,
-                           remaining_pairs = ?
-                       WHERE id = ?''',
-                    (new_hours, new_pairs, subject_id)
-                )
-
-                print(f"📝 {teacher} - {subject_name}: было {current_hours}ч, стало {new_hours}ч ({pair_count} пар)")
-
-        # 4. Получаем обновленную статистику
+        # 2. Получаем обновленную статистику
         stats = await schedule_service.get_statistics(group_id)
 
         return JSONResponse(
@@ -142,6 +82,8 @@ async def fix_hours_calculation(group_id: int = Query(1, description="ID гру
                 "statistics": stats
             }
         )
+    except LeaseBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"❌ Ошибка исправления часов: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка исправления часов: {str(e)}")
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Form, Query
+from fastapi import APIRouter, HTTPException, Form, Header, Query, Response
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 from app.db.database import database
 from app.services.subject_services import subject_service
+from app.services.data_version_service import data_version_service
 
 router = APIRouter(tags=["subjects"])
 
@@ -32,9 +33,16 @@ class SubjectCreateRequest(BaseModel):
 
 # app/api/routes/subjects.py
 @router.get("/api/subjects", response_model=List[SubjectResponse])
-async def get_all_subjects(group_id: int = Query(1, description="ID группы")):
-    """Получить все уникальные предметы"""
+async def get_all_subjects(
+        response: Response,
+        group_id: int = Query(1, description="ID группы"),
+        if_none_match: Optional[str] = Header(None)
+):
+    """Получить все уникальные предметы (ETag по версии предметов группы)"""
     try:
+        not_modified = await data_version_service.not_modified(if_none_match, response, ("subjects", group_id))
+        if not_modified is not None:
+            return not_modified
         print(f"📚 API: Запрос предметов для группы {group_id}")
 
         subjects = await subject_service.get_all_subjects(group_id)
@@ -289,3 +297,14 @@ async def debug_subjects(group_id: int):
         }
     except Exception as e:
         return {"error": str(e)}
+
+
+@router.get("/api/debug/cache")
+async def debug_cache():
+    """Отладочный эндпоинт: статистика кэшей"""
+    from app.services.export_cache import export_cache
+    return {
+        "subjects": subject_service.get_cache_stats(),
+        "exports": export_cache.get_stats(),
+        "data_versions": data_version_service.get_stats()
+    }
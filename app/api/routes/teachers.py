@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
 from fastapi.responses import JSONResponse
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 from app.services.teacher_service import teacher_service
+from app.services.data_version_service import data_version_service
 from app.db.models import Teacher
 
 router = APIRouter(tags=["teachers"])
@@ -61,6 +62,29 @@ async def update_teacher(teacher_id: int, request: TeacherCreateRequest):
         raise HTTPException(status_code=400, detail=f"Ошибка обновления преподавателя: {str(e)}")
 
 
+@router.get("/api/teachers/timetables")
+async def get_all_teacher_timetables():
+    """Расписания всех преподавателей по всем группам (сетка день × пара)"""
+    try:
+        return {"timetables": await teacher_service.get_all_timetables()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения расписаний преподавателей: {str(e)}")
+
+
+@router.get("/api/teachers/{teacher_id}/timetable")
+async def get_teacher_timetable(teacher_id: int):
+    """Расписание преподавателя по всем группам (сетка день × пара)"""
+    try:
+        timetable = await teacher_service.get_timetable(teacher_id)
+        if not timetable:
+            raise HTTPException(status_code=404, detail="Преподаватель не найден")
+        return timetable
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка получения расписания преподавателя: {str(e)}")
+
+
 @router.get("/api/teachers/{teacher_id}", response_model=TeacherResponse)
 async def get_teacher(teacher_id: int):
     """Получить преподавателя по ID"""
@@ -105,9 +129,12 @@ async def delete_teacher(teacher_id: int):
 
 
 @router.get("/api/teachers", response_model=List[TeacherResponse])
-async def get_teachers():
+async def get_teachers(response: Response, if_none_match: Optional[str] = Header(None)):
     """Получить всех преподавателей (ГЛОБАЛЬНО - для всех групп)"""
     try:
+        not_modified = await data_version_service.not_modified(if_none_match, response, ("teachers", 0))
+        if not_modified is not None:
+            return not_modified
         teachers = await teacher_service.get_all_teachers()
         return [
             TeacherResponse(
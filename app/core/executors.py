@@ -0,0 +1,143 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+# Размеры пулов (переопределяются переменными окружения)
+IO_THREADS = int(os.getenv("SCHEDULE_IO_THREADS", "4"))
+CPU_PROCESSES = int(os.getenv("SCHEDULE_CPU_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+
+class _PoolStats:
+    """Счетчики одного пула: очередь, выполнение, время ожидания и работы"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.running = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def as_dict(self) -> Dict:
+        finished = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "running": self.running,
+            "avg_wait_ms": round(self.wait_seconds / finished * 1000, 2) if finished else 0.0,
+            "avg_run_ms": round(self.run_seconds / finished * 1000, 2) if finished else 0.0
+        }
+
+
+class ExecutorManager:
+    """Общие пулы для CPU-нагрузки, чтобы она не блокировала event loop.
+
+    - thread: пул потоков для openpyxl и другой работы, отпускающей GIL на I/O;
+    - process: пул процессов для генерации расписания (чистые функции).
+
+    Число одновременно выполняемых задач ограничено семафором на пул,
+    ожидающие задачи учитываются как глубина очереди.
+    """
+
+    def __init__(self, io_threads: int = IO_THREADS, cpu_processes: int = CPU_PROCESSES):
+        self._io_threads = max(1, io_threads)
+        self._cpu_processes = max(1, cpu_processes)
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[Executor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats = {
+            "thread": _PoolStats("thread", self._io_threads),
+            "process": _PoolStats("process", self._cpu_processes),
+        }
+
+    def _get_pool(self, kind: str) -> Executor:
+        if kind == "thread":
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self._io_threads, thread_name_prefix="schedule-io"
+                )
+            return self._thread_pool
+
+        if self._process_pool is None:
+            try:
+                # spawn: дочерние процессы не наследуют потоки aiosqlite и открытые соединения
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self._cpu_processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, NotImplementedError) as e:
+                print(f"⚠️ Пул процессов недоступен ({e}), используем пул потоков")
+                self._process_pool = self._get_pool("thread")
+        return self._process_pool
+
+    def _get_semaphore(self, kind: str) -> asyncio.Semaphore:
+        if kind not in self._semaphores:
+            self._semaphores[kind] = asyncio.Semaphore(self._stats[kind].limit)
+        return self._semaphores[kind]
+
+    async def _run(self, kind: str, func: Callable, *args) -> Any:
+        stats = self._stats[kind]
+        stats.submitted += 1
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        queued_at = time.perf_counter()
+
+        semaphore = self._get_semaphore(kind)
+        try:
+            await semaphore.acquire()
+        finally:
+            stats.waiting -= 1
+
+        started_at = time.perf_counter()
+        stats.wait_seconds += started_at - queued_at
+        stats.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_pool(kind), func, *args)
+            stats.completed += 1
+            return result
+        except BaseException:
+            stats.failed += 1
+            raise
+        finally:
+            stats.running -= 1
+            stats.run_seconds += time.perf_counter() - started_at
+            semaphore.release()
+
+    async def run_in_thread(self, func: Callable, *args) -> Any:
+        """Выполнить функцию в пуле потоков"""
+        return await self._run("thread", func, *args)
+
+    async def run_in_process(self, func: Callable, *args) -> Any:
+        """Выполнить функцию в пуле процессов (функция и аргументы должны сериализоваться pickle)"""
+        return await self._run("process", func, *args)
+
+    def get_stats(self) -> Dict:
+        """Метрики пулов"""
+        return {kind: stats.as_dict() for kind, stats in self._stats.items()}
+
+    def shutdown(self):
+        """Остановить пулы (при завершении приложения)"""
+        if self._process_pool is not None and self._process_pool is not self._thread_pool:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        self._process_pool = None
+        self._thread_pool = None
+        self._semaphores.clear()
+
+
+# Глобальный экземпляр
+executors = ExecutorManager()
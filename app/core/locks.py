@@ -0,0 +1,315 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, FrozenSet, List, Optional
+
+from app.core.tracing import tracer
+from app.db.database import database, SCHEMA_READY_ENV
+
+
+# Срок межпроцессной аренды; владелец продлевает ее каждую треть срока
+LEASE_TTL_SECONDS = float(os.getenv("SCHEDULE_LEASE_TTL_SECONDS", "30"))
+
+# Приложение запущено несколькими процессами на одном файле базы. Только тогда
+# изменения группы берут аренду в базе: в одном процессе хватает блокировки
+# процесса, а лишние записи в locks сбрасывали бы кэши, привязанные к
+# PRAGMA data_version
+MULTI_PROCESS = int(os.getenv("SCHEDULE_WORKERS", "1")) > 1 or os.getenv(SCHEMA_READY_ENV) == "1"
+
+# Сколько ждать аренды группы, занятой другим процессом (например, генерацией)
+GROUP_LEASE_WAIT_SECONDS = float(os.getenv("SCHEDULE_GROUP_LEASE_WAIT_SECONDS", "120"))
+
+# Период повторных попыток взять занятую аренду
+LEASE_POLL_SECONDS = 0.2
+
+# Идентификатор этого процесса - владельца аренд
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Блокировки, уже удерживаемые текущей задачей (для повторного входа)
+_held_locks: ContextVar[FrozenSet[str]] = ContextVar("held_locks", default=frozenset())
+
+GLOBAL_LOCK = "global"
+
+
+class _LockStats:
+    """Счетчики одной блокировки: захваты, ожидание и удержание"""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.waiting = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.held_seconds = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "waiting": self.waiting,
+            "avg_wait_ms": round(self.wait_seconds / self.acquisitions * 1000, 2) if self.acquisitions else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "held_ms": round(self.held_seconds * 1000, 2)
+        }
+
+
+class _SharedExclusiveLock:
+    """Блокировка с разделяемым и монопольным режимами.
+
+    Ожидающий монопольный захват блокирует новые разделяемые, чтобы
+    операции над всеми группами не ждали бесконечно.
+    """
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+
+    def is_free(self, exclusive: bool) -> bool:
+        if exclusive:
+            return not self._exclusive and self._shared == 0
+        return not self._exclusive and self._exclusive_waiting == 0
+
+    async def acquire(self, exclusive: bool):
+        async with self._condition:
+            if exclusive:
+                self._exclusive_waiting += 1
+                try:
+                    await self._condition.wait_for(lambda: self.is_free(True))
+                finally:
+                    self._exclusive_waiting -= 1
+                self._exclusive = True
+            else:
+                await self._condition.wait_for(lambda: self.is_free(False))
+                self._shared += 1
+
+    async def release(self, exclusive: bool):
+        async with self._condition:
+            if exclusive:
+                self._exclusive = False
+            else:
+                self._shared -= 1
+            self._condition.notify_all()
+
+
+class LockManager:
+    """Блокировки изменений расписания.
+
+    - group(group_id): изменения одной группы (генерация, ручное
+      редактирование) выполняются по очереди, разные группы - параллельно.
+      При запуске несколькими процессами (MULTI_PROCESS) кроме блокировки
+      процесса берется аренда group:{id} в базе, поэтому
+      правка в одном процессе ждет генерацию той же группы в другом и не
+      затирается ею (не дождались за GROUP_LEASE_WAIT_SECONDS - LeaseBusyError);
+    - exclusive(): операции над несколькими группами (импорт предметов)
+      ждут завершения всех групповых операций.
+
+    Повторный захват той же блокировки внутри одной задачи не ждет.
+    """
+
+    def __init__(self):
+        self._global = _SharedExclusiveLock()
+        self._groups: Dict[int, asyncio.Lock] = {}
+        self._stats: Dict[str, _LockStats] = {}
+
+    def _get_stats(self, name: str) -> _LockStats:
+        if name not in self._stats:
+            self._stats[name] = _LockStats()
+        return self._stats[name]
+
+    async def _timed_acquire(self, name: str, acquire, is_free: bool):
+        stats = self._get_stats(name)
+        stats.acquisitions += 1
+        if not is_free:
+            stats.contended += 1
+        stats.waiting += 1
+        started = time.perf_counter()
+        try:
+            await acquire()
+        finally:
+            stats.waiting -= 1
+        waited = time.perf_counter() - started
+        stats.wait_seconds += waited
+        stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+        if not is_free:
+            tracer.record_phase(f"lock_wait:{name.split(':', 1)[0]}", waited)
+        return time.perf_counter()
+
+    @asynccontextmanager
+    async def group(self, group_id: int):
+        """Монопольная блокировка группы (и разделяемая - глобальная)"""
+        name = f"group:{group_id}"
+        held = _held_locks.get()
+        if name in held or GLOBAL_LOCK in held:
+            yield
+            return
+
+        await self._timed_acquire(GLOBAL_LOCK, lambda: self._global.acquire(False), self._global.is_free(False))
+        try:
+            lock = self._groups.setdefault(group_id, asyncio.Lock())
+            acquired_at = await self._timed_acquire(name, lock.acquire, not lock.locked())
+            token = _held_locks.set(held | {name})
+            try:
+                if MULTI_PROCESS:
+                    async with leases.hold(name, "Группа изменяется другим процессом, повторите позже",
+                                           wait=GROUP_LEASE_WAIT_SECONDS):
+                        yield
+                else:
+                    yield
+            finally:
+                _held_locks.reset(token)
+                lock.release()
+                self._get_stats(name).held_seconds += time.perf_counter() - acquired_at
+        finally:
+            await self._global.release(False)
+
+    @asynccontextmanager
+    async def exclusive(self):
+        """Монопольная глобальная блокировка (операции над несколькими группами)"""
+        held = _held_locks.get()
+        if GLOBAL_LOCK in held:
+            yield
+            return
+
+        acquired_at = await self._timed_acquire(
+            GLOBAL_LOCK, lambda: self._global.acquire(True), self._global.is_free(True)
+        )
+        token = _held_locks.set(held | {GLOBAL_LOCK})
+        try:
+            yield
+        finally:
+            _held_locks.reset(token)
+            await self._global.release(True)
+            self._get_stats(GLOBAL_LOCK).held_seconds += time.perf_counter() - acquired_at
+
+    def get_stats(self, group_id: Optional[int] = None) -> Dict:
+        """Статистика ожидания блокировок: global и по группам"""
+        if group_id is not None:
+            stats = self._stats.get(f"group:{group_id}")
+            return stats.as_dict() if stats else _LockStats().as_dict()
+        return {name: stats.as_dict() for name, stats in sorted(self._stats.items())}
+
+
+class LeaseBusyError(RuntimeError):
+    """Аренду держит другой владелец"""
+
+
+class LeaseManager:
+    """Межпроцессные рекомендательные блокировки в таблице locks.
+
+    Блокировки LockManager действуют внутри одного процесса. Когда приложение
+    запущено несколькими процессами на одном файле базы, изменения группы
+    (LockManager.group) и генерация дополнительно берут аренду: строку с
+    владельцем и временем истечения. Владелец продлевает аренду, пока работает; аренда
+    остановившегося процесса истекает через ttl, после чего ее может взять
+    другой процесс.
+
+    owner - произвольная строка; по умолчанию WORKER_ID.
+    """
+
+    def __init__(self, ttl: float = LEASE_TTL_SECONDS):
+        self.ttl = ttl
+        self.acquired = 0
+        self.rejected = 0
+        self.lost = 0
+
+    async def acquire(self, name: str, owner: str = WORKER_ID) -> bool:
+        """Взять аренду, если она свободна, истекла или уже принадлежит owner"""
+        now = time.time()
+        result = await database.execute(
+            '''INSERT INTO locks (name, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET
+                   owner = excluded.owner,
+                   acquired_at = excluded.acquired_at,
+                   expires_at = excluded.expires_at
+               WHERE locks.owner = excluded.owner OR locks.expires_at <= ?''',
+            (name, owner, now, now + self.ttl, now)
+        )
+        if result.rowcount:
+            self.acquired += 1
+            return True
+        self.rejected += 1
+        return False
+
+    async def renew(self, name: str, owner: str = WORKER_ID) -> bool:
+        """Продлить аренду; False - аренда потеряна (истекла и занята другим)"""
+        result = await database.execute(
+            'UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?',
+            (time.time() + self.ttl, name, owner)
+        )
+        if result.rowcount:
+            return True
+        self.lost += 1
+        return False
+
+    async def release(self, name: str, owner: str = WORKER_ID):
+        """Освободить аренду (чужую не трогает)"""
+        await database.execute('DELETE FROM locks WHERE name = ? AND owner = ?', (name, owner))
+
+    @asynccontextmanager
+    async def hold(self, name: str, message: str = "Операция уже выполняется другим процессом",
+                   wait: float = 0):
+        """Держать аренду на время блока, продлевая ее.
+
+        Занятую аренду ждет до wait секунд, затем - LeaseBusyError(message).
+        """
+        owner = f"{WORKER_ID}#{uuid.uuid4().hex}"
+        deadline = time.monotonic() + wait
+        while not await self.acquire(name, owner):
+            if time.monotonic() >= deadline:
+                raise LeaseBusyError(message)
+            await asyncio.sleep(LEASE_POLL_SECONDS)
+
+        async def keep_alive():
+            while True:
+                await asyncio.sleep(self.ttl / 3)
+                try:
+                    await self.renew(name, owner)
+                except Exception as e:
+                    print(f"⚠️ Ошибка продления аренды {name}: {e}")
+
+        renewer = asyncio.create_task(keep_alive())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await self.release(name, owner)
+
+    async def get_owner(self, name: str) -> Optional[str]:
+        """Текущий владелец действующей аренды или None"""
+        row = await database.fetch_one(
+            'SELECT owner FROM locks WHERE name = ? AND expires_at > ?', (name, time.time())
+        )
+        return row[0] if row else None
+
+    async def list_leases(self) -> List[Dict]:
+        """Все действующие аренды"""
+        now = time.time()
+        rows = await database.fetch_all(
+            'SELECT name, owner, acquired_at, expires_at FROM locks WHERE expires_at > ? ORDER BY name', (now,)
+        )
+        return [
+            {"name": name, "owner": owner, "held_seconds": round(now - acquired_at, 1),
+             "expires_in": round(expires_at - now, 1)}
+            for name, owner, acquired_at, expires_at in rows
+        ]
+
+    def get_stats(self) -> Dict:
+        """Счетчики аренд этого процесса"""
+        return {
+            "worker_id": WORKER_ID,
+            "ttl_seconds": self.ttl,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "lost": self.lost
+        }
+
+
+# Глобальные экземпляры
+locks = LockManager()
+leases = LeaseManager()
@@ -0,0 +1,237 @@
+import asyncio
+import math
+from abc import ABC, abstractmethod
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Границы гистограмм по умолчанию (секунды): от 1 мс до 10 с
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Период замера задержки event loop
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric(ABC):
+    """Метрика с набором меток; значения хранятся по кортежу значений меток"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Строки метрики в текстовом формате (HELP, TYPE и значения)"""
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    metric_type = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Для сборщиков: значение счетчика, накопленное в другом месте"""
+        self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться"""
+
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Гистограмма длительностей: счетчики по корзинам, сумма и количество"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Значения меток -> [счетчики корзин (не накопительные), сумма, количество]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замерить длительность блока"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Метрики приложения в текстовом формате Prometheus (version 0.0.4).
+
+    Счетчики и гистограммы обновляет код по ходу работы. Значения, которые
+    дешевле прочитать в момент запроса (размер пула, очереди, кэши),
+    заполняют сборщики - функции, вызываемые перед выводом.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, tuple(labels)))
+
+    def gauge(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, tuple(labels)))
+
+    def histogram(self, name: str, help_text: str, labels: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, tuple(labels), buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Функция, обновляющая метрики перед выводом"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️ Ошибка сборщика метрик: {e}")
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+    # ---------- Задержка event loop ----------
+
+    async def _measure_loop_lag(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            lag = max(0.0, time.perf_counter() - started - LOOP_LAG_INTERVAL_SECONDS)
+            EVENT_LOOP_LAG.observe(lag)
+            EVENT_LOOP_LAST_LAG.set(lag)
+
+    def start(self):
+        """Запустить замер задержки event loop (при старте приложения)"""
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._measure_loop_lag())
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            await asyncio.gather(self._lag_task, return_exceptions=True)
+            self._lag_task = None
+
+
+# Глобальный экземпляр
+metrics = MetricsRegistry()
+
+# Метрики, которые обновляются из нескольких модулей
+HTTP_REQUESTS = metrics.counter(
+    'schedule_http_requests_total', 'HTTP-запросы по маршруту и коду ответа', ('method', 'route', 'status'))
+HTTP_REQUEST_DURATION = metrics.histogram(
+    'schedule_http_request_duration_seconds', 'Время обработки HTTP-запроса до заголовков ответа',
+    ('method', 'route'))
+DB_QUERY_DURATION = metrics.histogram(
+    'schedule_db_query_duration_seconds', 'Время SQL-запроса (с ожиданием соединения пула)', ('query',))
+DB_QUERY_ERRORS = metrics.counter(
+    'schedule_db_query_errors_total', 'SQL-запросы, завершившиеся ошибкой', ('query',))
+GENERATION_PHASE_DURATION = metrics.histogram(
+    'schedule_generation_phase_seconds', 'Длительность фаз генерации расписания', ('phase',),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+GENERATIONS = metrics.counter(
+    'schedule_generations_total', 'Генерации расписания по результату', ('status',))
+PLACEMENT_FAILURES = metrics.counter(
+    'schedule_placement_failures_total',
+    'Пары, которые не удалось поставить в расписание (включая снятые при перепроверке занятости)')
+PLACEMENT_CONFLICTS = metrics.counter(
+    'schedule_placement_conflicts_total',
+    'Пары, попавшие на занятость преподавателя, сохраненную другой генерацией во время расстановки')
+EVENT_LOOP_LAG = metrics.histogram(
+    'schedule_event_loop_lag_seconds', 'Задержка event loop относительно запланированного времени',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+EVENT_LOOP_LAST_LAG = metrics.gauge(
+    'schedule_event_loop_last_lag_seconds', 'Последний замер задержки event loop')
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# Сколько последних трассировок хранить для /api/debug/traces
+TRACE_BUFFER = int(os.getenv("SCHEDULE_TRACE_BUFFER", "50"))
+# Ограничение числа записей в одной трассировке
+TRACE_MAX_SPANS = 1000
+# Сколько самых долгих запросов перечислять в Server-Timing
+SERVER_TIMING_TOP_QUERIES = 3
+
+_APP_DIR = str(Path(__file__).resolve().parent.parent)
+# Кадры этих файлов пропускаются при поиске вызывающего метода
+_SKIP_FILES = (
+    str(Path(_APP_DIR) / "db" / "database.py"),
+    str(Path(_APP_DIR) / "core"),
+)
+
+# Трассировка текущего запроса (None - запрос не трассируется)
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("current_trace", default=None)
+
+
+def _caller() -> str:
+    """Метод приложения, из которого выполнен запрос к БД (service.method:line)"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and not filename.startswith(_SKIP_FILES):
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            return f"{Path(filename).stem}.{name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class RequestTrace:
+    """Записи одного HTTP-запроса: SQL-запросы и фазы с длительностями"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.spans: List[Dict] = []
+        self.dropped = 0
+
+    def _offset_ms(self, duration: float) -> float:
+        return round((time.perf_counter() - duration - self._started) * 1000, 3)
+
+    def _add(self, span: Dict):
+        if self.duration is not None:
+            return  # Ответ уже отправлен (например, поток SSE продолжает работу)
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append(span)
+
+    def add_query(self, name: str, query: str, duration: float, rows: Optional[int], error: Optional[str]):
+        self._add({
+            "type": "sql",
+            "name": name,
+            "sql": ' '.join(query.split())[:500],
+            "caller": _caller(),
+            "start_ms": self._offset_ms(duration),
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "error": error
+        })
+
+    def add_phase(self, name: str, duration: float):
+        self._add({
+            "type": "phase",
+            "name": name,
+            "caller": _caller(),
+            "start_ms": self._offset_ms(duration),
+            "duration_ms": round(duration * 1000, 3)
+        })
+
+    def finish(self, status: int):
+        self.status = status
+        self.duration = time.perf_counter() - self._started
+
+    def _queries(self) -> List[Dict]:
+        return [span for span in self.spans if span["type"] == "sql"]
+
+    def summary(self) -> Dict:
+        queries = self._queries()
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            "queries": len(queries),
+            "db_ms": round(sum(span["duration_ms"] for span in queries), 3)
+        }
+
+    def as_dict(self) -> Dict:
+        return {**self.summary(), "dropped_spans": self.dropped, "spans": self.spans}
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing: total, db, фазы и самые долгие запросы"""
+        summary = self.summary()
+        entries = [
+            f'total;dur={summary["duration_ms"]}',
+            f'db;dur={summary["db_ms"]};desc="{summary["queries"]} queries"'
+        ]
+        phases: Dict[str, float] = {}
+        for span in self.spans:
+            if span["type"] == "phase":
+                phases[span["name"]] = phases.get(span["name"], 0.0) + span["duration_ms"]
+        for i, (name, duration) in enumerate(phases.items()):
+            entries.append(f'phase{i};dur={round(duration, 3)};desc="{name}"')
+        slowest = sorted(self._queries(), key=lambda span: span["duration_ms"], reverse=True)
+        for i, span in enumerate(slowest[:SERVER_TIMING_TOP_QUERIES]):
+            entries.append(f'sql{i};dur={span["duration_ms"]};desc="{span["name"]} {span["caller"]}"')
+        return ', '.join(entries)
+
+
+class Tracer:
+    """Трассировка запросов: текущая трассировка живет в ContextVar запроса.
+
+    Database сообщает о каждом SQL-запросе (record_query), сервисы - о
+    длительных фазах (record_phase). Если запрос не трассируется, вызовы
+    ничего не делают. Завершенные трассировки хранятся в кольцевом буфере.
+    """
+
+    def __init__(self, buffer_size: int = TRACE_BUFFER):
+        self._traces = deque(maxlen=buffer_size)
+
+    def start(self, method: str, path: str) -> RequestTrace:
+        trace = RequestTrace(method, path)
+        _current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: RequestTrace, status: int):
+        trace.finish(status)
+        self._traces.append(trace)
+
+    @staticmethod
+    def current() -> Optional[RequestTrace]:
+        return _current_trace.get()
+
+    @staticmethod
+    def record_query(name: str, query: str, duration: float, rows: Optional[int] = None,
+                     error: Optional[str] = None):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_query(name, query, duration, rows, error)
+
+    @staticmethod
+    def record_phase(name: str, duration: float):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_phase(name, duration)
+
+    def list_traces(self, limit: int = 50) -> List[Dict]:
+        """Последние трассировки (новые первыми)"""
+        return [trace.summary() for trace in list(self._traces)[::-1][:limit]]
+
+    def get_trace(self, trace_id: str) -> Optional[Dict]:
+        for trace in self._traces:
+            if trace.id == trace_id:
+                return trace.as_dict()
+        return None
+
+
+# Глобальный экземпляр
+tracer = Tracer()
@@ -1,75 +1,325 @@
 import aiosqlite
+import asyncio
+import re
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
 import os
 
+from app.core.metrics import DB_QUERY_DURATION, DB_QUERY_ERRORS
+from app.core.tracing import tracer
+
+
+# Максимум одновременно открытых соединений пула
+DB_POOL_SIZE = int(os.getenv("SCHEDULE_DB_POOL_SIZE", "8"))
+
+# Сколько секунд ждать освобождения базы, занятой записью другого соединения
+DB_BUSY_TIMEOUT = float(os.getenv("SCHEDULE_DB_BUSY_TIMEOUT", "30"))
+
+# Режим журнала: WAL позволяет читать во время записи, в том числе из других процессов
+DB_JOURNAL_MODE = os.getenv("SCHEDULE_DB_JOURNAL_MODE", "WAL")
+
+# Сколько последних записей журнала изменений уроков хранить
+LESSON_CHANGES_KEEP = int(os.getenv("SCHEDULE_LESSON_CHANGES_KEEP", "20000"))
+
+# Переменная окружения: "1" - схему уже подготовил родительский процесс
+# (запуск с несколькими воркерами), миграции в воркерах не выполняются
+SCHEMA_READY_ENV = "SCHEDULE_SCHEMA_READY"
+
+
+# Оставшиеся часы предмета, вычисленные по фактически поставленным парам
+# (1 пара = 2 часа). Используется в триггерах и при пересчете часов.
+REMAINING_HOURS_EXPR = '''MAX(0, subjects.total_hours - 2 * (
+    SELECT COUNT(*) FROM lessons l
+    WHERE l.group_id = subjects.group_id
+      AND l.teacher = subjects.teacher
+      AND l.subject_name = subjects.subject_name))'''
+
+# Таблицы с данными группы. group_id ссылается на study_groups с каскадным
+# удалением, поэтому группа удаляется одним DELETE. {name} - имя создаваемой
+# таблицы (при миграции таблица пересоздается под временным именем).
+GROUP_TABLES_SCHEMA = {
+    'subjects': '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            teacher TEXT NOT NULL,
+            subject_name TEXT NOT NULL,
+            total_hours INTEGER NOT NULL DEFAULT 0,
+            remaining_hours INTEGER NOT NULL DEFAULT 0,
+            remaining_pairs INTEGER NOT NULL DEFAULT 0,
+            priority INTEGER DEFAULT 0,
+            max_per_day INTEGER DEFAULT 2,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            group_id INTEGER DEFAULT 1 REFERENCES study_groups(id) ON DELETE CASCADE,
+            min_per_week INTEGER DEFAULT 1,
+            max_per_week INTEGER DEFAULT 20,
+            UNIQUE(teacher, subject_name, group_id)
+        )
+    ''',
+    'lessons': '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            day INTEGER NOT NULL CHECK(day >= 0 AND day <= 6),
+            time_slot INTEGER NOT NULL CHECK(time_slot >= 0 AND time_slot <= 3),
+            teacher TEXT NOT NULL,
+            subject_name TEXT NOT NULL,
+            editable BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            group_id INTEGER DEFAULT 1 REFERENCES study_groups(id) ON DELETE CASCADE,
+            UNIQUE(day, time_slot, group_id)
+        )
+    ''',
+    'saved_schedules': '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            payload TEXT NOT NULL,
+            group_id INTEGER DEFAULT 1 REFERENCES study_groups(id) ON DELETE CASCADE
+        )
+    ''',
+}
+
+# Триггеры, которые ссылаются на пересоздаваемые таблицы (см. _create_hours_triggers)
+HOURS_TRIGGERS = (
+    'trg_lessons_hours_insert',
+    'trg_lessons_hours_delete',
+    'trg_lessons_hours_update',
+    'trg_subjects_hours_insert',
+    'trg_subjects_hours_update',
+)
+
+
+# Таблицы со счетчиком версий в data_versions: имя -> колонка группы.
+# Для глобальных таблиц (None) версия хранится с group_id = 0.
+VERSIONED_TABLES = {
+    'lessons': 'group_id',
+    'subjects': 'group_id',
+    'saved_schedules': 'group_id',
+    'teachers': None,
+    'study_groups': None,
+    'negative_filters': None,
+}
+
+
+_QUERY_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def query_name(query: str) -> str:
+    """Короткое имя запроса для метрик: операция и первая таблица (select_lessons)"""
+    words = query.split(None, 1)
+    if not words:
+        return 'empty'
+    operation = words[0].lower()
+    if operation == 'pragma':
+        return f"pragma_{re.split(r'[^A-Za-z_]', words[1], 1)[0].lower()}" if len(words) > 1 else 'pragma'
+    match = _QUERY_TABLE_RE.search(query)
+    return f"{operation}_{match.group(1).lower()}" if match else operation
+
 
 class Database:
-    def __init__(self, db_path: str = "schedule.sql"):
+    def __init__(self, db_path: str = "schedule.sql", pool_size: int = DB_POOL_SIZE):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(exist_ok=True)
-        self._conn = None
+        self._conn = None  # Постоянное соединение для PRAGMA data_version
         self._initialized = False
+        # Пул соединений: свободные соединения и ограничение на их общее число
+        self._pool_size = max(1, pool_size)
+        self._idle = []
+        self._pool_semaphore = None
+        self._in_use = 0
+        self._waiting = 0
+        # Синхронные обработчики, вызываемые после каждого коммита
+        self._commit_listeners = []
 
     async def _get_connection(self):
-        """Создать новое соединение (вызывается для каждого запроса)"""
-        conn = await aiosqlite.connect(self.db_path)
+        """Создать новое соединение"""
+        conn = await aiosqlite.connect(self.db_path, timeout=DB_BUSY_TIMEOUT)
         await conn.execute("PRAGMA foreign_keys = ON")
+        # В режиме WAL NORMAL не теряет целостность и не ждет fsync на каждый коммит
+        await conn.execute("PRAGMA synchronous = NORMAL")
         return conn
 
-    # В class Database добавьте:
+    @asynccontextmanager
+    async def _pooled_connection(self):
+        """Взять соединение из пула (или открыть новое, если свободных нет).
+
+        Одновременно открыто не больше pool_size соединений, остальные
+        запросы ждут освобождения. Незавершенная транзакция откатывается
+        перед возвратом соединения в пул.
+        """
+        if self._pool_semaphore is None:
+            self._pool_semaphore = asyncio.Semaphore(self._pool_size)
+
+        self._waiting += 1
+        try:
+            await self._pool_semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            conn = self._idle.pop() if self._idle else await self._get_connection()
+            self._in_use += 1
+            try:
+                yield conn
+            finally:
+                self._in_use -= 1
+                try:
+                    if conn.in_transaction:
+                        await conn.rollback()
+                    self._idle.append(conn)
+                except Exception as e:
+                    print(f"⚠️ Соединение исключено из пула: {e}")
+                    try:
+                        await conn.close()
+                    except Exception:
+                        pass
+        finally:
+            self._pool_semaphore.release()
+
+    @asynccontextmanager
+    async def _measure(self, query: str):
+        """Учесть длительность и ошибки запроса в метриках (по имени запроса)
+        и в трассировке текущего HTTP-запроса. Вызывающий код кладет число
+        строк в span["rows"].
+        """
+        name = query_name(query)
+        span = {"rows": None, "error": None}
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            DB_QUERY_ERRORS.inc(query=name)
+            span["error"] = str(e)
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            DB_QUERY_DURATION.observe(duration, query=name)
+            tracer.record_query(name, query, duration, span["rows"], span["error"])
+
+    def get_pool_stats(self) -> dict:
+        """Использование пула соединений"""
+        return {
+            "size": self._pool_size,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "waiting": self._waiting
+        }
+
+    def add_commit_listener(self, callback):
+        """Подписаться на коммиты этого процесса (callback без аргументов)"""
+        self._commit_listeners.append(callback)
+
+    def remove_commit_listener(self, callback):
+        if callback in self._commit_listeners:
+            self._commit_listeners.remove(callback)
+
+    def _notify_commit(self):
+        for callback in list(self._commit_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Ошибка обработчика коммита: {e}")
+
     async def fetch_all(self, query: str, params: tuple = None):
         """Получить все строки"""
-        conn = await self._get_connection()
-        try:
+        async with self._measure(query) as span, self._pooled_connection() as conn:
             if params:
                 cursor = await conn.execute(query, params)
             else:
                 cursor = await conn.execute(query)
             rows = await cursor.fetchall()
             await cursor.close()
+            span["rows"] = len(rows)
             return rows
-        except Exception as e:
-            raise e
-        finally:
-            await conn.close()
 
     async def fetch_one(self, query: str, params: tuple = None):
         """Получить одну строку"""
-        conn = await self._get_connection()
-        try:
+        async with self._measure(query) as span, self._pooled_connection() as conn:
             if params:
                 cursor = await conn.execute(query, params)
             else:
                 cursor = await conn.execute(query)
             row = await cursor.fetchone()
             await cursor.close()
+            span["rows"] = 0 if row is None else 1
             return row
-        except Exception as e:
-            raise e
-        finally:
-            await conn.close()
 
     async def execute(self, query: str, params: tuple = None):
         """Выполнить запрос"""
-        conn = await self._get_connection()
-        try:
-            if params:
-                result = await conn.execute(query, params)
+        async with self._measure(query) as span, self._pooled_connection() as conn:
+            try:
+                if params:
+                    result = await conn.execute(query, params)
+                else:
+                    result = await conn.execute(query)
+                span["rows"] = result.rowcount
+                await conn.commit()
+                self._notify_commit()
+                return result
+            except Exception:
+                await conn.rollback()
+                raise
+
+    @asynccontextmanager
+    async def transaction(self, immediate: bool = True):
+        """Выполнить несколько запросов в одной транзакции на одном соединении.
+
+        immediate=True сразу берет блокировку записи (BEGIN IMMEDIATE), чтобы
+        прочитанные внутри транзакции данные не устарели до коммита.
+        """
+        async with self._measure("TRANSACTION"), self._pooled_connection() as conn:
+            try:
+                await conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+                yield conn
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+        self._notify_commit()
+
+    async def data_version(self) -> int:
+        """Получить PRAGMA data_version с постоянного соединения.
+
+        Значение меняется, когда изменения фиксирует любое другое соединение
+        (в том числе из другого процесса), поэтому подходит для проверки
+        актуальности кэшей.
+        """
+        if self._conn is None:
+            conn = await self._get_connection()
+            if self._conn is None:
+                self._conn = conn
             else:
-                result = await conn.execute(query)
-            await conn.commit()
-            return result
-        except Exception as e:
-            await conn.rollback()
-            raise e
-        finally:
+                await conn.close()
+
+        cursor = await self._conn.execute("PRAGMA data_version")
+        row = await cursor.fetchone()
+        await cursor.close()
+        return row[0]
+
+    async def close(self):
+        """Закрыть постоянное соединение и соединения пула"""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+        idle, self._idle = self._idle, []
+        for conn in idle:
             await conn.close()
+        self._pool_semaphore = None
 
     async def init_db(self):
         """Инициализация базы данных"""
         if self._initialized:
             return
 
+        if os.getenv(SCHEMA_READY_ENV) == "1":
+            print("✅ Схема базы данных подготовлена родительским процессом")
+            self._initialized = True
+            return
+
         print("🔄 Инициализация базы данных...")
 
         try:
@@ -81,6 +331,12 @@ class Database:
 
             conn = await self._get_connection()
 
+            # Режим журнала хранится в файле базы - достаточно установить один раз
+            cursor = await conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+            journal_mode = (await cursor.fetchone())[0]
+            await cursor.close()
+            print(f"📒 Режим журнала SQLite: {journal_mode}")
+
             # Проверяем существование таблиц
             tables = await conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
             existing_tables = [row[0] for row in await tables.fetchall()]
@@ -107,45 +363,9 @@ class Database:
                     )
                 ''')
 
-                # Таблица предметов - С group_id (ЛОКАЛЬНЫЕ ДЛЯ ГРУППЫ)
-                await conn.execute('''
-                    CREATE TABLE IF NOT EXISTS subjects (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        teacher TEXT NOT NULL,
-                        subject_name TEXT NOT NULL,
-                        total_hours INTEGER NOT NULL DEFAULT 0,
-                        remaining_hours INTEGER NOT NULL DEFAULT 0,
-                        remaining_pairs INTEGER NOT NULL DEFAULT 0,
-                        priority INTEGER DEFAULT 0,
-                        max_per_day INTEGER DEFAULT 2,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        group_id INTEGER DEFAULT 1,
-                        min_per_week INTEGER DEFAULT 1,
-                        max_per_week INTEGER DEFAULT 20,
-                        UNIQUE(teacher, subject_name, group_id)
-                    )
-                ''')
-
-                try:
-                    await conn.execute('ALTER TABLE subjects ADD COLUMN min_per_week INTEGER DEFAULT 1')
-                    await conn.execute('ALTER TABLE subjects ADD COLUMN max_per_week INTEGER DEFAULT 20')
-                except Exception as e:
-                    print(f"⚠️ Колонки уже существуют или ошибка: {e}")
-
-                # Таблица занятий - С group_id (ЛОКАЛЬНЫЕ ДЛЯ ГРУППЫ)
-                await conn.execute('''
-                    CREATE TABLE lessons (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        day INTEGER NOT NULL CHECK(day >= 0 AND day <= 6),
-                        time_slot INTEGER NOT NULL CHECK(time_slot >= 0 AND time_slot <= 3),
-                        teacher TEXT NOT NULL,
-                        subject_name TEXT NOT NULL,
-                        editable BOOLEAN DEFAULT 1,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        group_id INTEGER DEFAULT 1,
-                        UNIQUE(day, time_slot, group_id)
-                    )
-                ''')
+                # Таблицы предметов и занятий - С group_id (ЛОКАЛЬНЫЕ ДЛЯ ГРУППЫ)
+                await conn.execute(GROUP_TABLES_SCHEMA['subjects'].format(name='subjects'))
+                await conn.execute(GROUP_TABLES_SCHEMA['lessons'].format(name='lessons'))
 
                 # Таблица фильтров - БЕЗ group_id (ГЛОБАЛЬНЫЕ)
                 await conn.execute('''
@@ -158,23 +378,10 @@ class Database:
                         ''')
 
                 # Таблица сохраненных расписаний - С group_id
-                await conn.execute('''
-                    CREATE TABLE saved_schedules (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER,
-                        name TEXT NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        payload TEXT NOT NULL,
-                        group_id INTEGER DEFAULT 1
-                    )
-                ''')
+                await conn.execute(GROUP_TABLES_SCHEMA['saved_schedules'].format(name='saved_schedules'))
 
                 # Индексы для производительности
-                await conn.execute('CREATE INDEX idx_subjects_teacher ON subjects(teacher)')
-                await conn.execute('CREATE INDEX idx_lessons_day_time ON lessons(day, time_slot)')
-                await conn.execute('CREATE INDEX idx_teachers_name ON teachers(name)')
-                await conn.execute('CREATE INDEX idx_group_id_subjects ON subjects(group_id)')
-                await conn.execute('CREATE INDEX idx_group_id_lessons ON lessons(group_id)')
+                await self._create_indexes(conn)
 
                 # Добавляем основную группу
                 await conn.execute('INSERT INTO study_groups (id, name) VALUES (1, "Основная")')
@@ -184,6 +391,15 @@ class Database:
             else:
                 print("✅ База данных уже инициализирована, применяем миграцию...")
                 await self._migrate_to_new_architecture(conn)
+                await self._migrate_group_foreign_keys(conn)
+
+            await self._create_indexes(conn)
+            await self._create_hours_triggers(conn)
+            await self._create_version_triggers(conn)
+            await self._create_lesson_change_log(conn)
+            await self._create_jobs_table(conn)
+            await self._create_locks_table(conn)
+            await conn.commit()
 
             self._initialized = True
 
@@ -194,6 +410,305 @@ class Database:
             if 'conn' in locals():
                 await conn.close()
 
+    async def _create_indexes(self, conn):
+        """Индексы для производительности (пересоздаются после миграций)"""
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_subjects_teacher ON subjects(teacher)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_lessons_day_time ON lessons(day, time_slot)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_teachers_name ON teachers(name)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_group_id_subjects ON subjects(group_id)')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_group_id_lessons ON lessons(group_id)')
+        # Расписание преподавателя по всем группам
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_lessons_teacher_slot ON lessons(teacher, day, time_slot)')
+
+    async def _migrate_group_foreign_keys(self, conn):
+        """Миграция: внешние ключи group_id -> study_groups(id) ON DELETE CASCADE.
+
+        SQLite не умеет добавлять ограничения в существующую таблицу, поэтому
+        таблица пересоздается и данные копируются. Строки несуществующих групп
+        при этом отбрасываются.
+        """
+        tables_to_migrate = []
+        for table in GROUP_TABLES_SCHEMA:
+            cursor = await conn.execute(f"PRAGMA foreign_key_list({table})")
+            references = [row[2] for row in await cursor.fetchall()]
+            await cursor.close()
+            if 'study_groups' not in references:
+                tables_to_migrate.append(table)
+
+        if not tables_to_migrate:
+            return
+
+        print(f"🔄 Миграция: каскадные внешние ключи для {', '.join(tables_to_migrate)}...")
+
+        # PRAGMA foreign_keys не действует внутри транзакции
+        await conn.commit()
+        await conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            await conn.execute("BEGIN")
+            await conn.execute("INSERT OR IGNORE INTO study_groups (id, name) VALUES (1, 'Основная')")
+
+            # Триггеры часов ссылаются на пересоздаваемые таблицы - создадим их заново
+            for trigger in HOURS_TRIGGERS:
+                await conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+            for table in tables_to_migrate:
+                new_table = f"{table}_new"
+                await conn.execute(GROUP_TABLES_SCHEMA[table].format(name=new_table))
+
+                cursor = await conn.execute(f"PRAGMA table_info({table})")
+                old_columns = [row[1] for row in await cursor.fetchall()]
+                cursor = await conn.execute(f"PRAGMA table_info({new_table})")
+                new_columns = [row[1] for row in await cursor.fetchall()]
+                columns = ', '.join(c for c in new_columns if c in old_columns)
+
+                result = await conn.execute(f'''
+                    INSERT INTO {new_table} ({columns})
+                    SELECT {columns} FROM {table}
+                    WHERE COALESCE(group_id, 1) IN (SELECT id FROM study_groups)
+                ''')
+                cursor = await conn.execute(f"SELECT COUNT(*) FROM {table}")
+                total = (await cursor.fetchone())[0]
+
+                await conn.execute(f"DROP TABLE {table}")
+                await conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+                print(f"✅ {table}: перенесено {result.rowcount} строк, удалено сирот: {total - result.rowcount}")
+
+            await self._create_indexes(conn)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            await conn.execute("PRAGMA foreign_keys = ON")
+
+    async def _create_hours_triggers(self, conn):
+        """Триггеры, поддерживающие remaining_hours/remaining_pairs предметов.
+
+        Счетчики пересчитываются по таблице lessons при любом изменении уроков,
+        поэтому сервисам не нужно вручную корректировать часы.
+        """
+        recalc = f'''UPDATE subjects
+                SET remaining_hours = {REMAINING_HOURS_EXPR},
+                    remaining_pairs = {REMAINING_HOURS_EXPR} / 2'''
+
+        await conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_lessons_group_subject ON lessons(group_id, teacher, subject_name)'
+        )
+
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_lessons_hours_insert
+            AFTER INSERT ON lessons
+            BEGIN
+                {recalc}
+                WHERE group_id = NEW.group_id AND teacher = NEW.teacher AND subject_name = NEW.subject_name;
+            END
+        ''')
+
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_lessons_hours_delete
+            AFTER DELETE ON lessons
+            BEGIN
+                {recalc}
+                WHERE group_id = OLD.group_id AND teacher = OLD.teacher AND subject_name = OLD.subject_name;
+            END
+        ''')
+
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_lessons_hours_update
+            AFTER UPDATE OF teacher, subject_name, group_id ON lessons
+            BEGIN
+                {recalc}
+                WHERE (group_id = OLD.group_id AND teacher = OLD.teacher AND subject_name = OLD.subject_name)
+                   OR (group_id = NEW.group_id AND teacher = NEW.teacher AND subject_name = NEW.subject_name);
+            END
+        ''')
+
+        # Новый предмет или изменение его часов - сразу учитываем уже поставленные пары
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_subjects_hours_insert
+            AFTER INSERT ON subjects
+            BEGIN
+                {recalc}
+                WHERE id = NEW.id;
+            END
+        ''')
+
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_subjects_hours_update
+            AFTER UPDATE OF total_hours ON subjects
+            BEGIN
+                {recalc}
+                WHERE id = NEW.id;
+            END
+        ''')
+
+        # Исправляем накопившиеся расхождения в существующей базе
+        await conn.execute(recalc)
+
+    async def _create_version_triggers(self, conn):
+        """Таблица data_versions и триггеры, увеличивающие версию при каждой записи.
+
+        Версия ведется на таблицу и группу (см. VERSIONED_TABLES) и служит
+        для ETag GET-эндпоинтов. Строка '__epoch__' задается случайно при
+        создании таблицы, чтобы версии новой базы не совпали со старыми.
+        """
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT NOT NULL,
+                group_id INTEGER NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, group_id)
+            )
+        ''')
+        await conn.execute(
+            "INSERT OR IGNORE INTO data_versions (table_name, group_id, version) "
+            "VALUES ('__epoch__', 0, abs(random()) % 1000000000)"
+        )
+
+        def bump(table: str, group_expr: str) -> str:
+            return f'''INSERT INTO data_versions (table_name, group_id, version)
+                    VALUES ('{table}', {group_expr}, 1)
+                    ON CONFLICT (table_name, group_id) DO UPDATE SET version = version + 1;'''
+
+        for table, group_column in VERSIONED_TABLES.items():
+            if group_column:
+                new_group = f"COALESCE(NEW.{group_column}, 1)"
+                old_group = f"COALESCE(OLD.{group_column}, 1)"
+                update_body = bump(table, new_group) + f'''
+                    INSERT INTO data_versions (table_name, group_id, version)
+                    SELECT '{table}', {old_group}, 1 WHERE {old_group} != {new_group}
+                    ON CONFLICT (table_name, group_id) DO UPDATE SET version = version + 1;'''
+            else:
+                new_group = old_group = "0"
+                update_body = bump(table, new_group)
+
+            for event, body in (('insert', bump(table, new_group)),
+                                ('delete', bump(table, old_group)),
+                                ('update', update_body)):
+                await conn.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event}
+                    AFTER {event.upper()} ON {table}
+                    BEGIN
+                        {body}
+                    END
+                ''')
+
+    async def _create_jobs_table(self, conn):
+        """Фоновые задачи (генерация расписания): статус, прогресс и результат в JSON"""
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                group_id INTEGER REFERENCES study_groups(id) ON DELETE CASCADE,
+                status TEXT NOT NULL DEFAULT 'queued'
+                    CHECK(status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+                params TEXT NOT NULL DEFAULT '{}',
+                progress TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        await conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_group_created ON jobs(group_id, created_at)')
+
+        # Флаг отмены: задачу может выполнять другой процесс, он читает флаг из базы
+        cursor = await conn.execute("PRAGMA table_info(jobs)")
+        columns = [row[1] for row in await cursor.fetchall()]
+        await cursor.close()
+        if 'cancel_requested' not in columns:
+            await conn.execute('ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0')
+
+    async def _create_locks_table(self, conn):
+        """Межпроцессные блокировки (аренды): владелец и время истечения.
+
+        Владелец продлевает аренду, пока работает; аренда упавшего процесса
+        истекает сама, и блокировку может забрать другой процесс.
+        """
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS locks (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                acquired_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+    async def _create_lesson_change_log(self, conn):
+        """Журнал изменений уроков (только добавление), заполняемый триггерами.
+
+        version - сквозной номер изменения, по нему клиенты запрашивают
+        изменения с момента последней синхронизации. Перенос урока в другую
+        группу записывается как удаление в старой и добавление в новой.
+        Хранятся последние LESSON_CHANGES_KEEP записей.
+        """
+        cursor = await conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'lesson_changes'"
+        )
+        exists = await cursor.fetchone() is not None
+        await cursor.close()
+
+        if not exists:
+            await conn.execute('''
+                CREATE TABLE lesson_changes (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    lesson_id INTEGER NOT NULL,
+                    group_id INTEGER NOT NULL,
+                    op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete')),
+                    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            await conn.execute(
+                'CREATE INDEX idx_lesson_changes_group ON lesson_changes(group_id, version)'
+            )
+            # Уже существующие уроки считаем добавленными, чтобы since=0 давал полный список
+            await conn.execute('''
+                INSERT INTO lesson_changes (lesson_id, group_id, op)
+                SELECT id, COALESCE(group_id, 1), 'insert' FROM lessons ORDER BY id
+            ''')
+
+        log = "INSERT INTO lesson_changes (lesson_id, group_id, op)"
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_lessons_changes_insert
+            AFTER INSERT ON lessons
+            BEGIN
+                {log} VALUES (NEW.id, COALESCE(NEW.group_id, 1), 'insert');
+            END
+        ''')
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_lessons_changes_delete
+            AFTER DELETE ON lessons
+            BEGIN
+                {log} VALUES (OLD.id, COALESCE(OLD.group_id, 1), 'delete');
+            END
+        ''')
+        await conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_lessons_changes_update
+            AFTER UPDATE ON lessons
+            BEGIN
+                {log} SELECT NEW.id, COALESCE(NEW.group_id, 1), 'update'
+                WHERE COALESCE(OLD.group_id, 1) = COALESCE(NEW.group_id, 1);
+                {log} SELECT OLD.id, COALESCE(OLD.group_id, 1), 'delete'
+                WHERE COALESCE(OLD.group_id, 1) != COALESCE(NEW.group_id, 1);
+                {log} SELECT NEW.id, COALESCE(NEW.group_id, 1), 'insert'
+                WHERE COALESCE(OLD.group_id, 1) != COALESCE(NEW.group_id, 1);
+            END
+        ''')
+
+        # Обрезка журнала раз в 1000 записей. Глубина подставляется в текст
+        # триггера, поэтому он пересоздается при каждом старте - иначе новое
+        # значение SCHEDULE_LESSON_CHANGES_KEEP не применилось бы к старой БД
+        await conn.execute('DROP TRIGGER IF EXISTS trg_lesson_changes_prune')
+        await conn.execute(f'''
+            CREATE TRIGGER trg_lesson_changes_prune
+            AFTER INSERT ON lesson_changes
+            WHEN NEW.version % 1000 = 0
+            BEGIN
+                DELETE FROM lesson_changes WHERE version <= NEW.version - {LESSON_CHANGES_KEEP};
+            END
+        ''')
+
     async def _migrate_to_new_architecture(self, conn):
         """Миграция на новую архитектуру (фильтры глобальные)"""
         try:
@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 
 # Добавляем родительскую папку в PYTHONPATH
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,24 +15,32 @@ print(f"Python path: {sys.path}")
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.exception_handlers import http_exception_handler
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
-from app.db.database import database
+from app.db.database import database, SCHEMA_READY_ENV
+from app.core.executors import executors
+from app.core.locks import locks, leases, LeaseBusyError
+from app.core.metrics import metrics, HTTP_REQUESTS, HTTP_REQUEST_DURATION
+from app.core.tracing import tracer
+from app.services.data_version_service import data_version_service
+from app.services.event_hub import event_hub
+from app.services.job_service import job_service
 import sys
 from app.api.routes import api_router
-from app.services.schedule_services import schedule_service
-from app.services.subject_services import subject_service
-from app.services.teacher_service import teacher_service  # ИСПРАВЛЕН ИМПОРТ
-from app.services.group_service import group_service  # ДОБАВЛЕН ИМПОРТ
+from app.services.bootstrap_service import bootstrap_service
 from pathlib import Path
+from typing import Optional
+
+# Режим отладки: подробные ошибки и трассировка запросов (Server-Timing, /api/debug/traces)
+DEBUG = os.getenv("SCHEDULE_DEBUG", "1") == "1"
 
 app = FastAPI(
     title="Schedule Generator",
     description="Умный генератор учебного расписания",
     version="2.0.0",
-    debug=True
+    debug=DEBUG
 )
 
 
@@ -45,14 +54,25 @@ async def lifespan(app: FastAPI):
         print("✅ База данных готова")
     except Exception as e:
         print(f"❌ Ошибка инициализации БД: {e}")
+    metrics.start()
+    data_version_service.start()
+    await event_hub.start()
+    await job_service.start()
     yield
+    # Shutdown
+    await job_service.shutdown()
+    await event_hub.stop()
+    await data_version_service.stop()
+    await metrics.stop()
+    executors.shutdown()
+    await database.close()
 
 
 app = FastAPI(
     title="Schedule Generator",
     description="Умный генератор учебного расписания",
     version="2.0.0",
-    debug=True,
+    debug=DEBUG,
     lifespan=lifespan
 )
 
@@ -66,6 +86,52 @@ templates = Jinja2Templates(directory=str(current_dir / "templates"))
 app.include_router(api_router)
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Длительность и коды ответов по маршрутам (шаблон пути, а не сам путь)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        if route is not None:
+            route_name = route.path
+        elif request.url.path.startswith("/static/"):
+            route_name = "/static"
+        else:
+            route_name = "unmatched"
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=request.method, route=route_name)
+        HTTP_REQUESTS.inc(method=request.method, route=route_name, status=status)
+
+
+# Служебные пути, которые не трассируются (иначе вытеснят полезные трассировки)
+UNTRACED_PREFIXES = ("/static/", "/metrics", "/api/debug/")
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """В режиме отладки: SQL-запросы и фазы запроса, заголовки Server-Timing и X-Trace-Id"""
+    if not app.debug or request.url.path.startswith(UNTRACED_PREFIXES):
+        return await call_next(request)
+
+    path = request.url.path
+    if request.url.query:
+        path += f"?{request.url.query}"
+    trace = tracer.start(request.method, path)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        tracer.finish(trace, status)
+    response.headers["Server-Timing"] = trace.server_timing()
+    response.headers["X-Trace-Id"] = trace.id
+    return response
+
+
 @app.exception_handler(StarletteHTTPException)
 async def custom_http_exception_handler(request, exc):
     """Обработчик HTTP исключений"""
@@ -77,6 +143,12 @@ async def custom_http_exception_handler(request, exc):
     return await http_exception_handler(request, exc)
 
 
+@app.exception_handler(LeaseBusyError)
+async def lease_busy_handler(request: Request, exc: LeaseBusyError):
+    """Группа занята другим процессом дольше срока ожидания - 409"""
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Обработчик общих исключений"""
@@ -94,26 +166,16 @@ async def read_root(request: Request):
         # Получаем текущую группу из запроса (по умолчанию 1)
         group_id = int(request.query_params.get("group_id", 1))
 
-        # Загружаем данные ДЛЯ КОНКРЕТНОЙ ГРУППЫ
-        subjects = [s.model_dump() for s in await subject_service.get_all_subjects(group_id)]
-        lessons = [l.model_dump() for l in await schedule_service.get_all_lessons(group_id)]
-
-        # ПРЕПОДАВАТЕЛИ - ГЛОБАЛЬНЫЕ
-        teachers = [t.model_dump() for t in await teacher_service.get_all_teachers()]
+        # Загружаем данные группы и ГЛОБАЛЬНЫЕ справочники параллельно
+        bundle = await bootstrap_service.get_bundle(group_id)
+        subjects = bundle["subjects"]
+        lessons = bundle["lessons"]
+        teachers = bundle["teachers"]
+        groups = bundle["groups"]
+        negative_filters = bundle["negative_filters"]
+        print(f"✅ Загружено {len(negative_filters)} ГЛОБАЛЬНЫХ фильтров")
 
-        groups = [g.model_dump() for g in await group_service.get_all_groups()]
-
-        # Загружаем ГЛОБАЛЬНЫЕ фильтры
-        try:
-            from app.services.negative_filters_service import negative_filters_service
-            negative_filters = await negative_filters_service.get_negative_filters()
-            print(f"✅ Загружено {len(negative_filters)} ГЛОБАЛЬНЫХ фильтров")
-        except Exception as e:
-            print(f"⚠️ Ошибка загрузки глобальных фильтров: {e}")
-            negative_filters = {}
-
-        # Добавьте здесь вызов статистики для логирования
-        stats = await schedule_service.get_statistics(group_id)
+        stats = bundle["statistics"]
         print(
             f"📊 Статистика главной страницы для группы {group_id}: {stats['total_subjects']} предметов, {stats['total_teachers']} преподавателей, {stats['total_hours']} часов, {stats['remaining_hours']} осталось")
 
@@ -171,8 +233,50 @@ async def health_check():
     }
 
 
+@app.get("/api/debug/executors")
+async def executors_stats():
+    """Метрики пулов для CPU-нагрузки (очередь, выполнение, время ожидания)"""
+    return executors.get_stats()
+
+
+@app.get("/api/debug/locks")
+async def locks_stats(group_id: Optional[int] = None):
+    """Ожидание блокировок изменений расписания (global и по группам)"""
+    return locks.get_stats(group_id)
+
+
+@app.get("/api/debug/leases")
+async def leases_stats():
+    """Межпроцессные аренды: счетчики этого процесса и действующие аренды"""
+    return {**leases.get_stats(), "active": await leases.list_leases()}
+
+
+@app.get("/api/debug/traces")
+async def list_traces(limit: int = 50):
+    """Последние трассировки запросов: длительность, число SQL-запросов и время в БД"""
+    return tracer.list_traces(limit)
+
+
+@app.get("/api/debug/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Полная трассировка запроса: каждый SQL-запрос (длительность, строки, метод) и фазы"""
+    trace = tracer.get_trace(trace_id)
+    if trace is None:
+        raise StarletteHTTPException(status_code=404, detail="Трассировка не найдена")
+    return trace
+
+
 if __name__ == "__main__":
+    import asyncio
     import uvicorn
 
+    # Число процессов сервера; кэши и блокировки согласуются через базу (см. LeaseManager)
+    workers = int(os.getenv("SCHEDULE_WORKERS", "1"))
+    if workers > 1:
+        # Схему создаем один раз до запуска процессов; воркеры наследуют
+        # окружение и пропускают миграции, чтобы не выполнять их одновременно
+        asyncio.run(database.init_db())
+        os.environ[SCHEMA_READY_ENV] = "1"
+
     # Используем строку импорта вместо объекта app
-    uvicorn.run("main:app", port=8000, reload=False)
\ No newline at end of file
+    uvicorn.run("main:app", port=8000, reload=False, workers=workers)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from app.services.group_service import group_service
+from app.services.negative_filters_service import negative_filters_service
+from app.services.schedule_services import schedule_service
+from app.services.subject_services import subject_service
+from app.services.teacher_service import teacher_service
+
+
+class BootstrapService:
+    """Все данные для отрисовки страницы группы одним пакетом.
+
+    Загрузки независимы, поэтому выполняются параллельно (asyncio.gather),
+    каждая на своем соединении из пула БД.
+    """
+
+    @staticmethod
+    def version_scopes(group_id: int) -> List[Tuple[str, int]]:
+        """Версии данных (таблица, группа), от которых зависит пакет"""
+        return [
+            ("subjects", group_id), ("lessons", group_id), ("saved_schedules", group_id),
+            ("teachers", 0), ("study_groups", 0), ("negative_filters", 0)
+        ]
+
+    async def _get_negative_filters(self) -> Dict:
+        try:
+            return await negative_filters_service.get_negative_filters()
+        except Exception as e:
+            print(f"⚠️ Ошибка загрузки глобальных фильтров: {e}")
+            return {}
+
+    async def _get_lessons(self, group_id: int, lessons_since: Optional[int]):
+        if lessons_since is None:
+            return [l.model_dump() for l in await schedule_service.get_all_lessons(group_id)]
+        return await schedule_service.get_lesson_changes(group_id, lessons_since)
+
+    async def get_bundle(self, group_id: int = 1, lessons_since: Optional[int] = None) -> Dict:
+        """Предметы, уроки, фильтры, статистика и сохраненные расписания группы,
+        а также глобальные справочники преподавателей и групп.
+
+        При заданном lessons_since вместо полного списка уроков отдаются только
+        изменения после этой версии (ключ lesson_changes).
+        """
+        # Версию журнала читаем до уроков: изменения между запросами придут повторно
+        lessons_version = await schedule_service.get_lessons_version()
+
+        subjects, lessons, teachers, groups, negative_filters, statistics, saved_schedules = await asyncio.gather(
+            subject_service.get_all_subjects(group_id),
+            self._get_lessons(group_id, lessons_since),
+            teacher_service.get_all_teachers(),
+            group_service.get_all_groups(),
+            self._get_negative_filters(),
+            schedule_service.get_statistics(group_id),
+            schedule_service.get_saved_schedules(group_id)
+        )
+
+        bundle = {
+            "group_id": group_id,
+            "subjects": [s.model_dump() for s in subjects],
+            "teachers": [t.model_dump() for t in teachers],
+            "groups": [g.model_dump() for g in groups],
+            "negative_filters": negative_filters,
+            "statistics": statistics,
+            "saved_schedules": saved_schedules
+        }
+        if lessons_since is None:
+            bundle["lessons"] = lessons
+            bundle["lessons_version"] = lessons_version
+        else:
+            bundle["lesson_changes"] = lessons
+        return bundle
+
+
+# Глобальный экземпляр
+bootstrap_service = BootstrapService()
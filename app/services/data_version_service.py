@@ -0,0 +1,117 @@
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import Response
+
+from app.db.database import database
+from app.services.export_cache import content_hash, etag_matches
+
+
+# Период проверки записей, сделанных другими процессами
+DATA_VERSION_POLL_SECONDS = float(os.getenv("SCHEDULE_DATA_VERSION_POLL_SECONDS", "1.0"))
+
+
+class DataVersionService:
+    """Версии данных по таблицам и группам для условных GET-запросов.
+
+    Счетчики в data_versions увеличивают триггеры при каждой записи.
+    Здесь они хранятся в памяти и перечитываются, только если помечены
+    устаревшими: после коммита этого процесса (слушатель коммитов базы) или
+    когда фоновый опрос PRAGMA data_version раз в DATA_VERSION_POLL_SECONDS
+    заметил запись другого процесса. Поэтому проверка ETag и ответ 304 не
+    обращаются к базе. Без запущенного опроса (скрипты) PRAGMA проверяется
+    при каждом обращении.
+    """
+
+    def __init__(self, poll_seconds: float = DATA_VERSION_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._versions: Dict[Tuple[str, int], int] = {}
+        self._stale = True
+        # data_version, при котором были прочитаны версии
+        self._data_version: Optional[int] = None
+        self._poller: Optional[asyncio.Task] = None
+        self.reloads = 0
+        database.add_commit_listener(self._on_commit)
+
+    def _on_commit(self):
+        # Может вызываться из другого потока - только выставляем флаг
+        self._stale = True
+
+    async def _reload(self):
+        # Флаг снимаем до чтения: коммит во время чтения снова пометит версии устаревшими
+        self._stale = False
+        try:
+            data_version = await database.data_version()
+            rows = await database.fetch_all('SELECT table_name, group_id, version FROM data_versions')
+        except Exception:
+            self._stale = True
+            raise
+        self._versions = {(table, group_id): version for table, group_id, version in rows}
+        self._data_version = data_version
+        self.reloads += 1
+
+    async def _ensure_loaded(self) -> Dict[Tuple[str, int], int]:
+        if self._poller is None and await database.data_version() != self._data_version:
+            self._stale = True
+        if self._stale:
+            await self._reload()
+        return self._versions
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                if await database.data_version() != self._data_version:
+                    self._stale = True
+            except Exception as e:
+                print(f"⚠️ Ошибка проверки версии данных: {e}")
+
+    def start(self):
+        """Запустить опрос изменений других процессов (при старте приложения)"""
+        if self._poller is None:
+            self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        self._stale = True
+
+    def get_stats(self) -> Dict:
+        """Счетчики кэша версий"""
+        return {"reloads": self.reloads, "polling": self._poller is not None, "stale": self._stale}
+
+    async def get_versions(self) -> Dict[Tuple[str, int], int]:
+        """Все версии: (таблица, группа) -> версия"""
+        return dict(await self._ensure_loaded())
+
+    async def get_version(self, table: str, group_id: int = 0) -> int:
+        """Текущая версия таблицы (group_id = 0 для глобальных таблиц)"""
+        versions = await self._ensure_loaded()
+        return versions.get((table, group_id), 0)
+
+    async def etag(self, *scopes: Tuple[str, int]) -> str:
+        """Слабый ETag по версиям перечисленных (таблица, группа)"""
+        versions = await self._ensure_loaded()
+        parts = [f"epoch:{versions.get(('__epoch__', 0), 0)}"]
+        parts += [f"{table}:{group_id}:{versions.get((table, group_id), 0)}" for table, group_id in scopes]
+        return f'W/"{content_hash("|".join(parts))[:32]}"'
+
+    async def not_modified(self, if_none_match: Optional[str], response: Response,
+                           *scopes: Tuple[str, int]) -> Optional[Response]:
+        """Проставить ETag в ответ; если клиент прислал тот же ETag - вернуть 304.
+
+        no-cache: браузер хранит ответ, но перед использованием сверяет ETag.
+        """
+        etag = await self.etag(*scopes)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return None
+
+
+# Глобальный экземпляр
+data_version_service = DataVersionService()
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+from app.db.database import database
+from app.services.data_version_service import data_version_service
+
+
+# Размер буфера событий одного клиента
+EVENTS_CLIENT_BUFFER = int(os.getenv("SCHEDULE_EVENTS_BUFFER", "100"))
+# Период проверки изменений, сделанных другими процессами
+EVENTS_POLL_SECONDS = float(os.getenv("SCHEDULE_EVENTS_POLL_SECONDS", "1.0"))
+# Период комментария keep-alive в потоке SSE
+EVENTS_KEEPALIVE_SECONDS = 15.0
+
+# Таблица из data_versions -> тип события
+TABLE_EVENTS = {
+    'lessons': 'lessons',
+    'subjects': 'subjects',
+    'negative_filters': 'filters',
+    'teachers': 'teachers',
+    'study_groups': 'groups',
+    'saved_schedules': 'saved_schedules',
+}
+
+
+def format_sse(event: Dict) -> str:
+    """Событие в формате text/event-stream"""
+    payload = json.dumps(event, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+class EventSubscription:
+    """Подписка одного клиента: ограниченный буфер событий.
+
+    Если клиент не успевает читать и буфер заполнен, накопленные события
+    отбрасываются и вместо них кладется одно событие resync - клиенту
+    нужно заново загрузить данные. Так медленный клиент не задерживает
+    остальных и не расходует память без ограничений.
+    """
+
+    def __init__(self, group_id: Optional[int], buffer_size: int):
+        self.group_id = group_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.closed = False
+
+    def matches(self, event: Dict) -> bool:
+        group_id = event.get("group_id")
+        return group_id is None or self.group_id is None or group_id == self.group_id
+
+    def offer(self, event: Dict) -> bool:
+        """Положить событие в буфер; False - буфер переполнен и сброшен"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait({"type": "resync", "id": event.get("id"), "group_id": None})
+            return False
+
+    async def next_event(self, timeout: float) -> Optional[Dict]:
+        """Следующее событие; при таймауте - событие keepalive"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return {"type": "keepalive"}
+
+
+class EventHub:
+    """Внутрипроцессная рассылка событий об изменениях расписания (SSE).
+
+    Изменения данных определяются по счетчикам data_versions: после каждого
+    коммита этого процесса (и раз в EVENTS_POLL_SECONDS для других процессов)
+    версии сравниваются с предыдущими, и по каждой изменившейся паре
+    (таблица, группа) публикуется событие. Изменение уроков одной группы
+    дополнительно публикуется всем как availability - занятость преподавателей.
+    Остальные события (generation, job) сервисы публикуют сами.
+    """
+
+    def __init__(self, buffer_size: int = EVENTS_CLIENT_BUFFER, poll_seconds: float = EVENTS_POLL_SECONDS):
+        self.buffer_size = buffer_size
+        self.poll_seconds = poll_seconds
+        self._subscribers: Set[EventSubscription] = set()
+        self._sequence = 0
+        self._versions: Optional[Dict] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.overflows = 0
+
+    # ---------- Публикация ----------
+
+    def publish(self, event_type: str, group_id: Optional[int] = None, **data) -> Dict:
+        """Разослать событие подписчикам группы (group_id=None - всем)"""
+        self._sequence += 1
+        event = {"id": self._sequence, "type": event_type, "group_id": group_id,
+                 "timestamp": time.time(), **data}
+        self.published += 1
+        for subscription in list(self._subscribers):
+            if subscription.matches(event) and not subscription.offer(event):
+                self.overflows += 1
+        return event
+
+    # ---------- Подписка ----------
+
+    def subscribe(self, group_id: Optional[int] = None) -> EventSubscription:
+        subscription = EventSubscription(group_id, self.buffer_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        subscription.closed = True
+        self._subscribers.discard(subscription)
+
+    async def stream(self, group_id: Optional[int] = None) -> AsyncIterator[str]:
+        """Поток SSE: подписка живет, пока клиент читает поток"""
+        subscription = self.subscribe(group_id)
+        try:
+            hello = {"id": self._sequence, "type": "hello", "group_id": subscription.group_id}
+            yield f"retry: 3000\nevent: hello\ndata: {json.dumps(hello)}\n\n"
+            while not subscription.closed:
+                event = await subscription.next_event(EVENTS_KEEPALIVE_SECONDS)
+                if event is None:
+                    break
+                if event["type"] == "keepalive":
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            self.unsubscribe(subscription)
+
+    # ---------- Отслеживание изменений в БД ----------
+
+    def _on_commit(self):
+        # Коммит может произойти в другом потоке - будим наблюдателя через его loop
+        if self._wake is None or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _check_versions(self):
+        versions = await data_version_service.get_versions()
+        previous, self._versions = self._versions, versions
+        if previous is None:
+            return
+
+        for (table, group_id), version in versions.items():
+            event_type = TABLE_EVENTS.get(table)
+            if event_type is None or previous.get((table, group_id)) == version:
+                continue
+            scope = group_id or None  # 0 - глобальные таблицы
+            self.publish(event_type, scope, version=version)
+            if table == 'lessons':
+                self.publish("availability", None, source_group_id=group_id)
+
+    async def _watch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._check_versions()
+            except Exception as e:
+                print(f"⚠️ Ошибка отслеживания изменений: {e}")
+
+    async def start(self):
+        """Запустить наблюдение за изменениями (при старте приложения)"""
+        if self._watcher is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        try:
+            await self._check_versions()
+        except Exception as e:
+            print(f"⚠️ Не удалось прочитать версии данных: {e}")
+        database.add_commit_listener(self._on_commit)
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        """Остановить наблюдение и закрыть потоки клиентов"""
+        database.remove_commit_listener(self._on_commit)
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        for subscription in list(self._subscribers):
+            subscription.closed = True
+            try:
+                subscription.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self._subscribers.clear()
+        self._versions = None
+        self._loop = None
+        self._wake = None
+
+    def get_stats(self) -> Dict:
+        """Статистика рассылки"""
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "overflows": self.overflows,
+            "dropped_events": sum(s.dropped for s in self._subscribers),
+            "buffer_size": self.buffer_size,
+            "max_buffered": max((s.queue.qsize() for s in self._subscribers), default=0)
+        }
+
+
+# Глобальный экземпляр
+event_hub = EventHub()
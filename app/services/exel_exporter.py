@@ -1,9 +1,96 @@
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
 from openpyxl.utils import get_column_letter
+import asyncio
+import concurrent.futures
 import io
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Iterable, Tuple
+
+from app.core.executors import executors
+
+# Описание листа: (название листа, заголовок над таблицей, уроки).
+# Урок - словарь day, time_slot, subject_name, teacher; необязательный ключ
+# note заменяет имя преподавателя в скобках (например, группа на листе преподавателя).
+SheetSpec = Tuple[str, str, Iterable[Dict[str, Any]]]
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Размер порции, отдаваемой клиенту при потоковой выгрузке
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _create_named_styles() -> List[NamedStyle]:
+    """Именованные стили книги: ячейки ссылаются на них по имени, а не хранят свои копии"""
+    title = NamedStyle(name="schedule_title")
+    title.font = Font(size=16, bold=True)
+    title.alignment = Alignment(horizontal='center')
+
+    subtitle = NamedStyle(name="schedule_subtitle")
+    subtitle.alignment = Alignment(horizontal='center')
+
+    header = NamedStyle(name="schedule_header")
+    header.font = Font(bold=True)
+    header.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
+    header.alignment = Alignment(horizontal='center', vertical='center')
+
+    time = NamedStyle(name="schedule_time")
+    time.font = Font(bold=True)
+    time.alignment = Alignment(horizontal='center', vertical='center')
+
+    lesson = NamedStyle(name="schedule_lesson")
+    lesson.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    lesson.fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
+
+    return [title, subtitle, header, time, lesson]
+
+
+class _ChunkPipe:
+    """Файлоподобный объект: книга пишется в него из рабочего потока,
+    а event loop забирает готовые порции байт из ограниченной очереди."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_chunks: int = 8):
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._cancelled = False
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        if len(self._buffer) >= STREAM_CHUNK_SIZE:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _put(self, item):
+        # Ждем места в очереди; если клиент отключился - прерываем запись книги
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        while not self._cancelled:
+            try:
+                future.result(timeout=1)
+                return
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+        raise BrokenPipeError("Клиент прервал загрузку")
+
+    def finish(self):
+        """Отдать остаток буфера и признак конца потока"""
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        self._put(None)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def cancel(self):
+        """Прервать запись (вызывается из event loop)"""
+        self._cancelled = True
 
 
 class ExcelExporter:
@@ -16,70 +103,113 @@ class ExcelExporter:
             '14:20-15:50'
         ]
 
-    async def export_schedule_to_excel(self, lessons: List[Dict[str, Any]], schedule_name: str) -> bytes:
-        """Экспорт расписания в Excel"""
-
-        # Создаем workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Расписание"
-
-        # Устанавливаем заголовок
-        ws['A1'] = f"Расписание: {schedule_name}"
-        ws['A1'].font = Font(size=16, bold=True)
-        ws.merge_cells('A1:H1')
-        ws['A1'].alignment = Alignment(horizontal='center')
-
-        # Дата генерации
-        ws['A2'] = f"Сгенерировано: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
-        ws.merge_cells('A2:H2')
-        ws['A2'].alignment = Alignment(horizontal='center')
-
-        # Заголовки дней недели
-        headers = ['Время'] + self.week_days
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=4, column=col, value=header)
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        # Временные слоты
-        for row, time_slot in enumerate(self.time_slots, 5):
-            time_cell = ws.cell(row=row, column=1, value=time_slot)
-            time_cell.font = Font(bold=True)
-            time_cell.alignment = Alignment(horizontal='center', vertical='center')
-
-        # Заполняем расписание
-        for lesson in lessons:
-            day = lesson.get('day', 0)
-            time_slot = lesson.get('time_slot', 0)
-            subject = lesson.get('subject_name', '')
-            teacher = lesson.get('teacher', '')
-
-            if 0 <= day < 7 and 0 <= time_slot < 4:
-                cell_value = f"{subject}\n({teacher})"
-                cell = ws.cell(row=time_slot + 5, column=day + 2, value=cell_value)
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    def _styled(self, ws, value, style: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
 
-                # Заливка для занятых ячеек
-                cell.fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")
+    def _write_schedule_sheet(self, wb: Workbook, title: str, heading: str,
+                              lessons: Iterable[Dict[str, Any]], generated_at: str):
+        """Записать лист с сеткой расписания (режим write-only: строки пишутся по порядку)"""
+        ws = wb.create_sheet(title=title)
 
-        # Настраиваем ширину колонок
+        # Размеры колонок и строк задаются до записи строк
         column_widths = [15, 25, 25, 25, 25, 25, 25, 25]  # A-H
         for i, width in enumerate(column_widths, 1):
             ws.column_dimensions[get_column_letter(i)].width = width
-
-        # Высота строк для временных слотов
         for row in range(5, 9):
             ws.row_dimensions[row].height = 60
 
-        # Сохраняем в bytes
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        # Раскладываем уроки по сетке (несколько уроков в слоте - конфликт, показываем все)
+        grid = [[None] * 7 for _ in range(4)]
+        for lesson in lessons:
+            day = lesson.get('day', 0)
+            time_slot = lesson.get('time_slot', 0)
+            if 0 <= day < 7 and 0 <= time_slot < 4:
+                text = f"{lesson.get('subject_name', '')}\n({lesson.get('note', lesson.get('teacher', ''))})"
+                current = grid[time_slot][day]
+                grid[time_slot][day] = f"{current}\n{text}" if current else text
+
+        ws.append([self._styled(ws, heading, "schedule_title")])
+        ws.append([self._styled(ws, f"Сгенерировано: {generated_at}", "schedule_subtitle")])
+        ws.merged_cells.add('A1:H1')
+        ws.merged_cells.add('A2:H2')
+        ws.append([])
+
+        ws.append([self._styled(ws, header, "schedule_header") for header in ['Время'] + self.week_days])
+
+        for time_slot, row in zip(self.time_slots, grid):
+            ws.append(
+                [self._styled(ws, time_slot, "schedule_time")] +
+                [self._styled(ws, value, "schedule_lesson") if value else None for value in row]
+            )
+
+    def _write_workbook(self, sheets: Iterable[SheetSpec], fileobj):
+        """Собрать книгу в режиме write-only и записать в fileobj (синхронно)"""
+        wb = Workbook(write_only=True)
+        for style in _create_named_styles():
+            wb.add_named_style(style)
+
+        generated_at = datetime.now().strftime('%d.%m.%Y %H:%M')
+        used_titles = set()
+        for title, heading, lessons in sheets:
+            title = self._unique_sheet_title(title, used_titles)
+            self._write_schedule_sheet(wb, title, heading, lessons, generated_at)
+
+        if not used_titles:
+            wb.create_sheet(title="Расписание")
+
+        wb.save(fileobj)
+
+    @staticmethod
+    def _unique_sheet_title(title: str, used_titles: set) -> str:
+        """Название листа Excel: до 31 символа, без запрещенных знаков, уникальное"""
+        title = ''.join(c for c in str(title) if c not in '[]:*?/\\').strip() or "Лист"
+        title = title[:31]
+        candidate, n = title, 2
+        while candidate.lower() in used_titles:
+            suffix = f" ({n})"
+            candidate = title[:31 - len(suffix)] + suffix
+            n += 1
+        used_titles.add(candidate.lower())
+        return candidate
+
+    async def stream_workbook(self, sheets: Iterable[SheetSpec]) -> AsyncIterator[bytes]:
+        """Потоково отдать книгу: порции байт уходят клиенту по мере сжатия,
+        в памяти держится не больше нескольких порций."""
+        pipe = _ChunkPipe(asyncio.get_running_loop())
+
+        def produce():
+            try:
+                self._write_workbook(sheets, pipe)
+            finally:
+                pipe.finish()
+
+        task = asyncio.ensure_future(executors.run_in_thread(produce))
+        try:
+            while True:
+                chunk = await pipe.get()
+                if chunk is None:
+                    break
+                yield chunk
+            await task
+        except Exception as e:
+            print(f"❌ Ошибка потоковой выгрузки Excel: {e}")
+            raise
+        finally:
+            pipe.cancel()
+            if not task.done():
+                # Клиент отключился - ошибку прерванной записи никто не ждет
+                task.add_done_callback(lambda f: f.cancelled() or f.exception())
 
+    async def export_schedule_to_excel(self, lessons: List[Dict[str, Any]], schedule_name: str) -> bytes:
+        """Экспорт расписания в Excel (целиком в памяти)"""
+        output = io.BytesIO()
+        await executors.run_in_thread(
+            self._write_workbook, [("Расписание", f"Расписание: {schedule_name}", lessons)], output
+        )
         return output.getvalue()
 
 
 # Глобальный экземпляр
-excel_exporter = ExcelExporter()
\ No newline at end of file
+excel_exporter = ExcelExporter()
@@ -0,0 +1,190 @@
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, Hashable, Optional, Tuple
+
+from app.core.executors import executors
+
+
+# Лимиты кэша (переопределяются переменными окружения)
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("SCHEDULE_EXPORT_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Каталог для вытесненных из памяти файлов; пусто - без записи на диск
+EXPORT_CACHE_DIR = os.getenv("SCHEDULE_EXPORT_CACHE_DIR", "")
+EXPORT_CACHE_DISK_MAX_BYTES = int(os.getenv("SCHEDULE_EXPORT_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+
+
+def content_hash(data) -> str:
+    """SHA-256 содержимого (строки или байт)"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверить заголовок If-None-Match (слабое сравнение, список или *)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    if etag.startswith('W/'):
+        etag = etag[2:]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ExportCache:
+    """LRU-кэш готовых файлов экспорта, ограниченный суммарным размером.
+
+    Ключ - (ID расписания, хэш содержимого, формат), поэтому изменение данных
+    дает новый ключ, а старая запись просто вытесняется. ETag записи - хэш
+    ключа, а не байт, и его можно сверить до рендера. ETag слабый: XLSX
+    содержит время формирования, и повторный рендер после вытеснения дает
+    те же данные, но другие байты.
+
+    Вытесненные из памяти записи при заданном EXPORT_CACHE_DIR сохраняются
+    на диск (со своим лимитом размера).
+    """
+
+    def __init__(self, max_bytes: int = EXPORT_CACHE_MAX_BYTES, spill_dir: str = EXPORT_CACHE_DIR,
+                 disk_max_bytes: int = EXPORT_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self._memory: "OrderedDict[Hashable, Tuple[str, bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Записи на диске: ключ -> (etag, путь, размер)
+        self._disk: "OrderedDict[Hashable, Tuple[str, Path, int]]" = OrderedDict()
+        self._disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_etag(key: Hashable) -> str:
+        """Слабый ETag по ключу кэша (ключ однозначно задает данные, но не байты файла)"""
+        return f'W/"{content_hash(repr(key))[:32]}"'
+
+    async def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        """Получить (etag, данные) или None"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        disk_entry = self._disk.pop(key, None)
+        if disk_entry is not None:
+            etag, path, size = disk_entry
+            self._disk_bytes -= size
+            try:
+                data = await executors.run_in_thread(path.read_bytes)
+                await executors.run_in_thread(self._unlink, path)
+            except OSError as e:
+                print(f"⚠️ Не удалось прочитать кэш экспорта {path}: {e}")
+            else:
+                self.disk_hits += 1
+                # Возвращаем запись в память
+                await self._store(key, etag, data)
+                return etag, data
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: Hashable, data: bytes) -> str:
+        """Сохранить данные, вернуть ETag"""
+        etag = self.make_etag(key)
+        await self._store(key, etag, data)
+        return etag
+
+    async def tee(self, key: Hashable, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Отдать порции потока и сохранить собранный файл в кэш.
+
+        Файл кэшируется, только если поток дочитан до конца (клиент не отключился)
+        и его размер не превышает лимит памяти.
+        """
+        parts = []
+        size = 0
+        async for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= self.max_bytes:
+                    parts.append(chunk)
+                else:
+                    parts = None  # Слишком большой файл не кэшируем - и не копим его порции
+            yield chunk
+        if parts is not None:
+            await self.put(key, b"".join(parts))
+
+    async def _store(self, key: Hashable, etag: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return  # Слишком большой файл не кэшируем
+
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old[1])
+
+        self._memory[key] = (etag, data)
+        self._memory_bytes += len(data)
+
+        while self._memory_bytes > self.max_bytes:
+            evicted_key, (evicted_etag, evicted_data) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted_data)
+            if self.spill_dir is not None:
+                await self._spill(evicted_key, evicted_etag, evicted_data)
+
+    async def _spill(self, key: Hashable, etag: str, data: bytes):
+        """Сохранить вытесненную запись на диск"""
+        if len(data) > self.disk_max_bytes:
+            return
+
+        path = self.spill_dir / f"{content_hash(repr(key))}.bin"
+        try:
+            await executors.run_in_thread(self._write_file, path, data)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить кэш экспорта на диск: {e}")
+            return
+
+        self._disk[key] = (etag, path, len(data))
+        self._disk_bytes += len(data)
+
+        while self._disk_bytes > self.disk_max_bytes:
+            _, (_, old_path, size) = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            await executors.run_in_thread(self._unlink, old_path)
+
+    @staticmethod
+    def _write_file(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    @staticmethod
+    def _unlink(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def get_stats(self) -> Dict:
+        """Статистика кэша экспорта"""
+        total = self.hits + self.disk_hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "max_bytes": self.max_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes
+        }
+
+
+# Глобальный экземпляр
+export_cache = ExportCache()
@@ -0,0 +1,217 @@
+import csv
+import hashlib
+import io
+import json
+from abc import ABC, abstractmethod
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from app.services.exel_exporter import excel_exporter, SheetSpec, XLSX_MEDIA_TYPE
+
+
+WEEK_DAYS = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+TIME_SLOTS = [
+    ("09:00", "10:30"),
+    ("10:40", "12:10"),
+    ("12:40", "14:10"),
+    ("14:20", "15:50")
+]
+
+
+def _valid_lessons(lessons: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+    """Уроки внутри сетки недели, по порядку дней и пар"""
+    valid = [
+        lesson for lesson in lessons
+        if 0 <= lesson.get('day', -1) < len(WEEK_DAYS) and 0 <= lesson.get('time_slot', -1) < len(TIME_SLOTS)
+    ]
+    return sorted(valid, key=lambda lesson: (lesson['day'], lesson['time_slot']))
+
+
+class ScheduleExporter(ABC):
+    """Базовый экспортер: превращает листы (название, заголовок, уроки) в поток байт"""
+
+    format: str = ""
+    media_type: str = "application/octet-stream"
+    extension: str = ""
+
+    @abstractmethod
+    def stream(self, sheets: List[SheetSpec], **options) -> AsyncIterator[bytes]:
+        """Файл частями (в наследниках - асинхронный генератор)"""
+
+    async def render(self, sheets: List[SheetSpec], **options) -> bytes:
+        """Собрать весь файл в память (для кэширования)"""
+        chunks = [chunk async for chunk in self.stream(sheets, **options)]
+        return b"".join(chunks)
+
+
+class XlsxExporter(ScheduleExporter):
+    format = "xlsx"
+    media_type = XLSX_MEDIA_TYPE
+    extension = "xlsx"
+
+    async def stream(self, sheets: List[SheetSpec], **options) -> AsyncIterator[bytes]:
+        async for chunk in excel_exporter.stream_workbook(sheets):
+            yield chunk
+
+
+class CsvExporter(ScheduleExporter):
+    """CSV: одна строка на урок; BOM в начале, чтобы Excel распознал UTF-8"""
+
+    format = "csv"
+    media_type = "text/csv"  # charset=utf-8 добавляет Response
+    extension = "csv"
+
+    HEADER = ['sheet', 'day', 'day_name', 'time_slot', 'start', 'end', 'subject_name', 'teacher', 'note']
+
+    async def stream(self, sheets: List[SheetSpec], **options) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush() -> bytes:
+            data = buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            return data
+
+        writer.writerow(self.HEADER)
+        yield '\ufeff'.encode('utf-8') + flush()
+
+        for title, _, lessons in sheets:
+            for lesson in _valid_lessons(lessons):
+                start, end = TIME_SLOTS[lesson['time_slot']]
+                writer.writerow([
+                    title, lesson['day'], WEEK_DAYS[lesson['day']], lesson['time_slot'], start, end,
+                    lesson.get('subject_name', ''), lesson.get('teacher', ''), lesson.get('note', '')
+                ])
+            yield flush()
+
+
+class NdjsonExporter(ScheduleExporter):
+    """Newline-delimited JSON: один объект на урок"""
+
+    format = "ndjson"
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    async def stream(self, sheets: List[SheetSpec], **options) -> AsyncIterator[bytes]:
+        for title, _, lessons in sheets:
+            lines = []
+            for lesson in _valid_lessons(lessons):
+                start, end = TIME_SLOTS[lesson['time_slot']]
+                record = {
+                    "sheet": title,
+                    "day": lesson['day'],
+                    "day_name": WEEK_DAYS[lesson['day']],
+                    "time_slot": lesson['time_slot'],
+                    "start": start,
+                    "end": end,
+                    "subject_name": lesson.get('subject_name', ''),
+                    "teacher": lesson.get('teacher', '')
+                }
+                if lesson.get('note'):
+                    record["note"] = lesson['note']
+                lines.append(json.dumps(record, ensure_ascii=False))
+            if lines:
+                yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class IcsExporter(ScheduleExporter):
+    """iCalendar: еженедельно повторяющееся событие на каждый урок.
+
+    Опции: start_date - первая неделя (по умолчанию текущая), weeks - число
+    повторений (по умолчанию 16), stamp - время создания данных для DTSTAMP
+    (по умолчанию полночь UTC первого дня). DTSTAMP не берется из текущего
+    времени, чтобы одни и те же данные давали одинаковый файл. Время
+    занятий указывается локальное (floating).
+    """
+
+    format = "ics"
+    media_type = "text/calendar"  # charset=utf-8 добавляет Response
+    extension = "ics"
+
+    DEFAULT_WEEKS = 16
+
+    @staticmethod
+    def _escape(text: str) -> str:
+        return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+                .replace(',', '\\,').replace('\n', '\\n'))
+
+    @staticmethod
+    def _fold(line: str) -> str:
+        """Перенос строк длиннее 75 октетов (RFC 5545, 3.1)"""
+        encoded = line.encode('utf-8')
+        if len(encoded) <= 75:
+            return line + '\r\n'
+        parts, current = [], b''
+        for char in line:
+            char_bytes = char.encode('utf-8')
+            if len(current) + len(char_bytes) > (75 if not parts else 74):
+                parts.append(current.decode('utf-8'))
+                current = b''
+            current += char_bytes
+        parts.append(current.decode('utf-8'))
+        return '\r\n '.join(parts) + '\r\n'
+
+    def _event(self, title: str, lesson: Dict[str, Any], monday: date, weeks: int, stamp: str) -> str:
+        day, time_slot = lesson['day'], lesson['time_slot']
+        start, end = TIME_SLOTS[time_slot]
+        event_date = (monday + timedelta(days=day)).strftime('%Y%m%d')
+        subject = lesson.get('subject_name', '')
+        detail = lesson.get('note') or lesson.get('teacher', '')
+        uid_source = f"{title}|{day}|{time_slot}|{lesson.get('teacher', '')}|{subject}"
+        uid = hashlib.sha1(uid_source.encode('utf-8')).hexdigest()
+
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@schedule-generator",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART:{event_date}T{start.replace(':', '')}00",
+            f"DTEND:{event_date}T{end.replace(':', '')}00",
+            f"RRULE:FREQ=WEEKLY;COUNT={weeks}",
+            f"SUMMARY:{self._escape(f'{subject} ({detail})' if detail else subject)}",
+            f"DESCRIPTION:{self._escape(f'{title}, пара {time_slot + 1}')}",
+            f"CATEGORIES:{self._escape(title)}",
+            "END:VEVENT"
+        ]
+        return ''.join(self._fold(line) for line in lines)
+
+    async def stream(self, sheets: List[SheetSpec], start_date: Optional[date] = None,
+                     weeks: Optional[int] = None, stamp: Optional[datetime] = None,
+                     **options) -> AsyncIterator[bytes]:
+        start_date = start_date or date.today()
+        monday = start_date - timedelta(days=start_date.weekday())
+        weeks = weeks or self.DEFAULT_WEEKS
+        if stamp is None:
+            stamp = datetime.combine(monday, time.min, tzinfo=timezone.utc)
+        stamp = stamp.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+        header = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//Schedule Generator//RU", "CALSCALE:GREGORIAN"]
+        yield ''.join(self._fold(line) for line in header).encode('utf-8')
+
+        for title, _, lessons in sheets:
+            events = [self._event(title, lesson, monday, weeks, stamp) for lesson in _valid_lessons(lessons)]
+            if events:
+                yield ''.join(events).encode('utf-8')
+
+        yield self._fold("END:VCALENDAR").encode('utf-8')
+
+
+# Реестр экспортеров: формат -> экспортер
+EXPORTERS: Dict[str, ScheduleExporter] = {}
+
+
+def register_exporter(exporter: ScheduleExporter):
+    """Зарегистрировать экспортер нового формата"""
+    EXPORTERS[exporter.format] = exporter
+
+
+def get_exporter(export_format: str) -> ScheduleExporter:
+    """Получить экспортер по формату"""
+    exporter = EXPORTERS.get((export_format or "").lower())
+    if exporter is None:
+        raise ValueError(f"Неизвестный формат экспорта '{export_format}'. Доступны: {', '.join(sorted(EXPORTERS))}")
+    return exporter
+
+
+for _exporter in (XlsxExporter(), CsvExporter(), NdjsonExporter(), IcsExporter()):
+    register_exporter(_exporter)
@@ -1,6 +1,7 @@
+from app.core.locks import locks
 from app.db.database import database
 from app.db.models import StudyGroup, StudyGroupCreate
-from typing import List, Optional
+from typing import Dict, List, Optional
 import json
 
 
@@ -72,56 +73,113 @@ class GroupService:
 
     async def delete_group(self, group_id: int) -> bool:
         """Удалить группу и все её данные"""
-        if group_id == 1:
-            raise ValueError("Нельзя удалить основную группу")
-
-        try:
-            print(f"🗑️ Удаление группы {group_id} и всех её данных...")
-
-            # 1. Проверяем существование группы
-            group_exists = await database.fetch_one(
-                'SELECT id FROM study_groups WHERE id = ?',
-                (group_id,)
-            )
-            if not group_exists:
-                print(f"❌ Группа {group_id} не найдена")
-                return False
-
-            # 2. Удаляем данные группы из всех таблиц
-            tables_to_clean = [
-                'subjects',  # Предметы группы
-                'lessons',  # Расписание группы
-                'saved_schedules'  # Сохраненные расписания группы
-            ]
-
-            for table in tables_to_clean:
-                try:
-                    result = await database.execute(
-                        f'DELETE FROM {table} WHERE group_id = ?',
-                        (group_id,)
+        async with locks.group(group_id):
+            if group_id == 1:
+                raise ValueError("Нельзя удалить основную группу")
+
+            try:
+                print(f"🗑️ Удаление группы {group_id} и всех её данных...")
+
+                # Предметы, уроки и сохраненные расписания группы удаляются
+                # каскадно (ON DELETE CASCADE) в том же запросе
+                result = await database.execute(
+                    'DELETE FROM study_groups WHERE id = ?',
+                    (group_id,)
+                )
+
+                if result.rowcount > 0:
+                    print(f"✅ Группа {group_id} успешно удалена")
+                    return True
+                else:
+                    print(f"❌ Группа {group_id} не найдена")
+                    return False
+
+            except Exception as e:
+                print(f"❌ Ошибка удаления группы {group_id}: {e}")
+                import traceback
+                print(f"❌ Traceback: {traceback.format_exc()}")
+                raise ValueError(f"Ошибка удаления группы: {str(e)}")
+
+    async def clone_group(self, source_group_id: int, name: str, include_lessons: bool = False) -> Dict:
+        """Создать группу-копию: предметы (и при необходимости расписание) исходной группы.
+
+        Копирование выполняется запросами INSERT ... SELECT в одной транзакции.
+        Преподаватели общие для всех групп, поэтому урок копируется, только
+        если его преподаватель свободен в этом слоте во всех группах, включая
+        исходную; остальные уроки пропускаются (их число - в lessons_skipped).
+        """
+        async with locks.group(source_group_id):
+            async with database.transaction() as conn:
+                cursor = await conn.execute(
+                    'SELECT id FROM study_groups WHERE id = ?',
+                    (source_group_id,)
+                )
+                if not await cursor.fetchone():
+                    raise ValueError("Исходная группа не найдена")
+
+                cursor = await conn.execute(
+                    'SELECT id FROM study_groups WHERE name = ?',
+                    (name,)
+                )
+                if await cursor.fetchone():
+                    raise ValueError(f"Группа с именем '{name}' уже существует")
+
+                cursor = await conn.execute(
+                    'INSERT INTO study_groups (name) VALUES (?)',
+                    (name,)
+                )
+                group_id = cursor.lastrowid
+
+                # Оставшиеся часы новых предметов выставят триггеры
+                cursor = await conn.execute(
+                    '''INSERT INTO subjects
+                       (teacher, subject_name, total_hours, remaining_hours, remaining_pairs,
+                        priority, max_per_day, group_id, min_per_week, max_per_week)
+                       SELECT teacher, subject_name, total_hours, total_hours, total_hours / 2,
+                              priority, max_per_day, ?, min_per_week, max_per_week
+                       FROM subjects WHERE group_id = ?''',
+                    (group_id, source_group_id)
+                )
+                subjects_copied = cursor.rowcount
+
+                lessons_copied = 0
+                lessons_skipped = 0
+                if include_lessons:
+                    cursor = await conn.execute(
+                        'SELECT COUNT(*) FROM lessons WHERE group_id = ?',
+                        (source_group_id,)
                     )
-                    print(f"🧹 Удалено из {table}: {result.rowcount} записей")
-                except Exception as e:
-                    print(f"⚠️ Ошибка при очистке {table}: {e}")
-
-            # 3. Удаляем саму группу
-            result = await database.execute(
-                'DELETE FROM study_groups WHERE id = ?',
-                (group_id,)
-            )
-
-            if result.rowcount > 0:
-                print(f"✅ Группа {group_id} успешно удалена")
-                return True
-            else:
-                print(f"❌ Не удалось удалить группу {group_id}")
-                return False
-
-        except Exception as e:
-            print(f"❌ Ошибка удаления группы {group_id}: {e}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            raise ValueError(f"Ошибка удаления группы: {str(e)}")
+                    lessons_total = (await cursor.fetchone())[0]
+
+                    # Преподаватель не должен оказаться в одном слоте в двух группах
+                    cursor = await conn.execute(
+                        '''INSERT INTO lessons (day, time_slot, teacher, subject_name, editable, group_id)
+                           SELECT l.day, l.time_slot, l.teacher, l.subject_name, l.editable, ?
+                           FROM lessons l
+                           WHERE l.group_id = ? AND NOT EXISTS (
+                               SELECT 1 FROM lessons o
+                               WHERE o.teacher = l.teacher AND o.day = l.day
+                                 AND o.time_slot = l.time_slot AND o.group_id != ?)''',
+                        (group_id, source_group_id, group_id)
+                    )
+                    lessons_copied = cursor.rowcount
+                    lessons_skipped = lessons_total - lessons_copied
+
+                cursor = await conn.execute(
+                    'SELECT id, name, created_at FROM study_groups WHERE id = ?',
+                    (group_id,)
+                )
+                group = await cursor.fetchone()
+
+            print(f"✅ Группа {source_group_id} скопирована в '{name}' (ID: {group_id}): "
+                  f"{subjects_copied} предметов, {lessons_copied} уроков, пропущено {lessons_skipped}")
+
+            return {
+                "group": StudyGroup(id=group[0], name=group[1], created_at=group[2]),
+                "subjects_copied": subjects_copied,
+                "lessons_copied": lessons_copied,
+                "lessons_skipped": lessons_skipped
+            }
 
     async def group_exists(self, group_id: int) -> bool:
         """Проверить существование группы"""
@@ -0,0 +1,265 @@
+import codecs
+import csv
+import math
+from typing import Dict, Iterator, List, Set, Tuple
+
+from zipfile import BadZipFile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from app.core.executors import executors
+from app.core.locks import locks
+from app.db.database import database
+from app.services.subject_services import normalize_week_quotas
+
+
+# Допустимые заголовки колонок файла -> имя поля
+HEADER_ALIASES = {
+    'teacher': 'teacher',
+    'преподаватель': 'teacher',
+    'subject_name': 'subject_name',
+    'subject': 'subject_name',
+    'предмет': 'subject_name',
+    'hours': 'hours',
+    'часы': 'hours',
+    'priority': 'priority',
+    'приоритет': 'priority',
+    'max_per_day': 'max_per_day',
+    'min_per_week': 'min_per_week',
+    'max_per_week': 'max_per_week',
+    'group': 'group',
+    'group_id': 'group',
+    'группа': 'group',
+}
+
+# Значения по умолчанию - как у POST /api/subjects
+INT_FIELDS = {
+    'hours': None,
+    'priority': 0,
+    'max_per_day': 2,
+    'min_per_week': 1,
+    'max_per_week': 20,
+}
+
+
+class ImportService:
+    """Массовый импорт преподавателей и предметов из CSV/XLSX.
+
+    Файл читается построчно, строки проверяются в памяти по заранее
+    загруженным справочникам (преподаватели, группы, предметы), а все
+    вставки выполняются executemany в одной транзакции.
+    """
+
+    SUPPORTED_EXTENSIONS = ('.csv', '.xlsx')
+
+    @staticmethod
+    def _iter_csv(file) -> Iterator[List]:
+        """Построчно читать CSV (UTF-8, разделитель ; или ,)"""
+        reader = codecs.getreader('utf-8-sig')(file)
+        first_line = reader.readline()
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        yield next(csv.reader([first_line], delimiter=delimiter), [])
+        yield from csv.reader(reader, delimiter=delimiter)
+
+    @staticmethod
+    def _iter_xlsx(file) -> Iterator[Tuple]:
+        """Построчно читать первый лист XLSX в режиме read-only"""
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from wb.worksheets[0].iter_rows(values_only=True)
+        finally:
+            wb.close()
+
+    def _iter_rows(self, filename: str, file) -> Iterator[Tuple[int, Dict]]:
+        """Строки файла в виде (номер строки, {поле: значение})"""
+        rows = self._iter_xlsx(file) if filename.lower().endswith('.xlsx') else self._iter_csv(file)
+
+        header = next(rows, None)
+        if not header:
+            raise ValueError("Файл пуст")
+
+        fields = [HEADER_ALIASES.get(str(h).strip().lower()) if h is not None else None for h in header]
+        if 'teacher' not in fields:
+            raise ValueError("В файле нет колонки 'teacher' (преподаватель)")
+
+        for row_number, values in enumerate(rows, start=2):
+            data = {}
+            for field, value in zip(fields, values):
+                if field is None or value is None:
+                    continue
+                value = str(value).strip() if not isinstance(value, (int, float)) else value
+                if value != '':
+                    data[field] = value
+            if data:
+                yield row_number, data
+
+    @staticmethod
+    def _parse_int(data: Dict, field: str) -> int:
+        value = data.get(field, INT_FIELDS[field])
+        if value is None:
+            raise ValueError(f"Не указано поле '{field}'")
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Поле '{field}' должно быть числом: {value}")
+        if not math.isfinite(number):
+            raise ValueError(f"Поле '{field}' должно быть конечным числом: {value}")
+        if number != int(number):
+            raise ValueError(f"Поле '{field}' должно быть целым числом: {value}")
+        return int(number)
+
+    def _resolve_group(self, data: Dict, default_group_id: int,
+                       group_names: Dict[str, int], group_ids: Set[int]) -> int:
+        """Группа строки: число в ячейке - ID, текст - название (или ID, если группы с таким названием нет)"""
+        value = data.get('group')
+        if value is None:
+            return default_group_id
+        if isinstance(value, (int, float)):
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError(f"Группа '{value}' не найдена")
+            if int(value) in group_ids:
+                return int(value)
+            raise ValueError(f"Группа '{value}' не найдена")
+        name = str(value)
+        if name in group_names:
+            return group_names[name]
+        if name.isdigit() and int(name) in group_ids:
+            return int(name)
+        raise ValueError(f"Группа '{value}' не найдена")
+
+    def _validate(self, filename: str, file, default_group_id: int, create_teachers: bool,
+                  teachers: Set[str], group_names: Dict[str, int], group_ids: Set[int],
+                  existing_subjects: Set[Tuple[str, str, int]]) -> Dict:
+        """Разобрать и проверить файл (синхронно, без обращений к БД)"""
+        new_teachers: List[Tuple[str]] = []
+        new_subjects: List[Tuple] = []
+        errors: List[Dict] = []
+        known_teachers = set(teachers)
+        seen_subjects = set(existing_subjects)
+        touched_groups: Set[int] = set()
+        total_rows = 0
+
+        for row_number, data in self._iter_rows(filename, file):
+            total_rows += 1
+            try:
+                teacher = data.get('teacher')
+                if not teacher:
+                    raise ValueError("Не указан преподаватель")
+                teacher = str(teacher)
+
+                is_new_teacher = teacher not in known_teachers
+                if is_new_teacher and not create_teachers:
+                    raise ValueError(f"Преподаватель '{teacher}' не существует")
+
+                subject_name = data.get('subject_name')
+                if subject_name is None:
+                    # Строка только с преподавателем
+                    if is_new_teacher:
+                        known_teachers.add(teacher)
+                        new_teachers.append((teacher,))
+                    continue
+                subject_name = str(subject_name)
+
+                group_id = self._resolve_group(data, default_group_id, group_names, group_ids)
+                hours = self._parse_int(data, 'hours')
+                if hours <= 0:
+                    raise ValueError("Количество часов должно быть больше 0")
+                priority = self._parse_int(data, 'priority')
+                max_per_day = self._parse_int(data, 'max_per_day')
+                min_per_week, max_per_week = normalize_week_quotas(
+                    self._parse_int(data, 'min_per_week'),
+                    self._parse_int(data, 'max_per_week')
+                )
+
+                key = (teacher, subject_name, group_id)
+                if key in seen_subjects:
+                    raise ValueError(f"Предмет '{subject_name}' у преподавателя {teacher} уже существует в группе")
+                seen_subjects.add(key)
+
+                if is_new_teacher:
+                    known_teachers.add(teacher)
+                    new_teachers.append((teacher,))
+                new_subjects.append((teacher, subject_name, hours, hours, hours // 2,
+                                     priority, max_per_day, group_id, min_per_week, max_per_week))
+                touched_groups.add(group_id)
+
+            except ValueError as e:
+                errors.append({"row": row_number, "message": str(e)})
+
+        return {
+            "total_rows": total_rows,
+            "teachers": new_teachers,
+            "subjects": new_subjects,
+            "errors": errors,
+            "groups": touched_groups
+        }
+
+    async def import_curriculum(self, filename: str, file, group_id: int = 1,
+                                create_teachers: bool = True, dry_run: bool = False) -> Dict:
+        """Импортировать преподавателей и предметы из файла.
+
+        Колонки: teacher, subject_name, hours, priority, max_per_day,
+        min_per_week, max_per_week, group (ID или название группы).
+        Строки с ошибками пропускаются и попадают в отчет, остальные
+        вставляются одной транзакцией.
+        """
+        if not filename or not filename.lower().endswith(self.SUPPORTED_EXTENSIONS):
+            raise ValueError("Поддерживаются только файлы CSV и XLSX")
+
+        async with locks.exclusive():
+            # Справочники для проверки строк - по одному запросу на таблицу
+            teachers = {row[0] for row in await database.fetch_all('SELECT name FROM teachers')}
+            # Названия и ID - отдельные справочники: группа с названием "3" не равна группе с ID 3
+            group_names: Dict[str, int] = {}
+            group_ids: Set[int] = set()
+            for gid, name in await database.fetch_all('SELECT id, name FROM study_groups'):
+                group_names[name] = gid
+                group_ids.add(gid)
+            if group_id not in group_ids:
+                raise ValueError("Группа не найдена")
+            existing_subjects = {
+                (row[0], row[1], row[2])
+                for row in await database.fetch_all('SELECT teacher, subject_name, group_id FROM subjects')
+            }
+
+            # Разбор файла - синхронная работа, выполняем вне event loop
+            try:
+                result = await executors.run_in_thread(
+                    self._validate, filename, file, group_id, create_teachers,
+                    teachers, group_names, group_ids, existing_subjects
+                )
+            except (BadZipFile, InvalidFileException, UnicodeDecodeError, csv.Error) as e:
+                raise ValueError(f"Не удалось прочитать файл: {e}")
+
+            print(f"📥 Импорт {filename}: строк {result['total_rows']}, "
+                  f"новых преподавателей {len(result['teachers'])}, предметов {len(result['subjects'])}, "
+                  f"ошибок {len(result['errors'])}")
+
+            if not dry_run and (result['teachers'] or result['subjects']):
+                async with database.transaction() as conn:
+                    await conn.executemany(
+                        'INSERT INTO teachers (name) VALUES (?)',
+                        result['teachers']
+                    )
+                    # Оставшиеся часы уточнят триггеры на subjects
+                    await conn.executemany(
+                        '''INSERT INTO subjects
+                           (teacher, subject_name, total_hours, remaining_hours, remaining_pairs,
+                            priority, max_per_day, group_id, min_per_week, max_per_week)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                        result['subjects']
+                    )
+
+            return {
+                "success": not result['errors'],
+                "dry_run": dry_run,
+                "total_rows": result['total_rows'],
+                "imported_teachers": len(result['teachers']),
+                "imported_subjects": len(result['subjects']),
+                "errors": result['errors']
+            }
+
+
+# Глобальный экземпляр
+import_service = ImportService()
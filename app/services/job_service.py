@@ -0,0 +1,361 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from app.core.locks import leases, WORKER_ID
+from app.db.database import database
+from app.services.event_hub import event_hub, format_sse, EVENTS_KEEPALIVE_SECONDS, EVENTS_POLL_SECONDS
+from app.services.shedule_generator import schedule_generator, GenerationCancelled
+
+
+TERMINAL_STATUSES = ('succeeded', 'failed', 'cancelled')
+MAX_GENERATION_ATTEMPTS = 50
+
+JOB_COLUMNS = ('id, job_type, group_id, status, params, progress, error, '
+               'created_at, started_at, finished_at, cancel_requested')
+
+
+class JobConflictError(ValueError):
+    """Для группы уже выполняется задача генерации"""
+
+    def __init__(self, message: str, job_id: Optional[str]):
+        super().__init__(message)
+        self.job_id = job_id
+
+
+class JobService:
+    """Фоновые задачи генерации расписания.
+
+    Задача сохраняется в таблице jobs (статус, прогресс, результат), поэтому
+    ее состояние переживает перезапуск: незавершенные задачи при старте
+    запускаются заново (генерация заменяет расписание группы целиком, так что
+    повтор безопасен). Прогресс публикуется событиями job в event_hub.
+    Отмена срабатывает между попытками расстановки.
+
+    При запуске несколькими процессами генерацию группы в каждый момент
+    выполняет один процесс: он держит аренду generate:<группа> (см.
+    LeaseManager) и продлевает ее, пока работает. Задачи, чья аренда
+    истекла (процесс остановился), подхватывает любой процесс при
+    периодической проверке. Отмена задачи чужого процесса передается через
+    флаг cancel_requested в базе.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cancel_requested: Set[str] = set()
+        # Группа -> ID активной задачи (в этом процессе)
+        self._active_groups: Dict[int, str] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _row_to_job(self, row, result: Optional[str] = None) -> Dict:
+        (job_id, job_type, group_id, status, params, progress, error,
+         created_at, started_at, finished_at, cancel_requested) = row
+        job = {
+            "id": job_id,
+            "type": job_type,
+            "group_id": group_id,
+            "status": status,
+            "params": json.loads(params or '{}'),
+            "progress": json.loads(progress or '{}'),
+            "error": error,
+            "cancel_requested": bool(cancel_requested) or job_id in self._cancel_requested,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
+        if result is not None:
+            job["result"] = json.loads(result)
+        return job
+
+    async def _update(self, job_id: str, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        await database.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    @staticmethod
+    def _lease_name(group_id: int) -> str:
+        return f"generate:{group_id}"
+
+    @staticmethod
+    def _lease_owner(job_id: str) -> str:
+        # В владельце аренды хранится и задача - по нему видно, какую задачу выполняет процесс
+        return f"{WORKER_ID}#{job_id}"
+
+    async def _find_active_job(self, group_id: int) -> Optional[str]:
+        row = await database.fetch_one(
+            "SELECT id FROM jobs WHERE group_id = ? AND status IN ('queued', 'running') "
+            "ORDER BY created_at DESC, rowid DESC LIMIT 1",
+            (group_id,)
+        )
+        return row[0] if row else None
+
+    def _publish(self, job: Dict):
+        event_hub.publish("job", job["group_id"], job_id=job["id"], status=job["status"],
+                          progress=job["progress"], error=job["error"])
+
+    # ---------- Запуск ----------
+
+    async def submit_generation(self, group_id: int, attempts: int = 1) -> Dict:
+        """Поставить генерацию расписания группы в очередь, вернуть задачу"""
+        if not 1 <= attempts <= MAX_GENERATION_ATTEMPTS:
+            raise ValueError(f"Число попыток должно быть от 1 до {MAX_GENERATION_ATTEMPTS}")
+
+        active_id = self._active_groups.get(group_id)
+        if active_id is not None:
+            raise JobConflictError("Для группы уже выполняется генерация", active_id)
+
+        job_id = uuid.uuid4().hex
+        # Занимаем группу до первого await, чтобы параллельный запрос получил конфликт
+        self._active_groups[group_id] = job_id
+        try:
+            group = await database.fetch_one('SELECT id FROM study_groups WHERE id = ?', (group_id,))
+            if not group:
+                raise ValueError("Группа не найдена")
+
+            # Генерацию группы в других процессах исключает аренда
+            if not await leases.acquire(self._lease_name(group_id), self._lease_owner(job_id)):
+                raise JobConflictError("Для группы уже выполняется генерация",
+                                       await self._find_active_job(group_id))
+            try:
+                await database.execute(
+                    'INSERT INTO jobs (id, job_type, group_id, status, params) VALUES (?, ?, ?, ?, ?)',
+                    (job_id, 'generate', group_id, 'queued', json.dumps({"attempts": attempts}))
+                )
+            except Exception:
+                await leases.release(self._lease_name(group_id), self._lease_owner(job_id))
+                raise
+        except Exception:
+            self._active_groups.pop(group_id, None)
+            raise
+
+        self._start(job_id, group_id, attempts)
+        job = await self.get_job(job_id)
+        self._publish(job)
+        print(f"📋 Задача генерации {job_id} для группы {group_id} поставлена в очередь")
+        return job
+
+    def _start(self, job_id: str, group_id: int, attempts: int):
+        self._active_groups[group_id] = job_id
+        task = asyncio.create_task(self._run(job_id, group_id, attempts))
+        self._tasks[job_id] = task
+
+    async def _cancel_flag(self, job_id: str) -> bool:
+        row = await database.fetch_one('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,))
+        return bool(row and row[0])
+
+    async def _heartbeat(self, job_id: str, group_id: int):
+        """Продлевать аренду группы и читать флаг отмены, пока задача выполняется"""
+        name, owner = self._lease_name(group_id), self._lease_owner(job_id)
+        while True:
+            await asyncio.sleep(leases.ttl / 3)
+            try:
+                if not await leases.renew(name, owner):
+                    print(f"⚠️ Задача {job_id}: аренда группы {group_id} потеряна, задача отменяется")
+                    self._cancel_requested.add(job_id)
+                    return
+                if await self._cancel_flag(job_id):
+                    self._cancel_requested.add(job_id)
+            except Exception as e:
+                print(f"⚠️ Задача {job_id}: ошибка продления аренды: {e}")
+
+    async def _run(self, job_id: str, group_id: int, attempts: int):
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, group_id))
+        try:
+            await self._update(job_id, status='running', started_at=self._now(), progress='{}')
+            self._publish(await self.get_job(job_id))
+
+            async def on_progress(progress: Dict):
+                await self._update(job_id, progress=json.dumps(progress))
+                # Отмену могли запросить из другого процесса
+                if await self._cancel_flag(job_id):
+                    self._cancel_requested.add(job_id)
+                event_hub.publish("job", group_id, job_id=job_id, status="running", progress=progress, error=None)
+
+            lessons = await schedule_generator.generate_schedule(
+                group_id, attempts=attempts, on_progress=on_progress,
+                is_cancelled=lambda: job_id in self._cancel_requested
+            )
+
+            result = {"count": len(lessons), "lessons": [lesson.model_dump() for lesson in lessons]}
+            await self._update(job_id, status='succeeded', finished_at=self._now(),
+                               progress=json.dumps({"phase": "done", "pairs_placed": len(lessons)}),
+                               result=json.dumps(result))
+            print(f"✅ Задача {job_id}: сгенерировано {len(lessons)} уроков")
+        except GenerationCancelled:
+            await self._update(job_id, status='cancelled', finished_at=self._now())
+            print(f"⏹️ Задача {job_id} отменена")
+        except asyncio.CancelledError:
+            # Остановка сервера: задача останется running и будет перезапущена при старте
+            raise
+        except Exception as e:
+            await self._update(job_id, status='failed', finished_at=self._now(), error=str(e))
+            print(f"❌ Задача {job_id} завершилась ошибкой: {e}")
+        finally:
+            heartbeat.cancel()
+            self._tasks.pop(job_id, None)
+            self._cancel_requested.discard(job_id)
+            if self._active_groups.get(group_id) == job_id:
+                self._active_groups.pop(group_id, None)
+            try:
+                await leases.release(self._lease_name(group_id), self._lease_owner(job_id))
+            except Exception as e:
+                print(f"⚠️ Задача {job_id}: не удалось освободить аренду: {e}")
+
+        job = await self.get_job(job_id)
+        if job:
+            self._publish(job)
+
+    async def recover(self):
+        """Перезапустить задачи, прерванные остановкой сервера или процесса.
+
+        Задача без действующей аренды никем не выполняется - ее забирает
+        этот процесс. Задача группы, аренду которой держит другая задача,
+        отменяется как дубликат.
+        """
+        rows = await database.fetch_all(
+            "SELECT id, group_id, params FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at, rowid"
+        )
+        for job_id, group_id, params in rows:
+            if job_id in self._tasks or self._active_groups.get(group_id) == job_id:
+                continue
+            owner = await leases.get_owner(self._lease_name(group_id))
+            if owner is not None and owner.endswith(f"#{job_id}"):
+                continue  # Выполняется другим процессом
+            if group_id in self._active_groups or owner is not None:
+                await self._update(job_id, status='cancelled', finished_at=self._now(),
+                                   error="Для группы уже выполняется генерация")
+                continue
+            if not await leases.acquire(self._lease_name(group_id), self._lease_owner(job_id)):
+                continue  # Другой процесс забрал задачу раньше
+            attempts = json.loads(params or '{}').get("attempts", 1)
+            await self._update(job_id, status='queued')
+            self._start(job_id, group_id, attempts)
+            print(f"🔁 Задача {job_id} перезапущена после рестарта")
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(leases.ttl)
+            try:
+                await self.recover()
+            except Exception as e:
+                print(f"⚠️ Ошибка проверки брошенных задач: {e}")
+
+    async def start(self):
+        """Восстановить задачи и периодически подхватывать брошенные (при старте приложения)"""
+        try:
+            await self.recover()
+        except Exception as e:
+            print(f"⚠️ Не удалось восстановить фоновые задачи: {e}")
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def shutdown(self):
+        """Прервать выполняющиеся задачи (при остановке приложения)"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._active_groups.clear()
+
+    def get_stats(self) -> Dict:
+        """Задачи, выполняемые этим процессом"""
+        return {"running": len(self._tasks), "active_groups": sorted(self._active_groups)}
+
+    # ---------- Управление ----------
+
+    async def get_job(self, job_id: str, include_result: bool = False) -> Optional[Dict]:
+        """Задача по ID (с результатом, если include_result)"""
+        row = await database.fetch_one(
+            f'SELECT {JOB_COLUMNS}, result FROM jobs WHERE id = ?', (job_id,)
+        )
+        if not row:
+            return None
+        return self._row_to_job(row[:-1], row[-1] if include_result else None)
+
+    async def list_jobs(self, group_id: Optional[int] = None, limit: int = 20) -> List[Dict]:
+        """Последние задачи (все или группы)"""
+        if group_id is None:
+            rows = await database.fetch_all(
+                f'SELECT {JOB_COLUMNS} FROM jobs ORDER BY created_at DESC, rowid DESC LIMIT ?', (limit,)
+            )
+        else:
+            rows = await database.fetch_all(
+                f'SELECT {JOB_COLUMNS} FROM jobs WHERE group_id = ? ORDER BY created_at DESC, rowid DESC LIMIT ?',
+                (group_id, limit)
+            )
+        return [self._row_to_job(row) for row in rows]
+
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """Запросить отмену задачи; None - задача не найдена"""
+        job = await self.get_job(job_id)
+        if job is None:
+            return None
+        if job["status"] in TERMINAL_STATUSES:
+            raise ValueError("Задача уже завершена")
+
+        if job_id in self._tasks:
+            self._cancel_requested.add(job_id)
+        elif (await leases.get_owner(self._lease_name(job["group_id"])) or '').endswith(f"#{job_id}"):
+            # Задачу выполняет другой процесс - он прочитает флаг при продлении аренды
+            await self._update(job_id, cancel_requested=1)
+        else:
+            # Задача без исполнителя (например, другого процесса, который уже остановлен)
+            await self._update(job_id, status='cancelled', finished_at=self._now())
+        job = await self.get_job(job_id)
+        self._publish(job)
+        return job
+
+    async def stream_events(self, job_id: str) -> AsyncIterator[str]:
+        """Поток SSE прогресса задачи; закрывается после завершения задачи"""
+        job = await self.get_job(job_id)
+        if job is None:
+            return
+
+        # Подписываемся до чтения состояния, чтобы не пропустить завершение
+        subscription = event_hub.subscribe(job["group_id"])
+        try:
+            job = await self.get_job(job_id)
+            yield format_sse({"id": 0, "type": "job", **self._job_event(job)})
+            while job["status"] not in TERMINAL_STATUSES and not subscription.closed:
+                # События задачи другого процесса сюда не приходят - ее состояние опрашиваем в базе
+                local = job_id in self._tasks
+                event = await subscription.next_event(EVENTS_KEEPALIVE_SECONDS if local else EVENTS_POLL_SECONDS)
+                if event is None:
+                    break
+                if event["type"] == "keepalive":
+                    if not local:
+                        current = await self.get_job(job_id)
+                        if current is None:
+                            break
+                        if (current["status"], current["progress"]) != (job["status"], job["progress"]):
+                            job = current
+                            yield format_sse({"id": 0, "type": "job", **self._job_event(job)})
+                            continue
+                    yield ": keep-alive\n\n"
+                elif event["type"] == "resync":
+                    job = await self.get_job(job_id)
+                    yield format_sse({"id": event["id"], "type": "job", **self._job_event(job)})
+                elif event["type"] == "job" and event.get("job_id") == job_id:
+                    job = {**job, "status": event["status"], "progress": event["progress"]}
+                    yield format_sse(event)
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    @staticmethod
+    def _job_event(job: Dict) -> Dict:
+        return {"group_id": job["group_id"], "job_id": job["id"], "status": job["status"],
+                "progress": job["progress"], "error": job["error"]}
+
+
+# Глобальный экземпляр
+job_service = JobService()
@@ -1,44 +1,294 @@
+from app.core.locks import locks
 from app.db.database import database
 from app.services.negative_filters_service import negative_filters_service
 from app.services.subject_services import subject_service
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 import json
 
 
+# Размер сетки недели (ограничения CHECK таблицы lessons)
+MAX_DAYS = 7
+MAX_TIME_SLOTS = 4
+
+# Все факты о ячейке (преподаватель, предмет, день, слот, группа) одним запросом:
+# конфликт в другой группе, занятость ячейки, ограничения преподавателя,
+# данные предмета и количество его пар в этот день
+SLOT_FACTS_QUERY = '''
+    SELECT
+        (SELECT l.group_id FROM lessons l
+          WHERE l.teacher = :teacher AND l.day = :day AND l.time_slot = :time_slot
+            AND l.group_id != :group_id
+          LIMIT 1) AS conflict_group_id,
+        occ.teacher AS occupant_teacher,
+        occ.subject_name AS occupant_subject,
+        nf.restricted_days,
+        nf.restricted_slots,
+        s.id AS subject_id,
+        s.remaining_pairs,
+        s.max_per_day,
+        (SELECT COUNT(*) FROM lessons l
+          WHERE l.teacher = :teacher AND l.subject_name = :subject_name
+            AND l.day = :day AND l.group_id = :group_id) AS today_count
+    FROM (SELECT 1) AS anchor
+    LEFT JOIN lessons occ
+           ON occ.day = :day AND occ.time_slot = :time_slot AND occ.group_id = :group_id
+    LEFT JOIN negative_filters nf
+           ON nf.teacher = :teacher
+    LEFT JOIN subjects s
+           ON s.teacher = :teacher AND s.subject_name = :subject_name AND s.group_id = :group_id
+'''
+
+
+# Уроки двух ячеек группы и факты для переноса каждого из них в другую ячейку:
+# конфликт преподавателя в другой группе, его ограничения, max_per_day предмета
+# и количество пар предмета в целевой день (без учета обеих ячеек)
+MOVE_FACTS_QUERY = '''
+    WITH a AS (SELECT id, teacher, subject_name, editable FROM lessons
+               WHERE group_id = :group_id AND day = :day_a AND time_slot = :slot_a),
+         b AS (SELECT id, teacher, subject_name, editable FROM lessons
+               WHERE group_id = :group_id AND day = :day_b AND time_slot = :slot_b)
+    SELECT
+        a.id, a.teacher, a.subject_name, a.editable,
+        b.id, b.teacher, b.subject_name, b.editable,
+        (SELECT l.group_id FROM lessons l
+          WHERE l.teacher = a.teacher AND l.day = :day_b AND l.time_slot = :slot_b
+            AND l.group_id != :group_id
+          LIMIT 1),
+        nfa.restricted_days, nfa.restricted_slots, sa.max_per_day,
+        (SELECT COUNT(*) FROM lessons l
+          WHERE l.group_id = :group_id AND l.teacher = a.teacher
+            AND l.subject_name = a.subject_name AND l.day = :day_b
+            AND NOT (l.day = :day_a AND l.time_slot = :slot_a)
+            AND NOT (l.day = :day_b AND l.time_slot = :slot_b)),
+        (SELECT l.group_id FROM lessons l
+          WHERE l.teacher = b.teacher AND l.day = :day_a AND l.time_slot = :slot_a
+            AND l.group_id != :group_id
+          LIMIT 1),
+        nfb.restricted_days, nfb.restricted_slots, sb.max_per_day,
+        (SELECT COUNT(*) FROM lessons l
+          WHERE l.group_id = :group_id AND l.teacher = b.teacher
+            AND l.subject_name = b.subject_name AND l.day = :day_a
+            AND NOT (l.day = :day_a AND l.time_slot = :slot_a)
+            AND NOT (l.day = :day_b AND l.time_slot = :slot_b))
+    FROM (SELECT 1) AS anchor
+    LEFT JOIN a ON 1
+    LEFT JOIN b ON 1
+    LEFT JOIN negative_filters nfa ON nfa.teacher = a.teacher
+    LEFT JOIN negative_filters nfb ON nfb.teacher = b.teacher
+    LEFT JOIN subjects sa
+           ON sa.group_id = :group_id AND sa.teacher = a.teacher AND sa.subject_name = a.subject_name
+    LEFT JOIN subjects sb
+           ON sb.group_id = :group_id AND sb.teacher = b.teacher AND sb.subject_name = b.subject_name
+'''
+
+
 class ManualScheduleService:
     """Сервис для ручного управления расписанием"""
 
-    async def check_teacher_availability(self, teacher: str, day: int,
-                                         time_slot: int, current_group_id: int) -> Tuple[bool, str]:
-        """Проверить доступность преподавателя"""
-        try:
-            # 1. Проверяем, не ведет ли преподаватель в это время в другой группе
-            conflict = await database.fetch_one(
-                '''SELECT group_id FROM lessons 
-                   WHERE teacher = ? AND day = ? AND time_slot = ? AND group_id != ?''',
-                (teacher, day, time_slot, current_group_id)
-            )
+    async def _fetch_slot_facts(self, teacher: str, subject_name: Optional[str], day: int,
+                                time_slot: Optional[int], group_id: int) -> Dict:
+        """Получить все факты о ячейке за одно обращение к БД"""
+        row = await database.fetch_one(SLOT_FACTS_QUERY, {
+            "teacher": teacher,
+            "subject_name": subject_name,
+            "day": day,
+            "time_slot": time_slot,
+            "group_id": group_id
+        })
 
-            if conflict:
-                other_group_id = conflict[0]
-                return False, f"Преподаватель уже ведет занятие в группе {other_group_id} в это время"
+        (conflict_group_id, occupant_teacher, occupant_subject, days_json, slots_json,
+         subject_id, remaining_pairs, max_per_day, today_count) = row
 
-            # 2. Проверяем ограничения преподавателя (negative_filters)
-            filters = await negative_filters_service.get_teacher_filters(teacher)
-            if filters:
-                if day in filters.get('restricted_days', []):
-                    return False, f"Преподаватель недоступен в этот день недели"
+        try:
+            filters = negative_filters_service.parse_filter(days_json, slots_json)
+        except json.JSONDecodeError:
+            filters = {"restricted_days": [], "restricted_slots": []}
+
+        return {
+            "conflict_group_id": conflict_group_id,
+            "occupant_teacher": occupant_teacher,
+            "occupant_subject": occupant_subject,
+            "restricted_days": filters["restricted_days"],
+            "restricted_slots": filters["restricted_slots"],
+            "subject": None if subject_id is None else {
+                "id": subject_id,
+                "remaining_pairs": remaining_pairs,
+                "max_per_day": max_per_day
+            },
+            "today_count": today_count or 0
+        }
+
+    @staticmethod
+    def _teacher_reasons(facts: Dict, teacher: str, day: int, time_slot: int,
+                         replace: bool = False, except_teacher: str = None) -> List[Tuple[str, str]]:
+        """Причины, по которым преподаватель не может вести пару в ячейке.
+
+        replace=False - добавление в пустую ячейку, replace=True - замена существующей пары.
+        """
+        reasons = []
+
+        # 1. Не ведет ли преподаватель в это время в другой группе
+        if facts["conflict_group_id"] is not None:
+            reasons.append((
+                "teacher_busy",
+                f"Преподаватель уже ведет занятие в группе {facts['conflict_group_id']} в это время"
+            ))
+
+        # 2. При замене - не ведет ли преподаватель другой урок в этой ячейке
+        if replace and not (except_teacher and teacher == except_teacher):
+            if facts["occupant_teacher"] == teacher and facts["occupant_teacher"] != except_teacher:
+                reasons.append((
+                    "teacher_in_slot",
+                    "Преподаватель уже ведет другой урок в это время в текущей группе"
+                ))
+
+        # 3. Ограничения преподавателя (negative_filters)
+        if day in facts["restricted_days"]:
+            reasons.append(("restricted_day", "Преподаватель недоступен в этот день недели"))
+        if time_slot in facts["restricted_slots"]:
+            reasons.append(("restricted_slot", "Преподаватель недоступен в эту пару"))
+
+        # 4. При добавлении ячейка должна быть свободна
+        if not replace and facts["occupant_teacher"] is not None:
+            reasons.append(("slot_occupied", "Эта ячейка уже занята"))
+
+        return reasons
+
+    @staticmethod
+    def _subject_reasons(facts: Dict, subject_name: str, teacher: str) -> List[Tuple[str, str]]:
+        """Причины, по которым предмет нельзя поставить в этот день"""
+        subject = facts["subject"]
+        if not subject:
+            return [(
+                "subject_not_found",
+                f"Предмет '{subject_name}' не найден у преподавателя {teacher} в этой группе"
+            )]
+
+        reasons = []
+        if subject["remaining_pairs"] <= 0:
+            reasons.append((
+                "no_pairs_left",
+                f"У предмета '{subject_name}' не осталось пар для распределения"
+            ))
+        if facts["today_count"] >= subject["max_per_day"]:
+            reasons.append((
+                "max_per_day",
+                f"Превышен лимит {subject['max_per_day']} пар в день для этого предмета"
+            ))
+        return reasons
+
+    async def check_slot(self, teacher: str, subject_name: Optional[str], day: int,
+                         time_slot: int, group_id: int) -> Dict:
+        """Полная проверка ячейки одним запросом: все вердикты и причины"""
+        facts = await self._fetch_slot_facts(teacher, subject_name, day, time_slot, group_id)
+
+        teacher_reasons = self._teacher_reasons(facts, teacher, day, time_slot)
+        subject_reasons = self._subject_reasons(facts, subject_name, teacher) if subject_name else []
+        reasons = teacher_reasons + subject_reasons
+
+        return {
+            "teacher": teacher,
+            "subject_name": subject_name,
+            "day": day,
+            "time_slot": time_slot,
+            "group_id": group_id,
+            "available": not reasons,
+            "teacher_available": not teacher_reasons,
+            "subject_available": not subject_reasons,
+            "slot_occupied": facts["occupant_teacher"] is not None,
+            "conflict_group_id": facts["conflict_group_id"],
+            "subject_id": facts["subject"]["id"] if facts["subject"] else None,
+            "reasons": [{"code": code, "message": message} for code, message in reasons]
+        }
+
+    async def get_availability_matrix(self, group_id: int, teacher: Optional[str] = None,
+                                      subject_name: Optional[str] = None) -> Dict:
+        """Матрица доступности день × слот для предмета (или всех предметов группы).
+
+        Считается за один проход: уроки читаются одним запросом, предметы и
+        фильтры берутся из кэшей сервисов.
+        """
+        subjects = await subject_service.get_all_subjects(group_id)
+        if teacher is not None:
+            subjects = [s for s in subjects if s.teacher == teacher]
+        if subject_name is not None:
+            subjects = [s for s in subjects if s.subject_name == subject_name]
+
+        negative_filters = await negative_filters_service.get_negative_filters()
+
+        # Уроки текущей группы и уроки её преподавателей во всех остальных группах
+        rows = await database.fetch_all(
+            '''SELECT group_id, day, time_slot, teacher, subject_name FROM lessons
+               WHERE group_id = :group_id
+                  OR teacher IN (SELECT teacher FROM subjects WHERE group_id = :group_id)''',
+            {"group_id": group_id}
+        )
+
+        occupants = {}  # (day, time_slot) -> (teacher, subject_name) в текущей группе
+        busy = {}  # (teacher, day, time_slot) -> group_id другой группы
+        day_counts = {}  # (teacher, subject_name, day) -> количество пар в текущей группе
+        for lesson_group_id, day, time_slot, lesson_teacher, lesson_subject in rows:
+            if lesson_group_id == group_id:
+                occupants[(day, time_slot)] = (lesson_teacher, lesson_subject)
+                key = (lesson_teacher, lesson_subject, day)
+                day_counts[key] = day_counts.get(key, 0) + 1
+            else:
+                busy.setdefault((lesson_teacher, day, time_slot), lesson_group_id)
+
+        result = []
+        for subject in subjects:
+            filters = negative_filters.get(subject.teacher, {})
+            subject_info = {
+                "id": subject.id,
+                "remaining_pairs": subject.remaining_pairs,
+                "max_per_day": subject.max_per_day
+            }
 
-                if time_slot in filters.get('restricted_slots', []):
-                    return False, f"Преподаватель недоступен в эту пару"
+            matrix = []
+            for day in range(7):
+                row = []
+                for time_slot in range(4):
+                    occupant = occupants.get((day, time_slot), (None, None))
+                    facts = {
+                        "conflict_group_id": busy.get((subject.teacher, day, time_slot)),
+                        "occupant_teacher": occupant[0],
+                        "occupant_subject": occupant[1],
+                        "restricted_days": filters.get("restricted_days", []),
+                        "restricted_slots": filters.get("restricted_slots", []),
+                        "subject": subject_info,
+                        "today_count": day_counts.get((subject.teacher, subject.subject_name, day), 0)
+                    }
+                    reasons = (self._teacher_reasons(facts, subject.teacher, day, time_slot)
+                               + self._subject_reasons(facts, subject.subject_name, subject.teacher))
+                    row.append({
+                        "code": reasons[0][0] if reasons else "available",
+                        "reasons": [message for _, message in reasons]
+                    })
+                matrix.append(row)
+
+            result.append({
+                "id": subject.id,
+                "teacher": subject.teacher,
+                "subject_name": subject.subject_name,
+                "remaining_pairs": subject.remaining_pairs,
+                "matrix": matrix
+            })
+
+        return {
+            "group_id": group_id,
+            "total_days": 7,
+            "total_time_slots": 4,
+            "subjects": result
+        }
 
-            # 3. Проверяем, что слот свободен в текущей группе
-            slot_occupied = await database.fetch_one(
-                'SELECT id FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, current_group_id)
-            )
-            if slot_occupied:
-                return False, "Эта ячейка уже занята"
+    async def check_teacher_availability(self, teacher: str, day: int,
+                                         time_slot: int, current_group_id: int) -> Tuple[bool, str]:
+        """Проверить доступность преподавателя"""
+        try:
+            facts = await self._fetch_slot_facts(teacher, None, day, time_slot, current_group_id)
+            reasons = self._teacher_reasons(facts, teacher, day, time_slot)
+            if reasons:
+                return False, reasons[0][1]
 
             return True, "Преподаватель доступен"
 
@@ -49,27 +299,12 @@ class ManualScheduleService:
                                          day: int, group_id: int) -> Tuple[bool, str, Optional[int]]:
         """Проверить доступность предмета для добавления"""
         try:
-            # 1. Проверяем, существует ли предмет в группе
-            subject = await subject_service.get_subject_by_name(teacher, subject_name, group_id)
-            if not subject:
-                return False, f"Предмет '{subject_name}' не найден у преподавателя {teacher} в этой группе", None
-
-            # 2. Проверяем, остались ли пары у предмета
-            if subject.remaining_pairs <= 0:
-                return False, f"У предмета '{subject_name}' не осталось пар для распределения", None
-
-            # 3. Проверяем max_per_day (если сегодня уже есть пары этого предмета)
-            today_pairs = await database.fetch_one(
-                '''SELECT COUNT(*) FROM lessons 
-                   WHERE teacher = ? AND subject_name = ? AND day = ? AND group_id = ?''',
-                (teacher, subject_name, day, group_id)  # Используем переданный day
-            )
+            facts = await self._fetch_slot_facts(teacher, subject_name, day, None, group_id)
+            reasons = self._subject_reasons(facts, subject_name, teacher)
+            if reasons:
+                return False, reasons[0][1], None
 
-            today_count = today_pairs[0] if today_pairs else 0
-            if today_count >= subject.max_per_day:
-                return False, f"Превышен лимит {subject.max_per_day} пар в день для этого предмета", None
-
-            return True, "Предмет доступен", subject.id
+            return True, "Предмет доступен", facts["subject"]["id"]
 
         except Exception as e:
             return False, f"Ошибка проверки предмета: {str(e)}", None
@@ -77,241 +312,558 @@ class ManualScheduleService:
     async def add_lesson(self, day: int, time_slot: int, teacher: str,
                          subject_name: str, group_id: int) -> Dict:
         """Добавить пару вручную"""
-        try:
-            print(f"➕ Ручное добавление пары: день={day}, слот={time_slot}, "
-                  f"преподаватель={teacher}, предмет={subject_name}, группа={group_id}")
-
-            # 1. Проверяем доступность преподавателя
-            teacher_ok, teacher_msg = await self.check_teacher_availability(
-                teacher, day, time_slot, group_id
-            )
-            if not teacher_ok:
-                return {"success": False, "message": teacher_msg}
-
-            # 2. Проверяем доступность предмета (передаем day)
-            subject_ok, subject_msg, subject_id = await self.check_subject_availability(
-                teacher, subject_name, day, group_id  # Передаем day
-            )
-            if not subject_ok:
-                return {"success": False, "message": subject_msg}
-
-            # 3. Проверяем, не занят ли уже этот слот в этой группе
-            existing_lesson = await database.fetch_one(
-                'SELECT id FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, group_id)
-            )
-            if existing_lesson:
-                return {"success": False, "message": "Этот слот уже занят в текущей группе"}
-
-            # 4. Добавляем урок
-            result = await database.execute(
-                '''INSERT INTO lessons (day, time_slot, teacher, subject_name, editable, group_id)
-                   VALUES (?, ?, ?, ?, ?, ?)''',
-                (day, time_slot, teacher, subject_name, 1, group_id)
-            )
-
-            if result.rowcount == 0:
-                return {"success": False, "message": "Не удалось добавить пару"}
+        async with locks.group(group_id):
+            try:
+                print(f"➕ Ручное добавление пары: день={day}, слот={time_slot}, "
+                      f"преподаватель={teacher}, предмет={subject_name}, группа={group_id}")
+
+                # 1-3. Проверяем преподавателя, предмет и занятость слота одним запросом
+                facts = await self._fetch_slot_facts(teacher, subject_name, day, time_slot, group_id)
+                reasons = (self._teacher_reasons(facts, teacher, day, time_slot)
+                           + self._subject_reasons(facts, subject_name, teacher))
+                if reasons:
+                    return {"success": False, "message": reasons[0][1]}
+
+                # 4. Добавляем урок (оставшиеся часы предмета обновит триггер)
+                result = await database.execute(
+                    '''INSERT INTO lessons (day, time_slot, teacher, subject_name, editable, group_id)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    (day, time_slot, teacher, subject_name, 1, group_id)
+                )
 
-            # 5. Обновляем оставшиеся часы у предмета
-            await database.execute(
-                '''UPDATE subjects 
-                   SET remaining_hours = remaining_hours - 2,
-                       remaining_pairs = (remaining_hours - 2) / 2
-                   WHERE id = ?''',
-                (subject_id,)
-            )
+                if result.rowcount == 0:
+                    return {"success": False, "message": "Не удалось добавить пару"}
 
-            return {
-                "success": True,
-                "message": "Пара успешно добавлена",
-                "lesson_id": result.lastrowid
-            }
+                return {
+                    "success": True,
+                    "message": "Пара успешно добавлена",
+                    "lesson_id": result.lastrowid
+                }
 
-        except Exception as e:
-            print(f"❌ Ошибка ручного добавления пары: {e}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            return {"success": False, "message": f"Внутренняя ошибка: {str(e)}"}
+            except Exception as e:
+                print(f"❌ Ошибка ручного добавления пары: {e}")
+                import traceback
+                print(f"❌ Traceback: {traceback.format_exc()}")
+                return {"success": False, "message": f"Внутренняя ошибка: {str(e)}"}
 
     async def update_lesson(self, day: int, time_slot: int, new_teacher: str,
                             new_subject_name: str, group_id: int) -> Dict:
         """Обновить существующую пару (аналог существующей функции)"""
-        try:
-            print(f"✏️ Ручное обновление пары: день={day}, слот={time_slot}, "
-                  f"новый преподаватель={new_teacher}, новый предмет={new_subject_name}")
+        async with locks.group(group_id):
+            try:
+                print(f"✏️ Ручное обновление пары: день={day}, слот={time_slot}, "
+                      f"новый преподаватель={new_teacher}, новый предмет={new_subject_name}")
 
-            # 1. Получаем старый урок ДО проверок
-            old_lesson = await database.fetch_one(
-                'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, group_id)
-            )
+                # 1. Одним запросом получаем старый урок и все факты для проверок
+                facts = await self._fetch_slot_facts(new_teacher, new_subject_name, day, time_slot, group_id)
+                old_teacher = facts["occupant_teacher"]
+                old_subject_name = facts["occupant_subject"]
 
-            # Если пытаемся заменить на ТОГО ЖЕ преподавателя и предмет - ничего не делаем
-            if old_lesson:
-                old_teacher, old_subject_name = old_lesson
+                # Если пытаемся заменить на ТОГО ЖЕ преподавателя и предмет - ничего не делаем
                 if old_teacher == new_teacher and old_subject_name == new_subject_name:
                     return {"success": True, "message": "Изменений не требуется"}
 
-            # 2. Проверяем доступность нового преподавателя (с исключением САМОГО СЕБЯ)
-            teacher_ok, teacher_msg = await self.check_teacher_availability_with_exception(
-                new_teacher, day, time_slot, group_id, old_teacher if old_lesson else None
-            )
-            if not teacher_ok:
-                return {"success": False, "message": teacher_msg}
-
-            # 3. Проверяем доступность нового предмета
-            subject_ok, subject_msg, new_subject_id = await self.check_subject_availability(
-                new_teacher, new_subject_name, day, group_id
-            )
-            if not subject_ok:
-                return {"success": False, "message": subject_msg}
-
-            # 4. Если урока нет - создаем новый
-            if not old_lesson:
-                return await self.add_lesson(day, time_slot, new_teacher, new_subject_name, group_id)
-
-            # 5. Восстанавливаем часы старого предмета
-            old_subject = await subject_service.get_subject_by_name(
-                old_teacher, old_subject_name, group_id
-            )
-            if old_subject:
-                await database.execute(
-                    '''UPDATE subjects 
-                       SET remaining_hours = remaining_hours + 2,
-                           remaining_pairs = remaining_hours / 2
-                       WHERE id = ?''',
-                    (old_subject.id,)
+                # 2. Проверяем доступность нового преподавателя (с исключением САМОГО СЕБЯ)
+                teacher_reasons = self._teacher_reasons(
+                    facts, new_teacher, day, time_slot, replace=True, except_teacher=old_teacher
+                )
+                if teacher_reasons:
+                    return {"success": False, "message": teacher_reasons[0][1]}
+
+                # 3. Проверяем доступность нового предмета
+                subject_reasons = self._subject_reasons(facts, new_subject_name, new_teacher)
+                if subject_reasons:
+                    return {"success": False, "message": subject_reasons[0][1]}
+
+                # 4. Если урока нет - создаем новый
+                if old_teacher is None:
+                    return await self.add_lesson(day, time_slot, new_teacher, new_subject_name, group_id)
+
+                # 5. Обновляем урок (часы старого и нового предмета пересчитает триггер)
+                result = await database.execute(
+                    '''UPDATE lessons 
+                       SET teacher = ?, subject_name = ?, editable = 1
+                       WHERE day = ? AND time_slot = ? AND group_id = ?''',
+                    (new_teacher, new_subject_name, day, time_slot, group_id)
                 )
-                print(f"✅ Восстановлено 2 часа для старого предмета: {old_subject_name}")
-
-            # 6. Вычитаем часы нового предмета
-            await database.execute(
-                '''UPDATE subjects 
-                   SET remaining_hours = remaining_hours - 2,
-                       remaining_pairs = remaining_hours / 2
-                   WHERE id = ?''',
-                (new_subject_id,)
-            )
-            print(f"✅ Вычтено 2 часа для нового предмета: {new_subject_name}")
-
-            # 7. Обновляем урок
-            result = await database.execute(
-                '''UPDATE lessons 
-                   SET teacher = ?, subject_name = ?, editable = 1
-                   WHERE day = ? AND time_slot = ? AND group_id = ?''',
-                (new_teacher, new_subject_name, day, time_slot, group_id)
-            )
 
-            if result.rowcount == 0:
-                return {"success": False, "message": "Не удалось обновить урок"}
+                if result.rowcount == 0:
+                    return {"success": False, "message": "Не удалось обновить урок"}
 
-            return {
-                "success": True,
-                "message": "Пара успешно обновлена"
-            }
+                return {
+                    "success": True,
+                    "message": "Пара успешно обновлена"
+                }
 
-        except Exception as e:
-            print(f"❌ Ошибка ручного обновления пары: {e}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            return {"success": False, "message": f"Ошибка обновления: {str(e)}"}
+            except Exception as e:
+                print(f"❌ Ошибка ручного обновления пары: {e}")
+                import traceback
+                print(f"❌ Traceback: {traceback.format_exc()}")
+                return {"success": False, "message": f"Ошибка обновления: {str(e)}"}
 
-    # ДОБАВЛЯЕМ НОВЫЙ МЕТОД ДЛЯ ПРОВЕРКИ С ИСКЛЮЧЕНИЕМ
     async def check_teacher_availability_with_exception(self, teacher: str, day: int,
                                                         time_slot: int, current_group_id: int,
                                                         except_teacher: str = None) -> Tuple[bool, str]:
         """Проверить доступность преподавателя с исключением (для замены)"""
         try:
-            # 1. Проверяем, не ведет ли преподаватель в это время в другой группе
-            conflict = await database.fetch_one(
-                '''SELECT group_id FROM lessons 
-                   WHERE teacher = ? AND day = ? AND time_slot = ? AND group_id != ?''',
-                (teacher, day, time_slot, current_group_id)
+            facts = await self._fetch_slot_facts(teacher, None, day, time_slot, current_group_id)
+            reasons = self._teacher_reasons(
+                facts, teacher, day, time_slot, replace=True, except_teacher=except_teacher
             )
+            if reasons:
+                return False, reasons[0][1]
 
-            if conflict:
-                other_group_id = conflict[0]
-                return False, f"Преподаватель уже ведет занятие в группе {other_group_id} в это время"
+            return True, "Преподаватель доступен"
 
-            # 2. Если это ЗАМЕНА того же преподавателя - разрешаем
-            if except_teacher and teacher == except_teacher:
-                print(f"⚠️ Разрешаем замену того же преподавателя: {teacher}")
-                # Пропускаем проверку занятости в текущей группе
-            else:
-                # 3. Проверяем, не занят ли преподаватель в ТЕКУЩЕЙ группе в это время
-                # (но это должен быть ДРУГОЙ урок, не тот который заменяем)
-                conflict_in_current = await database.fetch_one(
-                    '''SELECT teacher FROM lessons 
-                       WHERE teacher = ? AND day = ? AND time_slot = ? AND group_id = ?''',
-                    (teacher, day, time_slot, current_group_id)
-                )
+        except Exception as e:
+            return False, f"Ошибка проверки доступности: {str(e)}"
 
-                if conflict_in_current and conflict_in_current[0] != except_teacher:
-                    return False, f"Преподаватель уже ведет другой урок в это время в текущей группе"
 
-            # 4. Проверяем ограничения преподавателя (negative_filters)
-            filters = await negative_filters_service.get_teacher_filters(teacher)
-            if filters:
-                if day in filters.get('restricted_days', []):
-                    return False, f"Преподаватель недоступен в этот день недели"
+    @classmethod
+    def _move_reasons(cls, facts: Dict, teacher: str, subject_name: str,
+                      day: int, time_slot: int) -> List[Tuple[str, str]]:
+        """Причины, по которым урок нельзя перенести в ячейку.
+
+        Перенос не меняет часы, поэтому остаток пар (и само наличие предмета) не проверяется.
+        """
+        reasons = (cls._teacher_reasons(facts, teacher, day, time_slot)
+                   + cls._subject_reasons(facts, subject_name, teacher))
+        return [(code, message) for code, message in reasons
+                if code not in ("no_pairs_left", "subject_not_found")]
+
+    async def _fetch_pair_facts(self, conn, group_id: int, cell_a: Tuple[int, int],
+                                cell_b: Tuple[int, int]) -> Tuple[Optional[Dict], Optional[Dict], Dict, Dict]:
+        """Одним запросом получить уроки двух ячеек и факты для переноса каждого в другую ячейку.
+
+        Возвращает (урок A, урок B, факты для A в ячейке B, факты для B в ячейке A).
+        Обе ячейки при подсчете считаются освобожденными.
+        """
+        cursor = await conn.execute(MOVE_FACTS_QUERY, {
+            "group_id": group_id,
+            "day_a": cell_a[0], "slot_a": cell_a[1],
+            "day_b": cell_b[0], "slot_b": cell_b[1]
+        })
+        row = await cursor.fetchone()
+        await cursor.close()
+
+        def lesson(offset):
+            lesson_id, teacher, subject_name, editable = row[offset:offset + 4]
+            if lesson_id is None:
+                return None
+            return {"id": lesson_id, "teacher": teacher, "subject_name": subject_name, "editable": editable}
+
+        def facts(offset):
+            conflict_group_id, days_json, slots_json, max_per_day, day_count = row[offset:offset + 5]
+            try:
+                filters = negative_filters_service.parse_filter(days_json, slots_json)
+            except json.JSONDecodeError:
+                filters = {"restricted_days": [], "restricted_slots": []}
+            return {
+                "conflict_group_id": conflict_group_id,
+                "occupant_teacher": None,
+                "occupant_subject": None,
+                "restricted_days": filters["restricted_days"],
+                "restricted_slots": filters["restricted_slots"],
+                "subject": None if max_per_day is None else {
+                    "id": None, "remaining_pairs": 0, "max_per_day": max_per_day
+                },
+                "today_count": day_count or 0
+            }
 
-                if time_slot in filters.get('restricted_slots', []):
-                    return False, f"Преподаватель недоступен в эту пару"
+        return lesson(0), lesson(4), facts(8), facts(13)
 
-            return True, "Преподаватель доступен"
+    async def move_lesson(self, day: int, time_slot: int, to_day: int, to_time_slot: int,
+                          group_id: int) -> Dict:
+        """Перенести пару в свободную ячейку (часы не меняются)"""
+        async with locks.group(group_id):
+            try:
+                print(f"↪️ Перенос пары: ({day}, {time_slot}) -> ({to_day}, {to_time_slot}), группа={group_id}")
+                if (day, time_slot) == (to_day, to_time_slot):
+                    return {"success": True, "message": "Изменений не требуется"}
 
-        except Exception as e:
-            return False, f"Ошибка проверки доступности: {str(e)}"
+                async with database.transaction() as conn:
+                    lesson, target, facts, _ = await self._fetch_pair_facts(
+                        conn, group_id, (day, time_slot), (to_day, to_time_slot)
+                    )
+                    if not lesson:
+                        return {"success": False, "message": "Урок не найден"}
+                    if target:
+                        return {"success": False, "message": "Целевая ячейка уже занята"}
+
+                    reasons = self._move_reasons(facts, lesson["teacher"], lesson["subject_name"],
+                                                 to_day, to_time_slot)
+                    if reasons:
+                        return {"success": False, "message": reasons[0][1]}
+
+                    await conn.execute(
+                        'UPDATE lessons SET day = ?, time_slot = ? WHERE id = ?',
+                        (to_day, to_time_slot, lesson["id"])
+                    )
+
+                return {"success": True, "message": "Пара успешно перенесена"}
+
+            except Exception as e:
+                print(f"❌ Ошибка переноса пары: {e}")
+                return {"success": False, "message": f"Ошибка переноса: {str(e)}"}
+
+    async def swap_lessons(self, day: int, time_slot: int, to_day: int, to_time_slot: int,
+                           group_id: int) -> Dict:
+        """Поменять местами две пары (часы не меняются)"""
+        async with locks.group(group_id):
+            try:
+                print(f"🔁 Обмен пар: ({day}, {time_slot}) <-> ({to_day}, {to_time_slot}), группа={group_id}")
+                if (day, time_slot) == (to_day, to_time_slot):
+                    return {"success": True, "message": "Изменений не требуется"}
 
+                async with database.transaction() as conn:
+                    lesson_a, lesson_b, facts_a, facts_b = await self._fetch_pair_facts(
+                        conn, group_id, (day, time_slot), (to_day, to_time_slot)
+                    )
+                    if not lesson_a or not lesson_b:
+                        return {"success": False, "message": "Для обмена обе ячейки должны быть заняты"}
+
+                    reasons = (self._move_reasons(facts_a, lesson_a["teacher"], lesson_a["subject_name"],
+                                                  to_day, to_time_slot)
+                               + self._move_reasons(facts_b, lesson_b["teacher"], lesson_b["subject_name"],
+                                                    day, time_slot))
+                    if reasons:
+                        return {"success": False, "message": reasons[0][1]}
+
+                    # Меняем содержимое строк, позиции (и UNIQUE(day, time_slot, group_id)) не трогаем
+                    await conn.executemany(
+                        'UPDATE lessons SET teacher = ?, subject_name = ?, editable = ? WHERE id = ?',
+                        [
+                            (lesson_b["teacher"], lesson_b["subject_name"], lesson_b["editable"], lesson_a["id"]),
+                            (lesson_a["teacher"], lesson_a["subject_name"], lesson_a["editable"], lesson_b["id"])
+                        ]
+                    )
+
+                return {"success": True, "message": "Пары успешно поменяны местами"}
+
+            except Exception as e:
+                print(f"❌ Ошибка обмена пар: {e}")
+                return {"success": False, "message": f"Ошибка обмена: {str(e)}"}
 
     async def delete_lesson(self, day: int, time_slot: int, group_id: int) -> Dict:
         """Удалить пару вручную"""
-        try:
-            print(f"🗑️ Удаление пары: день={day}, слот={time_slot}, группа={group_id}")
+        async with locks.group(group_id):
+            try:
+                print(f"🗑️ Удаление пары: день={day}, слот={time_slot}, группа={group_id}")
+
+                # 1. Получаем удаляемый урок
+                lesson = await database.fetch_one(
+                    'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
+                    (day, time_slot, group_id)
+                )
 
-            # 1. Получаем удаляемый урок
-            lesson = await database.fetch_one(
-                'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, group_id)
-            )
+                if not lesson:
+                    return {"success": False, "message": "Урок не найден"}
 
-            if not lesson:
-                return {"success": False, "message": "Урок не найден"}
-
-            teacher, subject_name = lesson
-
-            # 2. Восстанавливаем часы предмета
-            subject = await subject_service.get_subject_by_name(teacher, subject_name, group_id)
-            if subject:
-                await database.execute(
-                    '''UPDATE subjects 
-                       SET remaining_hours = remaining_hours + 2,
-                           remaining_pairs = (remaining_hours + 2) / 2
-                       WHERE id = ?''',
-                    (subject.id,)
+                # 2. Удаляем урок (часы предмета восстановит триггер)
+                result = await database.execute(
+                    'DELETE FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
+                    (day, time_slot, group_id)
                 )
-                print(f"✅ Восстановлено 2 часа для предмета {subject_name}")
 
-            # 3. Удаляем урок
-            result = await database.execute(
-                'DELETE FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, group_id)
+                if result.rowcount == 0:
+                    return {"success": False, "message": "Не удалось удалить урок"}
+
+                return {
+                    "success": True,
+                    "message": "Пара успешно удалена"
+                }
+
+            except Exception as e:
+                print(f"❌ Ошибка удаления пары: {e}")
+                import traceback
+                print(f"❌ Traceback: {traceback.format_exc()}")
+                return {"success": False, "message": f"Ошибка удаления: {str(e)}"}
+
+    async def _load_snapshot(self, conn, group_id: int) -> "GroupSnapshot":
+        """Прочитать состояние группы в рамках открытой транзакции"""
+        cursor = await conn.execute(
+            'SELECT id, day, time_slot, teacher, subject_name FROM lessons WHERE group_id = ?',
+            (group_id,)
+        )
+        lessons = await cursor.fetchall()
+        await cursor.close()
+
+        cursor = await conn.execute(
+            '''SELECT teacher, day, time_slot, group_id FROM lessons
+               WHERE group_id != :group_id
+                 AND teacher IN (SELECT teacher FROM subjects WHERE group_id = :group_id)''',
+            {"group_id": group_id}
+        )
+        busy = await cursor.fetchall()
+        await cursor.close()
+
+        cursor = await conn.execute(
+            'SELECT id, teacher, subject_name, total_hours, max_per_day FROM subjects WHERE group_id = ?',
+            (group_id,)
+        )
+        subjects = await cursor.fetchall()
+        await cursor.close()
+
+        cursor = await conn.execute(
+            'SELECT teacher, restricted_days, restricted_slots FROM negative_filters'
+        )
+        filter_rows = await cursor.fetchall()
+        await cursor.close()
+
+        filters = {}
+        for teacher, days_json, slots_json in filter_rows:
+            try:
+                filters[teacher] = negative_filters_service.parse_filter(days_json, slots_json)
+            except json.JSONDecodeError:
+                continue
+
+        return GroupSnapshot(group_id, lessons, busy, subjects, filters)
+
+    def _apply_operation(self, snapshot: "GroupSnapshot", operation: Dict) -> List[Tuple[str, str]]:
+        """Проверить операцию на снимке и, если она допустима, применить её к снимку.
+
+        Возвращает список причин отказа (пустой - операция применена).
+        """
+        op = operation.get("op")
+        cell = (operation.get("day"), operation.get("time_slot"))
+        lesson = snapshot.cells.get(cell)
+
+        if op == "add":
+            teacher = operation.get("teacher")
+            subject_name = operation.get("subject_name")
+            if not teacher or not subject_name:
+                return [("invalid", "Для добавления нужны преподаватель и предмет")]
+
+            facts = snapshot.facts(teacher, subject_name, *cell)
+            reasons = (self._teacher_reasons(facts, teacher, *cell)
+                       + self._subject_reasons(facts, subject_name, teacher))
+            if not reasons:
+                snapshot.cells[cell] = {"id": None, "teacher": teacher, "subject_name": subject_name}
+            return reasons
+
+        if op == "delete":
+            if not lesson:
+                return [("not_found", "Урок не найден")]
+            del snapshot.cells[cell]
+            return []
+
+        if op in ("move", "swap"):
+            target = (operation.get("to_day"), operation.get("to_time_slot"))
+            if None in target:
+                return [("invalid", "Не указана целевая ячейка")]
+            if not lesson:
+                return [("not_found", "Урок не найден")]
+            if target == cell:
+                return []
+
+            other = snapshot.cells.get(target)
+            if op == "move" and other:
+                return [("slot_occupied", "Целевая ячейка уже занята")]
+            if op == "swap" and not other:
+                return [("not_found", "В целевой ячейке нет урока для обмена")]
+
+            ignore = {cell, target}
+            reasons = snapshot.move_reasons(self, lesson, target, ignore)
+            if op == "swap":
+                reasons += snapshot.move_reasons(self, other, cell, ignore)
+
+            if not reasons:
+                if op == "swap":
+                    # Как swap_lessons: строки остаются на местах, меняется содержимое
+                    snapshot.cells[cell] = {**other, "id": lesson["id"]}
+                    snapshot.cells[target] = {**lesson, "id": other["id"]}
+                else:
+                    # Перенос сохраняет id урока (как move_lesson)
+                    del snapshot.cells[cell]
+                    snapshot.cells[target] = lesson
+            return reasons
+
+        return [("invalid", f"Неизвестная операция: {op}")]
+
+    @staticmethod
+    async def _apply_moves(conn, moves: List[Tuple[int, Tuple[int, int], Tuple[int, int]]],
+                           occupied: Dict[Tuple[int, int], int]):
+        """Перенести уроки UPDATE-ами позиций, не нарушая UNIQUE(day, time_slot, group_id).
+
+        moves - (id, откуда, куда), occupied - занятые ячейки группы: ячейка -> id.
+        Сначала переносятся уроки, чья целевая ячейка уже свободна; цепочку
+        переносов по кругу разрывает временный перенос одного урока в
+        свободную ячейку недели.
+        """
+        position = {lesson_id: source for lesson_id, source, _ in moves}
+        pending = {lesson_id: target for lesson_id, _, target in moves}
+
+        async def move(lesson_id: int, target: Tuple[int, int]):
+            await conn.execute(
+                'UPDATE lessons SET day = ?, time_slot = ? WHERE id = ?',
+                (target[0], target[1], lesson_id)
             )
-
-            if result.rowcount == 0:
-                return {"success": False, "message": "Не удалось удалить урок"}
+            occupied.pop(position[lesson_id], None)
+            occupied[target] = lesson_id
+            position[lesson_id] = target
+
+        while pending:
+            ready = [lesson_id for lesson_id, target in pending.items() if target not in occupied]
+            if ready:
+                for lesson_id in ready:
+                    await move(lesson_id, pending.pop(lesson_id))
+                continue
+
+            lesson_id = next(iter(pending))
+            free = next(((day, time_slot) for day in range(MAX_DAYS) for time_slot in range(MAX_TIME_SLOTS)
+                         if (day, time_slot) not in occupied), None)
+            if free is None:
+                raise ValueError("Нет свободной ячейки для переноса уроков по кругу")
+            await move(lesson_id, free)
+
+    async def apply_batch(self, group_id: int, operations: List[Dict], dry_run: bool = False) -> Dict:
+        """Применить пакет операций (add, move, swap, delete) атомарно.
+
+        Операции проверяются по очереди на снимке расписания в памяти. Если хотя бы
+        одна операция недопустима, в БД ничего не записывается. Иначе изменения
+        записываются одной транзакцией (часы пересчитывают триггеры на lessons).
+        """
+        async with locks.group(group_id):
+            print(f"📦 Пакетное редактирование: {len(operations)} операций, группа={group_id}")
+
+            async with database.transaction() as conn:
+                snapshot = await self._load_snapshot(conn, group_id)
+                original = dict(snapshot.cells)
+
+                results = []
+                for index, operation in enumerate(operations):
+                    reasons = self._apply_operation(snapshot, operation)
+                    results.append({
+                        "index": index,
+                        "op": operation.get("op"),
+                        "success": not reasons,
+                        "message": reasons[0][1] if reasons else "OK",
+                        "reasons": [{"code": code, "message": message} for code, message in reasons]
+                    })
+
+                failed = [r for r in results if not r["success"]]
+                if failed or dry_run:
+                    return {
+                        "success": not failed,
+                        "applied": False,
+                        "message": (f"Пакет отклонен: {len(failed)} операций недопустимы"
+                                    if failed else "Проверка пройдена, изменения не применялись"),
+                        "results": results
+                    }
+
+                deletes, moves, updates, inserts = snapshot.diff(original)
+                if deletes:
+                    await conn.executemany('DELETE FROM lessons WHERE id = ?', deletes)
+                if updates:
+                    await conn.executemany(
+                        'UPDATE lessons SET teacher = ?, subject_name = ?, editable = 1 WHERE id = ?',
+                        updates
+                    )
+                if moves:
+                    deleted = {lesson_id for lesson_id, in deletes}
+                    occupied = {cell: lesson["id"] for cell, lesson in original.items()
+                                if lesson["id"] not in deleted}
+                    await self._apply_moves(conn, moves, occupied)
+                if inserts:
+                    await conn.executemany(
+                        '''INSERT INTO lessons (day, time_slot, teacher, subject_name, editable, group_id)
+                           VALUES (?, ?, ?, ?, 1, ?)''',
+                        [(day, time_slot, teacher, subject_name, group_id)
+                         for day, time_slot, teacher, subject_name in inserts]
+                    )
+
+            print(f"✅ Пакет применен: -{len(deletes)} ~{len(updates)} ↪{len(moves)} +{len(inserts)}")
 
             return {
                 "success": True,
-                "message": "Пара успешно удалена"
+                "applied": True,
+                "message": f"Применено операций: {len(operations)}",
+                "results": results
             }
 
-        except Exception as e:
-            print(f"❌ Ошибка удаления пары: {e}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
-            return {"success": False, "message": f"Ошибка удаления: {str(e)}"}
+
+class GroupSnapshot:
+    """Снимок расписания группы в памяти для пакетной проверки операций"""
+
+    def __init__(self, group_id: int, lessons, busy, subjects, filters: Dict):
+        self.group_id = group_id
+        # (day, time_slot) -> {"id", "teacher", "subject_name"}
+        self.cells = {
+            (day, time_slot): {"id": lesson_id, "teacher": teacher, "subject_name": subject_name}
+            for lesson_id, day, time_slot, teacher, subject_name in lessons
+        }
+        # (teacher, day, time_slot) -> group_id другой группы
+        self.busy = {}
+        for teacher, day, time_slot, other_group_id in busy:
+            self.busy.setdefault((teacher, day, time_slot), other_group_id)
+        # (teacher, subject_name) -> {"id", "total_hours", "max_per_day"}
+        self.subjects = {
+            (teacher, subject_name): {"id": subject_id, "total_hours": total_hours, "max_per_day": max_per_day}
+            for subject_id, teacher, subject_name, total_hours, max_per_day in subjects
+        }
+        self.filters = filters
+
+    def facts(self, teacher: str, subject_name: str, day: int, time_slot: int,
+              ignore: Set[Tuple[int, int]] = frozenset()) -> Dict:
+        """Факты о ячейке в том же виде, что и SLOT_FACTS_QUERY (ячейки из ignore считаются пустыми)"""
+        occupant = self.cells.get((day, time_slot)) if (day, time_slot) not in ignore else None
+        filters = self.filters.get(teacher, {})
+
+        subject = self.subjects.get((teacher, subject_name))
+        subject_facts = None
+        if subject:
+            scheduled = sum(
+                1 for lesson in self.cells.values()
+                if lesson["teacher"] == teacher and lesson["subject_name"] == subject_name
+            )
+            subject_facts = {
+                "id": subject["id"],
+                "remaining_pairs": max(0, subject["total_hours"] - 2 * scheduled) // 2,
+                "max_per_day": subject["max_per_day"]
+            }
+
+        return {
+            "conflict_group_id": self.busy.get((teacher, day, time_slot)),
+            "occupant_teacher": occupant["teacher"] if occupant else None,
+            "occupant_subject": occupant["subject_name"] if occupant else None,
+            "restricted_days": filters.get("restricted_days", []),
+            "restricted_slots": filters.get("restricted_slots", []),
+            "subject": subject_facts,
+            "today_count": sum(
+                1 for cell, lesson in self.cells.items()
+                if cell[0] == day and cell not in ignore
+                and lesson["teacher"] == teacher and lesson["subject_name"] == subject_name
+            )
+        }
+
+    def move_reasons(self, service: "ManualScheduleService", lesson: Dict,
+                     target: Tuple[int, int], ignore: Set[Tuple[int, int]]) -> List[Tuple[str, str]]:
+        """Причины, по которым урок нельзя перенести в target"""
+        teacher, subject_name = lesson["teacher"], lesson["subject_name"]
+        facts = self.facts(teacher, subject_name, *target, ignore=ignore)
+        return service._move_reasons(facts, teacher, subject_name, *target)
+
+    def diff(self, original: Dict) -> Tuple[List, List, List, List]:
+        """Изменения относительно исходного состояния: (удаления, переносы, обновления, вставки).
+
+        Уроки сопоставляются по id, поэтому перенесенный урок дает перенос
+        (id, откуда, куда), а не удаление и вставку.
+        """
+        before = {lesson["id"]: (cell, lesson) for cell, lesson in original.items()}
+        kept = set()
+        moves, updates, inserts = [], [], []
+        for cell, lesson in self.cells.items():
+            if lesson["id"] is None:
+                inserts.append((cell[0], cell[1], lesson["teacher"], lesson["subject_name"]))
+                continue
+            kept.add(lesson["id"])
+            source, old = before[lesson["id"]]
+            if source != cell:
+                moves.append((lesson["id"], source, cell))
+            if (old["teacher"], old["subject_name"]) != (lesson["teacher"], lesson["subject_name"]):
+                updates.append((lesson["teacher"], lesson["subject_name"], lesson["id"]))
+        deletes = [(lesson_id,) for lesson_id in before if lesson_id not in kept]
+        return deletes, moves, updates, inserts
 
 
 # Глобальный экземпляр
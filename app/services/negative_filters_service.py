@@ -1,9 +1,66 @@
 from app.db.database import database
+from app.services.data_version_service import data_version_service
 import json
 from typing import Dict, List, Optional
 
 
 class NegativeFiltersService:
+    def __init__(self):
+        # Кэш всех глобальных фильтров: teacher -> {"restricted_days", "restricted_slots"}
+        self._filters: Optional[Dict[str, Dict]] = None
+        # Версия negative_filters из data_versions, при которой кэш был загружен
+        self._table_version: Optional[int] = None
+        # Версия содержимого кэша (растет при каждой перезагрузке или записи)
+        self.version = 0
+
+    @staticmethod
+    def parse_filter(days_json: Optional[str], slots_json: Optional[str]) -> Dict:
+        """Разобрать JSON-поля строки negative_filters"""
+        return {
+            "restricted_days": json.loads(days_json) if days_json else [],
+            "restricted_slots": json.loads(slots_json) if slots_json else []
+        }
+
+    async def _ensure_loaded(self) -> Dict[str, Dict]:
+        """Загрузить фильтры, если кэш пуст или фильтры изменены (в том числе другим процессом).
+
+        Сверяется только счетчик таблицы negative_filters, поэтому записи в
+        другие таблицы кэш не сбрасывают.
+        """
+        # Версию читаем до запроса: запись во время чтения сделает кэш устаревшим, а не ошибочным
+        table_version = await data_version_service.get_version('negative_filters')
+        if self._filters is not None and table_version == self._table_version:
+            return self._filters
+
+        # ПРЯМОЙ запрос без group_id
+        rows = await database.fetch_all(
+            'SELECT teacher, restricted_days, restricted_slots FROM negative_filters'
+        )
+
+        filters = {}
+        for row in rows:
+            teacher, days_json, slots_json = row
+            try:
+                filters[teacher] = self.parse_filter(days_json, slots_json)
+            except json.JSONDecodeError as e:
+                print(f"❌ Ошибка парсинга JSON для {teacher}: {e}")
+                filters[teacher] = {
+                    "restricted_days": [],
+                    "restricted_slots": []
+                }
+
+        self._filters = filters
+        self._table_version = table_version
+        self.version += 1
+        print(f"✅ Загружено {len(filters)} ГЛОБАЛЬНЫХ фильтров")
+        return filters
+
+    def invalidate_cache(self):
+        """Сбросить кэш фильтров"""
+        self._filters = None
+        self._table_version = None
+        self.version += 1
+
     async def save_negative_filter(self, teacher: str, restricted_days: List[int], restricted_slots: List[int]) -> bool:
         """Сохранить ГЛОБАЛЬНЫЕ ограничения для преподавателя"""
         try:
@@ -11,6 +68,7 @@ class NegativeFiltersService:
                 'INSERT OR REPLACE INTO negative_filters (teacher, restricted_days, restricted_slots) VALUES (?, ?, ?)',
                 (teacher, json.dumps(restricted_days), json.dumps(restricted_slots))
             )
+            self.invalidate_cache()
             print(f"✅ Глобальные ограничения сохранены для {teacher}")
             return True
         except Exception as e:
@@ -18,30 +76,17 @@ class NegativeFiltersService:
             return False
 
     async def get_negative_filters(self) -> Dict:
-        """Получить ВСЕ глобальные ограничения"""
+        """Получить ВСЕ глобальные ограничения (из кэша)"""
         try:
-            # ПРЯМОЙ запрос без group_id
-            rows = await database.fetch_all(
-                'SELECT teacher, restricted_days, restricted_slots FROM negative_filters'
-            )
-
-            filters = {}
-            for row in rows:
-                teacher, days_json, slots_json = row
-                try:
-                    filters[teacher] = {
-                        "restricted_days": json.loads(days_json) if days_json else [],
-                        "restricted_slots": json.loads(slots_json) if slots_json else []
-                    }
-                except json.JSONDecodeError as e:
-                    print(f"❌ Ошибка парсинга JSON для {teacher}: {e}")
-                    filters[teacher] = {
-                        "restricted_days": [],
-                        "restricted_slots": []
-                    }
-
-            print(f"✅ Загружено {len(filters)} ГЛОБАЛЬНЫХ фильтров")
-            return filters
+            filters = await self._ensure_loaded()
+            # Отдаем копию, чтобы вызывающий код не испортил кэш
+            return {
+                teacher: {
+                    "restricted_days": list(f["restricted_days"]),
+                    "restricted_slots": list(f["restricted_slots"])
+                }
+                for teacher, f in filters.items()
+            }
         except Exception as e:
             print(f"❌ Ошибка получения глобальных ограничений: {e}")
             # Возвращаем пустой словарь в случае ошибки
@@ -50,16 +95,12 @@ class NegativeFiltersService:
     async def get_teacher_filters(self, teacher: str) -> Optional[Dict]:
         """Получить глобальные ограничения для конкретного преподавателя"""
         try:
-            row = await database.fetch_one(
-                'SELECT restricted_days, restricted_slots FROM negative_filters WHERE teacher = ?',
-                (teacher,)
-            )
-
-            if row:
-                days_json, slots_json = row
+            filters = await self._ensure_loaded()
+            f = filters.get(teacher)
+            if f:
                 return {
-                    "restricted_days": json.loads(days_json) if days_json else [],
-                    "restricted_slots": json.loads(slots_json) if slots_json else []
+                    "restricted_days": list(f["restricted_days"]),
+                    "restricted_slots": list(f["restricted_slots"])
                 }
             return None
         except Exception as e:
@@ -73,6 +114,7 @@ class NegativeFiltersService:
                 'DELETE FROM negative_filters WHERE teacher = ?',
                 (teacher,)
             )
+            self.invalidate_cache()
             print(f"✅ Глобальные ограничения удалены для {teacher}")
             return True
         except Exception as e:
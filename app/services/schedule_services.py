@@ -1,7 +1,10 @@
 # app/services/schedule_services.py
+import json
+from datetime import datetime
+from app.core.locks import locks, leases
 from app.db.database import database
 from app.db.models import Lesson
-from typing import List
+from typing import Dict, List
 from app.services.shedule_generator import schedule_generator
 
 
@@ -11,7 +14,8 @@ class ScheduleService:
 
     async def generate_schedule(self, group_id: int = 1) -> List[Lesson]:
         """Просто используем главный генератор"""
-        return await self.generator.generate_schedule(group_id)
+        async with leases.hold(f"generate:{group_id}", "Для группы уже выполняется генерация"):
+            return await self.generator.generate_schedule(group_id)
 
     async def get_all_lessons(self, group_id: int = 1) -> List[Lesson]:
         """Получить все уроки группы"""
@@ -31,48 +35,112 @@ class ScheduleService:
             for row in rows
         ]
 
-    async def remove_lesson(self, day: int, time_slot: int, group_id: int = 1) -> bool:
-        """Удалить урок"""
-        try:
-            # Получаем удаляемый урок
-            lesson = await database.fetch_one(
-                'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, group_id)
-            )
+    async def get_lessons_version(self) -> int:
+        """Номер последнего изменения в журнале уроков"""
+        row = await database.fetch_one('SELECT COALESCE(MAX(version), 0) FROM lesson_changes')
+        return row[0]
 
-            if not lesson:
-                return False
+    async def get_lesson_changes(self, group_id: int = 1, since: int = 0) -> Dict:
+        """Уроки группы, добавленные, измененные и удаленные после версии since.
 
-            teacher, subject_name = lesson
+        Несколько изменений одного урока сворачиваются: отдается его текущее
+        состояние. Если журнал уже обрезан до since (или база пересоздана),
+        возвращается полный список уроков с reset=True.
+        """
+        first_version, version = await database.fetch_one(
+            'SELECT COALESCE(MIN(version), 1), COALESCE(MAX(version), 0) FROM lesson_changes'
+        )
+        result = {
+            "group_id": group_id,
+            "since": since,
+            "version": version,
+            "reset": False,
+            "inserted": [],
+            "updated": [],
+            "deleted": []
+        }
 
-            # Восстанавливаем часы
-            subject = await database.fetch_one(
-                'SELECT id FROM subjects WHERE teacher = ? AND subject_name = ? AND group_id = ?',
-                (teacher, subject_name, group_id)
-            )
+        if since > version or since < first_version - 1:
+            result["reset"] = True
+            result["inserted"] = [lesson.model_dump() for lesson in await self.get_all_lessons(group_id)]
+            return result
+
+        # op берется из первого изменения урока в окне (MIN(version) в SQLite
+        # возвращает остальные колонки той же строки)
+        rows = await database.fetch_all('''
+            SELECT c.lesson_id, c.op, MIN(c.version),
+                   l.id, l.day, l.time_slot, l.teacher, l.subject_name, l.editable
+            FROM lesson_changes c
+            LEFT JOIN lessons l ON l.id = c.lesson_id AND l.group_id = c.group_id
+            WHERE c.group_id = ? AND c.version > ? AND c.version <= ?
+            GROUP BY c.lesson_id
+            ORDER BY c.lesson_id
+        ''', (group_id, since, version))
+
+        for lesson_id, first_op, _, current_id, day, time_slot, teacher, subject_name, editable in rows:
+            if current_id is None:
+                # Добавленный и удаленный в пределах окна урок клиенту не нужен
+                if first_op != 'insert':
+                    result["deleted"].append(lesson_id)
+                continue
 
-            if subject:
-                subject_id = subject[0]
-                # Восстанавливаем 2 часа
-                await database.execute(
-                    '''UPDATE subjects 
-                       SET remaining_hours = remaining_hours + 2,
-                           remaining_pairs = (remaining_hours + 2) / 2
-                       WHERE id = ?''',
-                    (subject_id,)
+            lesson = Lesson(
+                id=current_id,
+                day=day,
+                time_slot=time_slot,
+                teacher=teacher,
+                subject_name=subject_name,
+                editable=bool(editable)
+            ).model_dump()
+            result["inserted" if first_op == 'insert' else "updated"].append(lesson)
+
+        return result
+
+    async def get_saved_schedules(self, group_id: int = 1) -> List[Dict]:
+        """Список сохраненных расписаний группы (без самих уроков)"""
+        rows = await database.fetch_all(
+            'SELECT id, name, created_at, payload FROM saved_schedules WHERE group_id = ? ORDER BY created_at DESC',
+            (group_id,)
+        )
+
+        schedules = []
+        for schedule_id, name, created_at, payload in rows:
+            try:
+                lesson_count = len(json.loads(payload).get("lessons", []))
+            except (TypeError, ValueError, AttributeError):
+                lesson_count = 0
+            schedules.append({
+                "id": schedule_id,
+                "name": name,
+                "created_at": datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at,
+                "lesson_count": lesson_count
+            })
+        return schedules
+
+    async def remove_lesson(self, day: int, time_slot: int, group_id: int = 1) -> bool:
+        """Удалить урок"""
+        async with locks.group(group_id):
+            try:
+                # Получаем удаляемый урок
+                lesson = await database.fetch_one(
+                    'SELECT teacher, subject_name FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
+                    (day, time_slot, group_id)
                 )
 
-            # Удаляем урок
-            result = await database.execute(
-                'DELETE FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
-                (day, time_slot, group_id)
-            )
+                if not lesson:
+                    return False
 
-            return result.rowcount > 0
+                # Удаляем урок (часы предмета восстановит триггер)
+                result = await database.execute(
+                    'DELETE FROM lessons WHERE day = ? AND time_slot = ? AND group_id = ?',
+                    (day, time_slot, group_id)
+                )
 
-        except Exception as e:
-            print(f"❌ Ошибка удаления урока: {e}")
-            return False
+                return result.rowcount > 0
+
+            except Exception as e:
+                print(f"❌ Ошибка удаления урока: {e}")
+                return False
 
     # async def update_lesson(self, day: int, time_slot: int, new_teacher: str, new_subject_name: str,
     #                         group_id: int = 1) -> bool:
@@ -146,52 +214,98 @@ class ScheduleService:
     #         print(f"❌ Ошибка обновления урока: {e}")
     #         return False
 
+    async def get_institution_timetables(self) -> Dict:
+        """Расписания всех групп и всех преподавателей за один проход по lessons.
+
+        Возвращает {"groups": [(название, уроки)], "teachers": [(имя, уроки)]};
+        у уроков преподавателя в note указана группа.
+        """
+        rows = await database.fetch_all('''
+            SELECT g.id, g.name, l.day, l.time_slot, l.teacher, l.subject_name
+            FROM study_groups g
+            LEFT JOIN lessons l ON l.group_id = g.id
+            ORDER BY g.name, l.day, l.time_slot
+        ''')
+
+        groups: Dict[int, Dict] = {}
+        teachers: Dict[str, List[Dict]] = {}
+        for group_id, group_name, day, time_slot, teacher, subject_name in rows:
+            group = groups.setdefault(group_id, {"name": group_name, "lessons": []})
+            if teacher is None:
+                continue  # Группа без уроков
+            lesson = {"day": day, "time_slot": time_slot, "teacher": teacher, "subject_name": subject_name}
+            group["lessons"].append(lesson)
+            teachers.setdefault(teacher, []).append({**lesson, "note": group_name})
+
+        return {
+            "groups": [(group["name"], group["lessons"]) for group in groups.values()],
+            "teachers": sorted(teachers.items())
+        }
+
+    @staticmethod
+    def _build_statistics(total_subjects, total_teachers, total_hours, remaining_hours, scheduled_pairs) -> Dict:
+        """Собрать словарь статистики из агрегатов"""
+        total_hours = total_hours or 0
+        remaining_hours = remaining_hours or 0
+        return {
+            "total_subjects": total_subjects or 0,
+            "total_teachers": total_teachers or 0,
+            "total_hours": total_hours,
+            "remaining_hours": remaining_hours,
+            "scheduled_pairs": scheduled_pairs or 0,
+            "remaining_pairs": (remaining_hours // 2) if remaining_hours else 0
+        }
+
     async def get_statistics(self, group_id: int = 1):
-        """Получить статистику"""
+        """Получить статистику (одним запросом)"""
         try:
-            subjects_count = await database.fetch_one(
-                'SELECT COUNT(*) FROM subjects WHERE group_id = ?',
-                (group_id,)
+            row = await database.fetch_one(
+                '''SELECT COUNT(*), COUNT(DISTINCT teacher), SUM(total_hours), SUM(remaining_hours),
+                          (SELECT COUNT(*) FROM lessons WHERE group_id = :group_id)
+                   FROM subjects WHERE group_id = :group_id''',
+                {"group_id": group_id}
             )
+            return self._build_statistics(*row)
+        except Exception as e:
+            print(f"❌ Ошибка получения статистики: {e}")
+            return self._build_statistics(0, 0, 0, 0, 0)
 
-            teachers_count = await database.fetch_one(
-                'SELECT COUNT(DISTINCT teacher) FROM subjects WHERE group_id = ?',
-                (group_id,)
-            )
+    async def get_all_statistics(self) -> Dict:
+        """Статистика по всем группам и по учебному заведению в целом (одним запросом)"""
+        rows = await database.fetch_all('''
+            SELECT g.id, g.name,
+                   s.total_subjects, s.total_teachers, s.total_hours, s.remaining_hours,
+                   l.scheduled_pairs,
+                   (SELECT COUNT(DISTINCT teacher) FROM subjects) AS institution_teachers
+            FROM study_groups g
+            LEFT JOIN (SELECT group_id,
+                              COUNT(*) AS total_subjects,
+                              COUNT(DISTINCT teacher) AS total_teachers,
+                              SUM(total_hours) AS total_hours,
+                              SUM(remaining_hours) AS remaining_hours
+                       FROM subjects GROUP BY group_id) s ON s.group_id = g.id
+            LEFT JOIN (SELECT group_id, COUNT(*) AS scheduled_pairs
+                       FROM lessons GROUP BY group_id) l ON l.group_id = g.id
+            ORDER BY g.name
+        ''')
 
-            hours_data = await database.fetch_one(
-                'SELECT SUM(total_hours), SUM(remaining_hours) FROM subjects WHERE group_id = ?',
-                (group_id,)
-            )
+        groups = []
+        for row in rows:
+            stats = self._build_statistics(*row[2:7])
+            groups.append({"group_id": row[0], "group_name": row[1], **stats})
 
-            pairs_data = await database.fetch_one(
-                'SELECT COUNT(*) FROM lessons WHERE group_id = ?',
-                (group_id,)
-            )
+        total_hours = sum(g["total_hours"] for g in groups)
+        remaining_hours = sum(g["remaining_hours"] for g in groups)
+        totals = self._build_statistics(
+            sum(g["total_subjects"] for g in groups),
+            rows[0][7] if rows else 0,
+            total_hours,
+            remaining_hours,
+            sum(g["scheduled_pairs"] for g in groups)
+        )
+        totals["total_groups"] = len(groups)
 
-            total_hours = hours_data[0] or 0
-            remaining_hours = hours_data[1] or 0
-            scheduled_pairs = pairs_data[0] or 0
-            remaining_pairs = (remaining_hours // 2) if remaining_hours else 0
-
-            return {
-                "total_subjects": subjects_count[0] or 0,
-                "total_teachers": teachers_count[0] or 0,
-                "total_hours": total_hours,
-                "remaining_hours": remaining_hours,
-                "scheduled_pairs": scheduled_pairs,
-                "remaining_pairs": remaining_pairs
-            }
-        except Exception as e:
-            print(f"❌ Ошибка получения статистики: {e}")
-            return {
-                "total_subjects": 0,
-                "total_teachers": 0,
-                "total_hours": 0,
-                "remaining_hours": 0,
-                "scheduled_pairs": 0,
-                "remaining_pairs": 0
-            }
+        return {"groups": groups, "totals": totals}
 
 
 # Глобальный экземпляр
@@ -1,74 +1,345 @@
 # app/services/schedule_generator.py
-from typing import List, Dict, Tuple
+from typing import Awaitable, Callable, List, Dict, Optional, Set, Tuple
 import random
 from collections import defaultdict
 import math
+import time
 
+from app.core.executors import executors
+from app.core.locks import locks
+from app.core.metrics import GENERATION_PHASE_DURATION, GENERATIONS, PLACEMENT_CONFLICTS, PLACEMENT_FAILURES
+from app.core.tracing import tracer
 from app.db.database import database
 from app.db.models import Lesson, Subject
 from app.services.subject_services import subject_service
 from app.services.negative_filters_service import negative_filters_service
+from app.services.event_hub import event_hub
 
 
-class ScheduleGenerator:
-    """Улучшенный генератор расписания с учетом ВСЕХ параметров"""
+class GenerationCancelled(Exception):
+    """Генерация отменена (задача отменена пользователем)"""
 
-    def __init__(self):
-        self.occupied_slots = set()
 
-    async def generate_schedule(self, group_id: int = 1) -> List[Lesson]:
-        """Главный метод генерации расписания"""
-        print(f"🎯 Генерация расписания для группы {group_id}...")
+# Колбэк прогресса генерации: получает словарь с phase и счетчиками
+ProgressCallback = Callable[[Dict], Awaitable[None]]
 
-        # Получаем предметы
-        subjects = await subject_service.get_all_subjects(group_id)
-        print(f"📚 Найдено предметов: {len(subjects)}")
 
-        if not subjects:
-            print("❌ Нет предметов для генерации")
-            return []
+# Веса оценки расстановки (см. score_placement)
+UNPLACED_PAIR_PENALTY = 10
+MIN_PER_WEEK_PENALTY = 20
+BUSY_CONFLICT_PENALTY = 20
 
-        # Получаем фильтры
-        negative_filters = await negative_filters_service.get_negative_filters()
 
-        # Очищаем старое расписание и восстанавливаем часы
-        await self.clear_and_reset(group_id)
+def score_placement(placed: List[Tuple[int, int, str, str]], subject_distribution: Dict,
+                    busy_slots: Set[Tuple[str, int, int]], days: Set[int]) -> int:
+    """Оценка расстановки (0 - идеал, чем больше штраф, тем меньше оценка).
 
-        # Генерируем расписание
-        lessons = await self.generate_with_all_params(subjects, negative_filters, group_id)
+    Попытки отличаются порядком перебора, поэтому сравниваются по тому, что
+    от него зависит: какие пары не поместились (дороже пары приоритетных
+    предметов и пары сверх недобора до min_per_week), сколько пар поставлено
+    запасным проходом поверх занятости преподавателя в другой группе и
+    насколько неравномерно загружены дни (разница самого загруженного и
+    самого свободного дня).
+    """
+    placed_counts = defaultdict(int)
+    per_day = {day: 0 for day in days}
+    conflicts = 0
+    for day, time_slot, teacher, subject_name in placed:
+        placed_counts[(teacher, subject_name)] += 1
+        per_day[day] = per_day.get(day, 0) + 1
+        if (teacher, day, time_slot) in busy_slots:
+            conflicts += 1
 
-        # Сохраняем уроки
-        for lesson in lessons:
-            await database.execute(
-                'INSERT INTO lessons (day, time_slot, teacher, subject_name, editable, group_id) VALUES (?, ?, ?, ?, ?, ?)',
-                (lesson.day, lesson.time_slot, lesson.teacher, lesson.subject_name, int(lesson.editable), group_id)
-            )
+    penalty = BUSY_CONFLICT_PENALTY * conflicts
+    for key, info in subject_distribution.items():
+        unplaced = max(0, info['pairs_to_assign'] - placed_counts[key])
+        penalty += unplaced * (UNPLACED_PAIR_PENALTY + max(0, info['priority']))
+        penalty += MIN_PER_WEEK_PENALTY * max(0, info.get('min_per_week', 0) - placed_counts[key])
+    if per_day:
+        penalty += max(per_day.values()) - min(per_day.values())
+    return -penalty
 
-        # Обновляем часы
-        await self.update_hours_after_generation(lessons, group_id)
 
-        print(f"✅ Сгенерировано {len(lessons)} уроков (максимум 20)")
-        return lessons
+def is_teacher_available(teacher: str, day: int, time_slot: int, negative_filters: Dict) -> bool:
+    """Проверить доступность преподавателя"""
+    if teacher not in negative_filters:
+        return True
 
-    async def clear_and_reset(self, group_id: int):
-        """Очистить расписание и восстановить часы"""
-        # Удаляем старые уроки
-        await database.execute(
-            'DELETE FROM lessons WHERE group_id = ?',
-            (group_id,)
+    filters = negative_filters[teacher]
+
+    if day in filters.get('restricted_days', []):
+        return False
+
+    if time_slot in filters.get('restricted_slots', []):
+        return False
+
+    return True
+
+
+def place_lessons(subject_distribution: Dict, negative_filters: Dict,
+                  slots: List[Tuple[int, int]],
+                  busy_slots: Set[Tuple[str, int, int]]) -> List[Tuple[int, int, str, str]]:
+    """Расставить пары по слотам недели.
+
+    Чистая функция без обращений к БД: занятость преподавателей в других
+    группах передается в busy_slots, поэтому ее можно выполнять в пуле процессов.
+    Возвращает список (day, time_slot, teacher, subject_name).
+    """
+    lessons = []
+
+    # Создаем список всех слотов
+    all_slots = list(slots)
+    random.shuffle(all_slots)  # Перемешиваем слоты
+    week_schedule = {slot: False for slot in all_slots}  # False = свободно
+
+    # Создаем список всех пар для распределения
+    all_pairs_to_place = []
+    for (teacher, subject_name), info in subject_distribution.items():
+        for _ in range(info['pairs_to_assign']):
+            all_pairs_to_place.append({
+                'teacher': teacher,
+                'subject_name': subject_name,
+                'max_per_day': info['max_per_day'],
+                'priority': info['priority']
+            })
+
+    # Перемешиваем пары для лучшего распределения
+    random.shuffle(all_pairs_to_place)
+
+    # Счетчики для контроля max_per_day
+    daily_counts = defaultdict(lambda: defaultdict(int))  # day -> (teacher, subject) -> count
+
+    # Пытаемся разместить каждую пару
+    for pair_info in all_pairs_to_place:
+        teacher = pair_info['teacher']
+        subject_name = pair_info['subject_name']
+        max_per_day = pair_info['max_per_day']
+
+        placed = False
+
+        # Пробуем разместить в случайном порядке слотов
+        for day, time_slot in all_slots:
+            # Проверяем свободен ли слот
+            if week_schedule[(day, time_slot)]:
+                continue
+
+            # Проверяем max_per_day
+            key = (teacher, subject_name)
+            if daily_counts[day][key] >= max_per_day:
+                continue
+
+            # Проверяем доступность преподавателя
+            if not is_teacher_available(teacher, day, time_slot, negative_filters):
+                continue
+
+            # Проверяем что преподаватель не занят в других группах
+            if (teacher, day, time_slot) in busy_slots:
+                continue
+
+            # Нашли подходящий слот - размещаем
+            lessons.append((day, time_slot, teacher, subject_name))
+            week_schedule[(day, time_slot)] = True  # Помечаем как занятый
+            daily_counts[day][key] += 1
+            placed = True
+            break
+
+        if not placed:
+            # Пробуем найти слот без проверки конфликтов между группами (как крайний вариант)
+            for day, time_slot in all_slots:
+                if week_schedule[(day, time_slot)]:
+                    continue
+
+                if daily_counts[day][(teacher, subject_name)] >= max_per_day:
+                    continue
+
+                if not is_teacher_available(teacher, day, time_slot, negative_filters):
+                    continue
+
+                # Размещаем даже если есть конфликт в других группах
+                lessons.append((day, time_slot, teacher, subject_name))
+                week_schedule[(day, time_slot)] = True
+                daily_counts[day][(teacher, subject_name)] += 1
+                print(
+                    f"⚠️ Размещено с возможным конфликтом: {teacher} - {subject_name} в день {day}, слот {time_slot}")
+                placed = True
+                break
+
+        if not placed:
+            print(f"❌ Не удалось разместить {teacher} - {subject_name}")
+
+    # Статистика распределения
+    occupied_count = sum(1 for occupied in week_schedule.values() if occupied)
+    print(f"📊 Занято слотов: {occupied_count}/{len(all_slots)}")
+
+    return lessons
+
+
+class ScheduleGenerator:
+    """Улучшенный генератор расписания с учетом ВСЕХ параметров.
+
+    Состояние расстановки живет только в локальных переменных вызова,
+    поэтому генерации разных групп выполняются параллельно; генерация и
+    правки одной группы сериализуются блокировкой locks.group.
+    """
+
+    async def generate_schedule(self, group_id: int = 1, attempts: int = 1,
+                                on_progress: Optional[ProgressCallback] = None,
+                                is_cancelled: Optional[Callable[[], bool]] = None) -> List[Lesson]:
+        """Главный метод генерации расписания.
+
+        attempts - число случайных расстановок, из которых берется лучшая
+        (см. score_placement). on_progress получает прогресс по фазам,
+        is_cancelled проверяется между попытками и перед сохранением.
+        """
+        async with locks.group(group_id):
+            phase_started = time.perf_counter()
+            print(f"🎯 Генерация расписания для группы {group_id}...")
+            if on_progress:
+                await on_progress({"phase": "preparing"})
+
+            # Получаем предметы
+            subjects = await subject_service.get_all_subjects(group_id)
+            print(f"📚 Найдено предметов: {len(subjects)}")
+
+            if not subjects:
+                print("❌ Нет предметов для генерации")
+                return []
+
+            # Получаем фильтры и занятость преподавателей в других группах
+            # (старые уроки этой группы на нее не влияют)
+            negative_filters = await negative_filters_service.get_negative_filters()
+            busy_slots = await self._fetch_busy_slots(group_id)
+
+            event_hub.publish("generation", group_id, status="started", subjects=len(subjects))
+            phase_started = self._end_phase("preparing", phase_started)
+
+            # Генерируем расписание
+            try:
+                lessons = await self.generate_with_all_params(
+                    subjects, negative_filters, group_id,
+                    attempts=attempts, on_progress=on_progress, is_cancelled=is_cancelled,
+                    busy_slots=busy_slots
+                )
+            except GenerationCancelled:
+                GENERATIONS.inc(status="cancelled")
+                event_hub.publish("generation", group_id, status="cancelled")
+                raise
+            except Exception as e:
+                GENERATIONS.inc(status="failed")
+                event_hub.publish("generation", group_id, status="failed", error=str(e))
+                raise
+            phase_started = self._end_phase("placing", phase_started)
+
+            if is_cancelled and is_cancelled():
+                GENERATIONS.inc(status="cancelled")
+                event_hub.publish("generation", group_id, status="cancelled")
+                raise GenerationCancelled()
+            if on_progress:
+                await on_progress({"phase": "saving", "pairs_placed": len(lessons)})
+
+            # Заменяем старое расписание новым одной транзакцией; часы предметов пересчитают триггеры
+            planned = len(lessons)
+            async with database.transaction() as conn:
+                lessons, clashes = await self._recheck_busy_slots(
+                    conn, group_id, lessons, busy_slots, subjects, negative_filters
+                )
+                await self.clear_schedule(group_id, conn)
+                await conn.executemany(
+                    'INSERT INTO lessons (day, time_slot, teacher, subject_name, editable, group_id) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(lesson.day, lesson.time_slot, lesson.teacher, lesson.subject_name, int(lesson.editable), group_id)
+                     for lesson in lessons]
+                )
+            PLACEMENT_CONFLICTS.inc(clashes)
+            PLACEMENT_FAILURES.inc(planned - len(lessons))
+            self._end_phase("saving", phase_started)
+            GENERATIONS.inc(status="finished")
+            event_hub.publish("generation", group_id, status="finished", lessons=len(lessons), clashes=clashes)
+
+            print(f"✅ Сгенерировано {len(lessons)} уроков (максимум 20)")
+            return lessons
+
+    @staticmethod
+    def _end_phase(phase: str, started: float) -> float:
+        """Записать длительность фазы в метрики и трассировку, вернуть начало следующей"""
+        now = time.perf_counter()
+        GENERATION_PHASE_DURATION.observe(now - started, phase=phase)
+        tracer.record_phase(f"generation:{phase}", now - started)
+        return now
+
+    async def _recheck_busy_slots(self, conn, group_id: int, lessons: List[Lesson],
+                                  planned_busy: Set[Tuple[str, int, int]], subjects: List[Subject],
+                                  negative_filters: Dict) -> Tuple[List[Lesson], int]:
+        """Перепроверить занятость преподавателей внутри транзакции записи.
+
+        Расстановка строится по занятости, прочитанной до нее; тем временем
+        генерация другой группы (в том числе в другом процессе) могла
+        сохранить пары тех же преподавателей. Под BEGIN IMMEDIATE чужая запись
+        ждет коммита, поэтому прочитанная здесь занятость окончательна. Пара,
+        попавшая на новое пересечение, переносится в свободный слот недели
+        (с учетом фильтров и max_per_day) или снимается. Пересечения, известные
+        при расстановке (запасной проход place_lessons), не трогаются.
+        Возвращает уроки для сохранения и число найденных пересечений.
+        """
+        teachers = sorted({lesson.teacher for lesson in lessons})
+        if not teachers:
+            return lessons, 0
+
+        cursor = await conn.execute(
+            f'SELECT teacher, day, time_slot FROM lessons '
+            f'WHERE group_id != ? AND teacher IN ({",".join("?" * len(teachers))})',
+            (group_id, *teachers)
         )
+        busy_now = {(row[0], row[1], row[2]) for row in await cursor.fetchall()}
+        new_busy = busy_now - planned_busy
+
+        kept, clashing = [], []
+        for lesson in lessons:
+            if (lesson.teacher, lesson.day, lesson.time_slot) in new_busy:
+                clashing.append(lesson)
+            else:
+                kept.append(lesson)
+        if not clashing:
+            return lessons, 0
 
-        # Восстанавливаем все часы
-        await database.execute(
-            '''UPDATE subjects 
-               SET remaining_hours = total_hours,
-                   remaining_pairs = total_hours / 2 
-               WHERE group_id = ?''',
+        max_per_day = {(subject.teacher, subject.subject_name): subject.max_per_day for subject in subjects}
+        occupied = {(lesson.day, lesson.time_slot) for lesson in kept}
+        daily_counts = defaultdict(int)  # (teacher, subject, day) -> count
+        for lesson in kept:
+            daily_counts[(lesson.teacher, lesson.subject_name, lesson.day)] += 1
+
+        for lesson in clashing:
+            key = (lesson.teacher, lesson.subject_name)
+            for day, time_slot in self._create_empty_schedule():
+                if ((day, time_slot) in occupied
+                        or daily_counts[(*key, day)] >= max_per_day.get(key, 1)
+                        or (lesson.teacher, day, time_slot) in busy_now
+                        or not is_teacher_available(lesson.teacher, day, time_slot, negative_filters)):
+                    continue
+                kept.append(Lesson(day=day, time_slot=time_slot, teacher=lesson.teacher,
+                                   subject_name=lesson.subject_name, editable=lesson.editable))
+                occupied.add((day, time_slot))
+                daily_counts[(*key, day)] += 1
+                print(f"🔀 Пересечение: {lesson.teacher} занят в день {lesson.day}, слот {lesson.time_slot} - "
+                      f"пара перенесена в день {day}, слот {time_slot}")
+                break
+            else:
+                print(f"❌ Пересечение: {lesson.teacher} занят в день {lesson.day}, слот {lesson.time_slot} - "
+                      f"пара {lesson.subject_name} снята")
+
+        kept.sort(key=lambda lesson: (lesson.day, lesson.time_slot))
+        return kept, len(clashing)
+
+    async def clear_schedule(self, group_id: int, conn):
+        """Очистить расписание группы (часы восстановят триггеры)"""
+        await conn.execute(
+            'DELETE FROM lessons WHERE group_id = ?',
             (group_id,)
         )
 
-    async def generate_with_all_params(self, subjects: List[Subject], negative_filters: Dict, group_id: int = 1) -> \
-    List[Lesson]:
+    async def generate_with_all_params(self, subjects: List[Subject], negative_filters: Dict, group_id: int = 1,
+                                       attempts: int = 1, on_progress: Optional[ProgressCallback] = None,
+                                       is_cancelled: Optional[Callable[[], bool]] = None,
+                                       busy_slots: Optional[Set[Tuple[str, int, int]]] = None) -> List[Lesson]:
         """Генерация с учетом ВСЕХ параметров"""
         print(f"⚡ Генерация с квотами для {len(subjects)} предметов")
 
@@ -88,7 +359,9 @@ class ScheduleGenerator:
         # 4. Распределяем пары по расписанию
         lessons = await self._fill_schedule(
             subject_distribution, subject_info, negative_filters,
-            group_id, week_schedule
+            group_id, week_schedule,
+            attempts=attempts, on_progress=on_progress, is_cancelled=is_cancelled,
+            busy_slots=busy_slots
         )
 
         return lessons
@@ -132,7 +405,8 @@ class ScheduleGenerator:
                 distribution[(teacher, subject_name)] = {
                     'pairs_to_assign': pairs_to_assign,
                     'max_per_day': info['max_per_day'],
-                    'priority': info['priority']
+                    'priority': info['priority'],
+                    'min_per_week': min_pairs
                 }
 
         # Сортируем по приоритету (высокий приоритет сначала)
@@ -154,136 +428,61 @@ class ScheduleGenerator:
 
     async def _fill_schedule(self, subject_distribution: Dict, subject_info: Dict,
                              negative_filters: Dict, group_id: int,
-                             week_schedule: Dict) -> List[Lesson]:
-        """Заполнить расписание парами"""
-        lessons = []
-
-        # Создаем список всех слотов
-        all_slots = list(week_schedule.keys())
-        random.shuffle(all_slots)  # Перемешиваем слоты
-
-        # Создаем список всех пар для распределения
-        all_pairs_to_place = []
-        for (teacher, subject_name), info in subject_distribution.items():
-            for _ in range(info['pairs_to_assign']):
-                all_pairs_to_place.append({
-                    'teacher': teacher,
-                    'subject_name': subject_name,
-                    'max_per_day': info['max_per_day'],
-                    'priority': info['priority']
+                             week_schedule: Dict, attempts: int = 1,
+                             on_progress: Optional[ProgressCallback] = None,
+                             is_cancelled: Optional[Callable[[], bool]] = None,
+                             busy_slots: Optional[Set[Tuple[str, int, int]]] = None) -> List[Lesson]:
+        """Заполнить расписание парами (расстановка выполняется в пуле процессов).
+
+        Каждая попытка - отдельная задача пула, поэтому отмена срабатывает
+        между попытками. Лучшая попытка выбирается по score_placement; поиск
+        завершается раньше, если все пары поставлены без пересечений, а дни
+        загружены равномерно (разница не больше одной пары).
+        """
+        if busy_slots is None:
+            busy_slots = await self._fetch_busy_slots(group_id)
+        slots = list(week_schedule.keys())
+        days = {day for day, _ in slots}
+        pairs_total = sum(info['pairs_to_assign'] for info in subject_distribution.values())
+
+        placed, best_score = [], None
+        for attempt in range(1, max(1, attempts) + 1):
+            if is_cancelled and is_cancelled():
+                raise GenerationCancelled()
+
+            candidate = await executors.run_in_process(
+                place_lessons, subject_distribution, negative_filters, slots, busy_slots
+            )
+            score = score_placement(candidate, subject_distribution, busy_slots, days)
+            if best_score is None or score > best_score:
+                placed, best_score = candidate, score
+
+            if on_progress:
+                await on_progress({
+                    "phase": "placing",
+                    "attempt": attempt,
+                    "attempts": attempts,
+                    "pairs_placed": len(placed),
+                    "pairs_total": pairs_total,
+                    "best_score": best_score
                 })
-
-        # Перемешиваем пары для лучшего распределения
-        random.shuffle(all_pairs_to_place)
-
-        # Счетчики для контроля max_per_day
-        daily_counts = defaultdict(lambda: defaultdict(int))  # day -> (teacher, subject) -> count
-
-        # Пытаемся разместить каждую пару
-        for pair_info in all_pairs_to_place:
-            teacher = pair_info['teacher']
-            subject_name = pair_info['subject_name']
-            max_per_day = pair_info['max_per_day']
-
-            placed = False
-
-            # Пробуем разместить в случайном порядке слотов
-            for day, time_slot in all_slots:
-                # Проверяем свободен ли слот
-                if week_schedule[(day, time_slot)]:
-                    continue
-
-                # Проверяем max_per_day
-                key = (teacher, subject_name)
-                if daily_counts[day][key] >= max_per_day:
-                    continue
-
-                # Проверяем доступность преподавателя
-                if not self._is_teacher_available(teacher, day, time_slot, negative_filters):
-                    continue
-
-                # Проверяем что преподаватель не занят в других группах
-                if not await self._is_teacher_free_across_groups(teacher, day, time_slot, group_id):
-                    continue
-
-                # Нашли подходящий слот - размещаем
-                lesson = Lesson(
-                    day=day,
-                    time_slot=time_slot,
-                    teacher=teacher,
-                    subject_name=subject_name,
-                    editable=True
-                )
-                lessons.append(lesson)
-                week_schedule[(day, time_slot)] = True  # Помечаем как занятый
-                daily_counts[day][key] += 1
-                placed = True
+            if best_score >= -1:
                 break
 
-            if not placed:
-                # Пробуем найти слот без проверки конфликтов между группами (как крайний вариант)
-                for day, time_slot in all_slots:
-                    if week_schedule[(day, time_slot)]:
-                        continue
-
-                    if daily_counts[day][(teacher, subject_name)] >= max_per_day:
-                        continue
-
-                    if not self._is_teacher_available(teacher, day, time_slot, negative_filters):
-                        continue
-
-                    # Размещаем даже если есть конфликт в других группах
-                    lesson = Lesson(
-                        day=day,
-                        time_slot=time_slot,
-                        teacher=teacher,
-                        subject_name=subject_name,
-                        editable=True
-                    )
-                    lessons.append(lesson)
-                    week_schedule[(day, time_slot)] = True
-                    daily_counts[day][(teacher, subject_name)] += 1
-                    print(
-                        f"⚠️ Размещено с возможным конфликтом: {teacher} - {subject_name} в день {day}, слот {time_slot}")
-                    placed = True
-                    break
-
-            if not placed:
-                print(f"❌ Не удалось разместить {teacher} - {subject_name}")
-
-        # Статистика распределения
-        occupied_count = sum(1 for occupied in week_schedule.values() if occupied)
-        print(f"📊 Занято слотов: {occupied_count}/20")
+        PLACEMENT_FAILURES.inc(pairs_total - len(placed))
 
-        return lessons
+        return [
+            Lesson(day=day, time_slot=time_slot, teacher=teacher, subject_name=subject_name, editable=True)
+            for day, time_slot, teacher, subject_name in placed
+        ]
 
-    def _is_teacher_available(self, teacher: str, day: int, time_slot: int, negative_filters: Dict) -> bool:
-        """Проверить доступность преподавателя"""
-        if teacher not in negative_filters:
-            return True
-
-        filters = negative_filters[teacher]
-
-        if day in filters.get('restricted_days', []):
-            return False
-
-        if time_slot in filters.get('restricted_slots', []):
-            return False
-
-        return True
-
-    async def _is_teacher_free_across_groups(self, teacher: str, day: int, time_slot: int,
-                                             current_group_id: int) -> bool:
-        """Проверить что преподаватель свободен в других группах"""
-        try:
-            existing = await database.fetch_one(
-                'SELECT id FROM lessons WHERE teacher = ? AND day = ? AND time_slot = ? AND group_id != ?',
-                (teacher, day, time_slot, current_group_id)
-            )
-            return existing is None
-        except Exception as e:
-            print(f"⚠️ Ошибка проверки преподавателя {teacher}: {e}")
-            return True
+    async def _fetch_busy_slots(self, group_id: int) -> Set[Tuple[str, int, int]]:
+        """Занятость преподавателей в других группах одним запросом: {(teacher, day, time_slot)}"""
+        rows = await database.fetch_all(
+            'SELECT teacher, day, time_slot FROM lessons WHERE group_id != ?',
+            (group_id,)
+        )
+        return {(row[0], row[1], row[2]) for row in rows}
 
     def _smart_distribute_pairs(self, subject_distribution: Dict, max_total_slots: int = 20) -> Dict:
         """Умное распределение пар с учетом приоритетов и ограничений"""
@@ -309,36 +508,6 @@ class ScheduleGenerator:
 
         return subject_distribution
 
-    async def update_hours_after_generation(self, lessons: List[Lesson], group_id: int):
-        """Обновить часы после генерации"""
-        pair_counts = defaultdict(int)
-
-        for lesson in lessons:
-            key = (lesson.teacher, lesson.subject_name)
-            pair_counts[key] += 1
-
-        for (teacher, subject_name), pair_count in pair_counts.items():
-            hours_to_subtract = pair_count * 2
-
-            # Находим предмет
-            subject = await database.fetch_one(
-                'SELECT id, remaining_hours FROM subjects WHERE teacher = ? AND subject_name = ? AND group_id = ?',
-                (teacher, subject_name, group_id)
-            )
-
-            if subject:
-                subject_id, current_hours = subject
-                new_hours = max(0, current_hours - hours_to_subtract)
-                new_pairs = new_hours // 2
-
-                await database.execute(
-                    '''UPDATE subjects 
-                       SET remaining_hours = ?,
-                           remaining_pairs = ?
-                       WHERE id = ?''',
-                    (new_hours, new_pairs, subject_id)
-                )
-
 
 # Глобальный экземпляр
 schedule_generator = ScheduleGenerator()
\ No newline at end of file
@@ -1,11 +1,46 @@
-from app.db.database import database
+from app.core.locks import locks
+from app.db.database import database, REMAINING_HOURS_EXPR
 from app.db.models import Subject
-from typing import List, Optional
+from app.services.data_version_service import data_version_service
+from typing import Dict, List, Optional, Tuple
 import json
 
 
+# Пересчет оставшихся часов предметов группы по фактически поставленным парам.
+# Обычно это делают триггеры на lessons; запрос нужен для ручного исправления.
+RECONCILE_HOURS_SQL = f'''
+    UPDATE subjects
+    SET remaining_hours = {REMAINING_HOURS_EXPR},
+        remaining_pairs = {REMAINING_HOURS_EXPR} / 2
+    WHERE group_id = ?
+'''
+
+# Верхняя граница недельной квоты (пар в неделю)
+MAX_PER_WEEK_LIMIT = 20
+
+
+def normalize_week_quotas(min_per_week: int, max_per_week: int) -> Tuple[int, int]:
+    """Привести недельные квоты к допустимому диапазону"""
+    if min_per_week < 0:
+        min_per_week = 0
+    if max_per_week > MAX_PER_WEEK_LIMIT:
+        max_per_week = MAX_PER_WEEK_LIMIT
+    if min_per_week > max_per_week:
+        min_per_week, max_per_week = max_per_week, min_per_week
+    return min_per_week, max_per_week
+
+
 # app/services/subject_services.py
 class SubjectService:
+    def __init__(self):
+        # Кэш списков предметов: group_id -> (версия subjects группы, List[Subject]).
+        # Версию увеличивают триггеры при любой записи, в том числе из других
+        # процессов, поэтому устаревшая запись кэша обнаруживается сама и
+        # сбрасывать кэш после записи не нужно
+        self._cache: Dict[int, Tuple[int, List[Subject]]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
     async def create_subject(self, teacher: str, subject_name: str, hours: int,
                              priority: int = 0, max_per_day: int = 2,
                              group_id: int = 1,
@@ -34,12 +69,7 @@ class SubjectService:
             raise ValueError("Предмет с таким названием уже существует у этого преподавателя в этой группе")
 
         # Валидация недельных квот
-        if min_per_week < 0:
-            min_per_week = 0
-        if max_per_week > 20:  # Увеличили максимум до 20
-            max_per_week = 20
-        if min_per_week > max_per_week:
-            min_per_week, max_per_week = max_per_week, min_per_week
+        min_per_week, max_per_week = normalize_week_quotas(min_per_week, max_per_week)
 
         # Рассчитываем пары (1 пара = 2 часа)
         remaining_pairs = hours // 2
@@ -86,36 +116,21 @@ class SubjectService:
             raise
 
     async def get_all_subjects(self, group_id: int = 1) -> List[Subject]:
-        """Получить все предметы группы"""
-        print(f"🔍 Загрузка предметов для группы {group_id}")
-
-        rows = await database.fetch_all(
-            '''SELECT id, teacher, subject_name, total_hours, remaining_hours, 
-                      remaining_pairs, priority, max_per_day,
-                      min_per_week, max_per_week
-               FROM subjects WHERE group_id = ? ORDER BY subject_name''',
-            (group_id,)
-        )
+        """Получить все предметы группы (с кэшированием по группе).
 
-        print(f"📊 Загружено предметов: {len(rows)}")
-        return [
-            Subject(
-                id=row[0],
-                teacher=row[1],
-                subject_name=row[2],
-                total_hours=row[3],
-                remaining_hours=row[4],
-                remaining_pairs=row[5],
-                priority=row[6],
-                max_per_day=row[7],
-                min_per_week=row[8],
-                max_per_week=row[9]
-            )
-            for row in rows
-        ]
+        Версия берется из памяти (data_version_service), поэтому попадание в
+        кэш не обращается к базе. Возвращаются копии: вызывающий код может
+        менять предметы, не портя кэш.
+        """
+        # Версию читаем до запроса: запись во время чтения сделает кэш устаревшим, а не ошибочным
+        version = await data_version_service.get_version('subjects', group_id)
+        cached = self._cache.get(group_id)
+        if cached is not None and cached[0] == version:
+            self.cache_hits += 1
+            return [subject.model_copy() for subject in cached[1]]
+
+        self.cache_misses += 1
 
-    async def get_all_subjects(self, group_id: int = 1) -> List[Subject]:
-        """Получить все предметы группы"""
         try:
             print(f"📚 Загрузка предметов для группы {group_id}")
 
@@ -144,7 +159,9 @@ class SubjectService:
                     max_per_week=row[9]
                 ))
 
-            return subjects
+            self._cache[group_id] = (version, subjects)
+
+            return [subject.model_copy() for subject in subjects]
 
         except Exception as e:
             print(f"❌ Ошибка загрузки предметов: {e}")
@@ -152,6 +169,16 @@ class SubjectService:
             print(f"❌ Traceback: {traceback.format_exc()}")
             return []  # Возвращаем пустой список вместо ошибки
 
+    def get_cache_stats(self) -> Dict:
+        """Статистика кэша предметов"""
+        total = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / total, 4) if total else 0.0,
+            "cached_groups": sorted(self._cache.keys())
+        }
+
     async def get_subject_by_name(self, teacher: str, subject_name: str, group_id: int = 1) -> Optional[Subject]:
         """Получить предмет по имени преподавателя и названию в группе"""
         try:
@@ -194,82 +221,18 @@ class SubjectService:
 
     async def get_negative_filters(self, group_id=None):  # Добавляем необязательный параметр
         """Получить ГЛОБАЛЬНЫЕ ограничения"""
-        try:
-            # Игнорируем group_id если передан, но используем глобальные фильтры
-            if group_id is not None:
-                print(f"⚠️  Внимание: get_negative_filters вызван с group_id={group_id}, но фильтры глобальные")
-
-            rows = await database.fetch_all(
-                'SELECT teacher, restricted_days, restricted_slots FROM negative_filters'
-            )
-
-            filters = {}
-            for row in rows:
-                teacher, days_json, slots_json = row
-                try:
-                    filters[teacher] = {
-                        "restricted_days": json.loads(days_json) if days_json else [],
-                        "restricted_slots": json.loads(slots_json) if slots_json else []
-                    }
-                except:
-                    filters[teacher] = {
-                        "restricted_days": [],
-                        "restricted_slots": []
-                    }
-
-            return filters
-        except Exception as e:
-            print(f"❌ Ошибка получения глобальных фильтров: {e}")
-            return {}
-
-    async def update_subject_hours(self, subject_id: int, delta_hours: int) -> bool:
-        """Обновить оставшиеся часы предмета (дельта может быть положительной или отрицательной)"""
-        try:
-            print(f"🔄 Обновление часов предмета {subject_id}: delta={delta_hours}")
-
-            # СНАЧАЛА получаем текущие значения
-            subject = await database.fetch_one(
-                'SELECT remaining_hours, total_hours FROM subjects WHERE id = ?',
-                (subject_id,)
-            )
-
-            if not subject:
-                print(f"❌ Предмет {subject_id} не найден")
-                return False
-
-            current_hours = subject[0]
-            total_hours = subject[1]
-
-            # Вычисляем новые значения
-            new_hours = current_hours - delta_hours  # delta_hours положительный = заняли пару
-
-            # Проверяем границы
-            if new_hours < 0:
-                new_hours = 0
-            if new_hours > total_hours:
-                new_hours = total_hours
-
-            # Вычисляем пары (1 пара = 2 часа)
-            new_pairs = new_hours // 2
-
-            print(f"📊 Текущие: {current_hours}ч, Новые: {new_hours}ч, Пар: {new_pairs}")
-
-            # Обновляем БД
-            result = await database.execute(
-                '''UPDATE subjects 
-                   SET remaining_hours = ?,
-                       remaining_pairs = ?
-                   WHERE id = ?''',
-                (new_hours, new_pairs, subject_id)
-            )
-
-            if result.rowcount > 0:
-                print(f"✅ Часы обновлены: {new_hours}ч, {new_pairs} пар")
-                return True
-            return False
-        except Exception as e:
-            print(f"❌ Ошибка обновления часов предмета {subject_id}: {e}")
-            return False
+        # Игнорируем group_id если передан, но используем глобальные фильтры
+        if group_id is not None:
+            print(f"⚠️  Внимание: get_negative_filters вызван с group_id={group_id}, но фильтры глобальные")
+
+        from app.services.negative_filters_service import negative_filters_service
+        return await negative_filters_service.get_negative_filters()
+
+    async def reconcile_hours(self, group_id: int) -> int:
+        """Принудительно пересчитать оставшиеся часы предметов группы по урокам"""
+        async with locks.group(group_id):
+            result = await database.execute(RECONCILE_HOURS_SQL, (group_id,))
+            return result.rowcount
 
 
 # Глобальный экземпляр
@@ -1,6 +1,19 @@
 from app.db.database import database
 from app.db.models import Teacher
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+TOTAL_DAYS = 7
+TOTAL_TIME_SLOTS = 4
+
+# Уроки преподавателей по всем группам (индекс idx_lessons_teacher_slot)
+TIMETABLE_QUERY = '''
+    SELECT t.id, t.name, l.day, l.time_slot, l.subject_name, l.group_id, g.name
+    FROM teachers t
+    LEFT JOIN lessons l ON l.teacher = t.name
+    LEFT JOIN study_groups g ON g.id = l.group_id
+    {where}
+    ORDER BY t.name, l.day, l.time_slot
+'''
 
 
 class TeacherService:
@@ -83,6 +96,48 @@ class TeacherService:
         )
         return row is not None
 
+    @staticmethod
+    def _build_timetables(rows) -> List[Dict]:
+        """Сетка день × пара для каждого преподавателя из строк TIMETABLE_QUERY.
+
+        Ячейка - список уроков (больше одного - конфликт между группами).
+        """
+        timetables: Dict[int, Dict] = {}
+        for teacher_id, name, day, time_slot, subject_name, group_id, group_name in rows:
+            timetable = timetables.get(teacher_id)
+            if timetable is None:
+                timetable = timetables[teacher_id] = {
+                    "teacher_id": teacher_id,
+                    "teacher": name,
+                    "grid": [[[] for _ in range(TOTAL_TIME_SLOTS)] for _ in range(TOTAL_DAYS)],
+                    "total_pairs": 0,
+                    "conflicts": []
+                }
+            if day is None or not (0 <= day < TOTAL_DAYS and 0 <= time_slot < TOTAL_TIME_SLOTS):
+                continue
+
+            cell = timetable["grid"][day][time_slot]
+            cell.append({"subject_name": subject_name, "group_id": group_id, "group_name": group_name})
+            timetable["total_pairs"] += 1
+            if len(cell) == 2:
+                timetable["conflicts"].append({"day": day, "time_slot": time_slot})
+
+        return list(timetables.values())
+
+    async def get_timetable(self, teacher_id: int) -> Optional[Dict]:
+        """Расписание преподавателя на неделю по всем группам (одним запросом)"""
+        rows = await database.fetch_all(
+            TIMETABLE_QUERY.format(where='WHERE t.id = ?'),
+            (teacher_id,)
+        )
+        timetables = self._build_timetables(rows)
+        return timetables[0] if timetables else None
+
+    async def get_all_timetables(self) -> List[Dict]:
+        """Расписания всех преподавателей (одним запросом)"""
+        rows = await database.fetch_all(TIMETABLE_QUERY.format(where=''))
+        return self._build_timetables(rows)
+
     async def get_teachers_for_group(self, group_id: int) -> List[Teacher]:
         """Получить преподавателей, которые ведут предметы в указанной группе"""
         rows = await database.fetch_all('''
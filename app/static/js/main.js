@@ -6,10 +6,15 @@ class ScheduleApp {
         this.teachers = [];
         this.subjects = [];
         this.lessons = [];
+        this.lessonsVersion = null; // Версия журнала изменений, которой соответствуют this.lessons
+        this.lessonsGroupId = null;
         this.savedSchedules = [];
         this.filters = [];
         this.groups = [];
         this.currentGroupId = 1; // По умолчанию основная группа
+        this.eventSource = null; // Поток событий об изменениях (SSE)
+        this.eventsGroupId = null;
+        this.pendingEventRefresh = {};
         this.init();
     }
 
@@ -23,10 +28,8 @@ class ScheduleApp {
             this.currentGroupId = parseInt(savedGroup);
         }
 
-        await this.loadInitialData();
-        this.renderSchedule();
+        // Все данные страницы приходят одним запросом /api/bootstrap
         await this.refreshAllData();
-        await this.updateStatistics();
     }
 
     setupEventListeners() {
@@ -691,9 +694,10 @@ class ScheduleApp {
     // ========== РАСПИСАНИЕ ==========
     async loadLessons() {
         try {
-            const response = await fetch(`/api/lessons?group_id=${this.currentGroupId}`);
+            // Загружаем только изменения с последней синхронизации (since=0 - все уроки)
+            const response = await fetch(`/api/lessons/changes?group_id=${this.currentGroupId}&since=${this.getLessonsSince()}`);
             if (response.ok) {
-                this.lessons = await response.json();
+                this.applyLessonChanges(await response.json());
                 this.renderSchedule();
             }
         } catch (error) {
@@ -701,6 +705,23 @@ class ScheduleApp {
         }
     }
 
+    getLessonsSince() {
+        return this.lessonsGroupId === this.currentGroupId && this.lessonsVersion !== null ? this.lessonsVersion : 0;
+    }
+
+    applyLessonChanges(delta) {
+        if (delta.reset || delta.since === 0 || this.lessonsGroupId !== delta.group_id) {
+            this.lessons = [...delta.inserted, ...delta.updated];
+        } else {
+            const lessonsById = new Map(this.lessons.map(lesson => [lesson.id, lesson]));
+            delta.deleted.forEach(id => lessonsById.delete(id));
+            [...delta.inserted, ...delta.updated].forEach(lesson => lessonsById.set(lesson.id, lesson));
+            this.lessons = Array.from(lessonsById.values());
+        }
+        this.lessonsVersion = delta.version;
+        this.lessonsGroupId = delta.group_id;
+    }
+
     renderSchedule() {
     const scheduleGrid = document.getElementById('scheduleGrid');
     const weekDays = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'];
@@ -921,34 +942,96 @@ showOccupiedContextMenu(e, cell) {
     async generateSchedule() {
         this.showLoading();
 
+        const loadingText = document.getElementById('loadingText');
+        const cancelButton = document.getElementById('cancelGeneration');
+
         try {
             console.log(`⚡ Генерация расписания для группы ${this.currentGroupId}`);
 
-            const response = await fetch(`/api/schedule/generate?group_id=${this.currentGroupId}`, {
+            // Генерация выполняется фоновой задачей; 409 - задача группы уже идет, следим за ней
+            const response = await fetch(`/api/jobs/generate?group_id=${this.currentGroupId}&attempts=5`, {
                 method: 'POST'
             });
-
-            if (!response.ok) {
-                const errorText = await response.text();
-                throw new Error(`HTTP ${response.status}: ${errorText}`);
+            const submitted = await response.json();
+            if (!response.ok && response.status !== 409) {
+                throw new Error(submitted.detail || `HTTP ${response.status}`);
             }
+            const jobId = submitted.job_id || submitted.id;
 
-            const result = await response.json();
+            cancelButton.style.display = 'inline-block';
+            cancelButton.onclick = () => {
+                loadingText.textContent = 'Отмена генерации...';
+                fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST' });
+            };
 
-            if (result.success) {
-                this.showSuccess(`Сгенерировано ${result.lessons.length} пар для группы ${this.getCurrentGroupName()}`);
+            const job = await this.waitForJob(jobId, (progress) => {
+                loadingText.textContent = this.formatJobProgress(progress);
+            });
+
+            if (job.status === 'succeeded') {
+                this.showSuccess(`Сгенерировано ${job.progress.pairs_placed} пар для группы ${this.getCurrentGroupName()}`);
                 await this.refreshAllData();
+            } else if (job.status === 'cancelled') {
+                this.showError('Генерация отменена');
             } else {
-                throw new Error(result.detail || 'Ошибка генерации');
+                throw new Error(job.error || 'Ошибка генерации');
             }
         } catch (error) {
             console.error('❌ Ошибка генерации:', error);
             this.showError('Ошибка генерации: ' + error.message);
         } finally {
+            cancelButton.style.display = 'none';
+            cancelButton.onclick = null;
+            loadingText.textContent = 'Генерация расписания...';
             this.hideLoading();
         }
     }
 
+    waitForJob(jobId, onProgress) {
+        // Прогресс приходит потоком SSE; без EventSource опрашиваем состояние задачи
+        const terminal = ['succeeded', 'failed', 'cancelled'];
+        return new Promise((resolve, reject) => {
+            if (!window.EventSource) {
+                const poll = async () => {
+                    try {
+                        const job = await (await fetch(`/api/jobs/${jobId}`)).json();
+                        onProgress(job.progress || {});
+                        terminal.includes(job.status) ? resolve(job) : setTimeout(poll, 500);
+                    } catch (error) {
+                        reject(error);
+                    }
+                };
+                poll();
+                return;
+            }
+
+            const source = new EventSource(`/api/jobs/${jobId}/events`);
+            source.addEventListener('job', (e) => {
+                const event = JSON.parse(e.data);
+                onProgress(event.progress || {});
+                if (terminal.includes(event.status)) {
+                    source.close();
+                    resolve(event);
+                }
+            });
+            source.onerror = () => {
+                // Поток закрыт сервером - берем итоговое состояние задачи
+                source.close();
+                fetch(`/api/jobs/${jobId}`).then(r => r.json()).then(job => {
+                    terminal.includes(job.status) ? resolve(job) : this.waitForJob(jobId, onProgress).then(resolve, reject);
+                }).catch(reject);
+            };
+        });
+    }
+
+    formatJobProgress(progress) {
+        if (progress.phase === 'placing') {
+            return `Попытка ${progress.attempt} из ${progress.attempts}: размещено ${progress.pairs_placed} из ${progress.pairs_total} пар (оценка ${progress.best_score})`;
+        }
+        if (progress.phase === 'saving') return 'Сохранение расписания...';
+        return 'Генерация расписания...';
+    }
+
     // ========== ФИЛЬТРЫ ==========
     async loadFilters() {
         try {
@@ -1234,38 +1317,115 @@ showOccupiedContextMenu(e, cell) {
         }
     }
 
+    // ========== СОБЫТИЯ (SSE) ==========
+    subscribeEvents() {
+        if (!window.EventSource) return;
+        if (this.eventSource && this.eventsGroupId === this.currentGroupId) return;
+        if (this.eventSource) this.eventSource.close();
+
+        this.eventsGroupId = this.currentGroupId;
+        this.eventSource = new EventSource(`/api/events?group_id=${this.currentGroupId}`);
+
+        const handlers = {
+            lessons: () => this.loadLessons(),
+            subjects: () => Promise.all([this.loadSubjects(), this.updateStatistics()]),
+            filters: () => this.loadFilters(),
+            teachers: () => this.loadTeachers(),
+            groups: () => this.loadGroups(),
+            saved_schedules: () => this.loadSavedSchedules(),
+            resync: () => this.refreshAllData()
+        };
+        Object.entries(handlers).forEach(([type, handler]) => {
+            this.eventSource.addEventListener(type, () => this.scheduleEventRefresh(type, handler));
+        });
+
+        // После переподключения пропущенные события неизвестны - загружаем все заново
+        let connected = false;
+        this.eventSource.addEventListener('hello', () => {
+            if (connected) this.scheduleEventRefresh('resync', handlers.resync);
+            connected = true;
+        });
+
+        this.eventSource.addEventListener('generation', (e) => {
+            const event = JSON.parse(e.data);
+            console.log(`⚙️ Генерация группы ${event.group_id}: ${event.status}`, event);
+        });
+    }
+
+    scheduleEventRefresh(type, handler) {
+        // Несколько событий подряд - одна загрузка
+        if (this.pendingEventRefresh[type]) return;
+        this.pendingEventRefresh[type] = setTimeout(async () => {
+            delete this.pendingEventRefresh[type];
+            try {
+                await handler();
+            } catch (error) {
+                console.error(`Error handling event ${type}:`, error);
+            }
+        }, 200);
+    }
+
     // ========== СТАТИСТИКА ==========
     async updateStatistics() {
         try {
             const response = await fetch(`/api/statistics?group_id=${this.currentGroupId}`);
             if (response.ok) {
-                const stats = await response.json();
-
-                // Обновляем все параметры
-                document.getElementById('statSubjects').textContent = stats.total_subjects;
-                document.getElementById('statTotalHours').textContent = stats.total_hours;
-                document.getElementById('statRemainingHours').textContent = stats.remaining_hours;
-
-                console.log(`📊 Статистика обновлена для группы ${this.currentGroupId}:`, stats);
+                this.renderStatistics(await response.json());
             }
         } catch (error) {
             console.error('Error loading statistics:', error);
         }
     }
 
+    renderStatistics(stats) {
+        // Обновляем все параметры
+        document.getElementById('statSubjects').textContent = stats.total_subjects;
+        document.getElementById('statTotalHours').textContent = stats.total_hours;
+        document.getElementById('statRemainingHours').textContent = stats.remaining_hours;
+
+        console.log(`📊 Статистика обновлена для группы ${this.currentGroupId}:`, stats);
+    }
+
     // ========== ВСПОМОГАТЕЛЬНЫЕ МЕТОДЫ ==========
     async refreshAllData() {
         try {
-            await Promise.all([
-                this.loadSubjects(),
-                this.loadLessons(),
-                this.loadFilters(),
-                this.loadSavedSchedules(),
-                this.updateStatistics()
-            ]);
+            // Один запрос вместо шести: сервер собирает данные параллельно
+            // Уроки текущей группы уже загружены - просим только изменения
+            const since = this.getLessonsSince();
+            const lessonsParam = since > 0 ? `&lessons_since=${since}` : '';
+            const response = await fetch(`/api/bootstrap?group_id=${this.currentGroupId}${lessonsParam}`);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const bundle = await response.json();
+
+            this.groups = bundle.groups;
+            this.teachers = bundle.teachers;
+            this.subjects = bundle.subjects;
+            if (bundle.lesson_changes) {
+                this.applyLessonChanges(bundle.lesson_changes);
+            } else {
+                this.lessons = bundle.lessons;
+                this.lessonsVersion = bundle.lessons_version;
+                this.lessonsGroupId = bundle.group_id;
+            }
+            this.filters = bundle.negative_filters;
+            this.savedSchedules = bundle.saved_schedules;
+
+            this.renderGroupSelector();
+            this.populateTeacherSelects();
+            this.renderTeachersList();
+            this.renderSubjectsList();
+            this.renderFiltersList();
+            this.renderSavedSchedulesList();
             this.renderSchedule();
+            this.renderStatistics(bundle.statistics);
+            this.subscribeEvents();
         } catch (error) {
-            console.error('Error refreshing data:', error);
+            console.error('Error refreshing data, loading separately:', error);
+            await this.loadInitialData();
+            this.renderSchedule();
+            await this.updateStatistics();
         }
     }
 
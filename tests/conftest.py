@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from app.core.executors import executors
+from app.core.locks import locks, _SharedExclusiveLock
+from app.db.database import database
+from app.services.data_version_service import data_version_service
+from app.services.negative_filters_service import negative_filters_service
+from app.services.subject_services import subject_service
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Пустая БД во временном каталоге (путь к файлу БД относительный).
+
+    Кэши и блокировки глобальных экземпляров сбрасываются: каждый тест
+    выполняется в своем event loop и на своей базе.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "_initialized", False)
+    monkeypatch.setattr(data_version_service, "_stale", True)
+    monkeypatch.setattr(subject_service, "_cache", {})
+    monkeypatch.setattr(locks, "_global", _SharedExclusiveLock())
+    monkeypatch.setattr(locks, "_groups", {})
+    negative_filters_service.invalidate_cache()
+    yield
+    asyncio.run(database.close())
+    executors.shutdown()
@@ -0,0 +1,115 @@
+import asyncio
+
+from app.db.database import database
+from app.services.manual_schedule_service import manual_schedule_service
+from app.services.schedule_services import schedule_service
+from app.services.subject_services import subject_service
+from app.services.teacher_service import teacher_service
+
+
+async def seed():
+    """Группа 1: Иванов/Матан в (0, 0) и (1, 0), Петров/Физика в (0, 1)"""
+    await database.init_db()
+    await teacher_service.create_teacher("Иванов")
+    await teacher_service.create_teacher("Петров")
+    await subject_service.create_subject("Иванов", "Матан", 20)
+    await subject_service.create_subject("Петров", "Физика", 10)
+
+    for day, time_slot, teacher, subject_name in [(0, 0, "Иванов", "Матан"),
+                                                  (0, 1, "Петров", "Физика"),
+                                                  (1, 0, "Иванов", "Матан")]:
+        result = await manual_schedule_service.add_lesson(day, time_slot, teacher, subject_name, 1)
+        assert result["success"], result["message"]
+
+
+async def lessons():
+    """(day, time_slot) -> (id, teacher, subject_name)"""
+    rows = await database.fetch_all(
+        'SELECT day, time_slot, id, teacher, subject_name FROM lessons WHERE group_id = 1'
+    )
+    return {(row[0], row[1]): tuple(row[2:]) for row in rows}
+
+
+def test_invalid_operation_rolls_back_whole_batch(fresh_db):
+    """Одна недопустимая операция отменяет весь пакет"""
+    async def scenario():
+        await seed()
+        before = await lessons()
+        result = await manual_schedule_service.apply_batch(1, [
+            {"op": "delete", "day": 0, "time_slot": 0},
+            {"op": "move", "day": 1, "time_slot": 0, "to_day": 2, "to_time_slot": 0},
+            {"op": "add", "day": 3, "time_slot": 0, "teacher": "Сидоров", "subject_name": "Матан"},
+        ])
+        return before, result, await lessons()
+
+    before, result, after = asyncio.run(scenario())
+
+    assert not result["success"]
+    assert not result["applied"]
+    assert [r["success"] for r in result["results"]] == [True, True, False]
+    assert after == before
+
+
+def test_dry_run_does_not_write(fresh_db):
+    """dry_run проверяет пакет, но ничего не записывает"""
+    async def scenario():
+        await seed()
+        before = await lessons()
+        result = await manual_schedule_service.apply_batch(1, [
+            {"op": "move", "day": 0, "time_slot": 0, "to_day": 2, "to_time_slot": 0},
+            {"op": "add", "day": 3, "time_slot": 0, "teacher": "Петров", "subject_name": "Физика"},
+        ], dry_run=True)
+        return before, result, await lessons()
+
+    before, result, after = asyncio.run(scenario())
+
+    assert result["success"]
+    assert not result["applied"]
+    assert after == before
+
+
+def test_move_and_swap_keep_lesson_ids(fresh_db):
+    """Перенос и обмен в пакете обновляют строки на месте, а не пересоздают их"""
+    async def scenario():
+        await seed()
+        before = await lessons()
+        since = await schedule_service.get_lessons_version()
+        result = await manual_schedule_service.apply_batch(1, [
+            {"op": "move", "day": 0, "time_slot": 0, "to_day": 2, "to_time_slot": 0},
+            {"op": "swap", "day": 0, "time_slot": 1, "to_day": 1, "to_time_slot": 0},
+        ])
+        changes = await schedule_service.get_lesson_changes(1, since)
+        return before, result, await lessons(), changes
+
+    before, result, after, changes = asyncio.run(scenario())
+
+    assert result["applied"], result["message"]
+    # Перенесенный урок сохранил id
+    assert after[(2, 0)] == before[(0, 0)]
+    assert (0, 0) not in after
+    # При обмене строки остаются в своих ячейках, меняется содержимое
+    assert after[(0, 1)] == (before[(0, 1)][0],) + before[(1, 0)][1:]
+    assert after[(1, 0)] == (before[(1, 0)][0],) + before[(0, 1)][1:]
+
+    assert not changes["inserted"] and not changes["deleted"]
+    assert {lesson["id"] for lesson in changes["updated"]} == {
+        before[(0, 0)][0], before[(0, 1)][0], before[(1, 0)][0]
+    }
+
+
+def test_moves_in_a_cycle(fresh_db):
+    """Уроки, переставленные по кругу, получают свои ячейки без нарушения UNIQUE"""
+    async def scenario():
+        await seed()
+        before = await lessons()
+        result = await manual_schedule_service.apply_batch(1, [
+            {"op": "move", "day": 0, "time_slot": 0, "to_day": 3, "to_time_slot": 0},
+            {"op": "move", "day": 0, "time_slot": 1, "to_day": 0, "to_time_slot": 0},
+            {"op": "move", "day": 3, "time_slot": 0, "to_day": 0, "to_time_slot": 1},
+        ])
+        return before, result, await lessons()
+
+    before, result, after = asyncio.run(scenario())
+
+    assert result["applied"], result["message"]
+    assert after == {(0, 0): before[(0, 1)], (0, 1): before[(0, 0)], (1, 0): before[(1, 0)]}
@@ -0,0 +1,41 @@
+import asyncio
+from collections import Counter
+
+from app.db.database import database
+from app.services.group_service import group_service
+from app.services.shedule_generator import schedule_generator
+from app.services.subject_services import subject_service
+from app.services.teacher_service import teacher_service
+
+
+def test_parallel_generations_do_not_double_book_shared_teacher(fresh_db):
+    """Генерации двух групп с общим преподавателем не ставят его в один слот дважды.
+
+    Обе генерации читают занятость до того, как другая сохранит уроки,
+    поэтому без перепроверки при записи пересечения почти неизбежны.
+    """
+    async def scenario():
+        await database.init_db()
+        await teacher_service.create_teacher("Иванов")
+        await teacher_service.create_teacher("Петров")
+        second_group = await group_service.create_group("Группа 2")
+
+        group_ids = [1, second_group.id]
+        for group_id in group_ids:
+            await subject_service.create_subject("Иванов", "Матан", 20, group_id=group_id)
+            await subject_service.create_subject("Петров", "Физика", 8, group_id=group_id)
+
+        results = await asyncio.gather(*(
+            schedule_generator.generate_schedule(group_id) for group_id in group_ids
+        ))
+        rows = await database.fetch_all('SELECT teacher, day, time_slot, group_id FROM lessons')
+        return results, rows
+
+    results, rows = asyncio.run(scenario())
+
+    assert all(results), "обе группы должны получить расписание"
+    assert {row[3] for row in rows} == {1, 2}
+
+    busy = Counter((row[0], row[1], row[2]) for row in rows)
+    double_booked = {slot: count for slot, count in busy.items() if count > 1}
+    assert not double_booked
@@ -0,0 +1,90 @@
+import asyncio
+import sys
+
+from app.db.database import database
+from app.services.manual_schedule_service import manual_schedule_service
+from app.services.schedule_services import schedule_service
+from app.services.subject_services import subject_service
+from app.services.teacher_service import teacher_service
+
+
+async def seed():
+    """Группа 1 с одним уроком Иванов/Матан в (0, 0); возвращает его id"""
+    await database.init_db()
+    await teacher_service.create_teacher("Иванов")
+    await subject_service.create_subject("Иванов", "Матан", 20)
+    return await add(0, 0)
+
+
+async def add(day, time_slot):
+    result = await manual_schedule_service.add_lesson(day, time_slot, "Иванов", "Матан", 1)
+    assert result["success"], result["message"]
+    return result["lesson_id"]
+
+
+def test_several_changes_collapse_to_first_operation(fresh_db):
+    """Урок, добавленный и затем перенесенный, отдается как добавленный в текущей ячейке"""
+    async def scenario():
+        existing_id = await seed()
+        since = await schedule_service.get_lessons_version()
+
+        added_id = await add(0, 1)
+        assert (await manual_schedule_service.move_lesson(0, 1, 2, 1, 1))["success"]
+        assert (await manual_schedule_service.move_lesson(0, 0, 3, 0, 1))["success"]
+        assert (await manual_schedule_service.move_lesson(3, 0, 3, 2, 1))["success"]
+
+        return existing_id, added_id, await schedule_service.get_lesson_changes(1, since)
+
+    existing_id, added_id, changes = asyncio.run(scenario())
+
+    assert not changes["reset"]
+    assert [(l["id"], l["day"], l["time_slot"]) for l in changes["inserted"]] == [(added_id, 2, 1)]
+    assert [(l["id"], l["day"], l["time_slot"]) for l in changes["updated"]] == [(existing_id, 3, 2)]
+    assert changes["deleted"] == []
+
+
+def test_lesson_added_and_deleted_in_window_is_dropped(fresh_db):
+    """Урок, добавленный и удаленный после since, в ответ не попадает"""
+    async def scenario():
+        existing_id = await seed()
+        since = await schedule_service.get_lessons_version()
+
+        await add(1, 1)
+        assert (await manual_schedule_service.delete_lesson(1, 1, 1))["success"]
+        assert (await manual_schedule_service.delete_lesson(0, 0, 1))["success"]
+
+        return existing_id, await schedule_service.get_lesson_changes(1, since)
+
+    existing_id, changes = asyncio.run(scenario())
+
+    assert not changes["reset"]
+    assert changes["inserted"] == [] and changes["updated"] == []
+    assert changes["deleted"] == [existing_id]
+
+
+def test_reset_after_log_is_pruned(fresh_db, monkeypatch):
+    """Если журнал обрезан до since, отдается полный список уроков с reset=True"""
+    # Глубина журнала подставляется в триггер обрезки при init_db
+    monkeypatch.setattr(sys.modules["app.db.database"], "LESSON_CHANGES_KEEP", 10)
+
+    async def scenario():
+        lesson_id = await seed()
+        since = await schedule_service.get_lessons_version()
+
+        # 1000 изменений: на версии 1000 триггер удаляет все записи старше последних 10
+        async with database.transaction() as conn:
+            for i in range(1000):
+                await conn.execute('UPDATE lessons SET editable = ? WHERE id = ?', (i % 2, lesson_id))
+
+        version = await schedule_service.get_lessons_version()
+        return (lesson_id, await schedule_service.get_lesson_changes(1, since),
+                await schedule_service.get_lesson_changes(1, version - 5))
+
+    lesson_id, stale, recent = asyncio.run(scenario())
+
+    assert stale["reset"]
+    assert [lesson["id"] for lesson in stale["inserted"]] == [lesson_id]
+    assert stale["updated"] == [] and stale["deleted"] == []
+
+    assert not recent["reset"]
+    assert [lesson["id"] for lesson in recent["updated"]] == [lesson_id]
@@ -0,0 +1,100 @@
+import asyncio
+
+from app.db.database import database
+from app.services.group_service import group_service
+from app.services.manual_schedule_service import manual_schedule_service
+from app.services.negative_filters_service import negative_filters_service
+from app.services.subject_services import subject_service
+from app.services.teacher_service import teacher_service
+
+
+async def seed(lessons):
+    """Иванов/Матан и Петров/Физика (не больше 1 пары в день) в группе 1"""
+    await database.init_db()
+    await teacher_service.create_teacher("Иванов")
+    await teacher_service.create_teacher("Петров")
+    await subject_service.create_subject("Иванов", "Матан", 20)
+    await subject_service.create_subject("Петров", "Физика", 10, max_per_day=1)
+
+    for day, time_slot, teacher, subject_name in lessons:
+        result = await manual_schedule_service.add_lesson(day, time_slot, teacher, subject_name, 1)
+        assert result["success"], result["message"]
+
+
+async def lessons(group_id=1):
+    """(day, time_slot) -> (id, teacher, subject_name)"""
+    rows = await database.fetch_all(
+        'SELECT day, time_slot, id, teacher, subject_name FROM lessons WHERE group_id = ?', (group_id,)
+    )
+    return {(row[0], row[1]): tuple(row[2:]) for row in rows}
+
+
+def test_move_onto_slot_where_teacher_is_busy_in_another_group(fresh_db):
+    """Перенос в ячейку, где преподаватель ведет пару в другой группе, отклоняется"""
+    async def scenario():
+        await seed([(0, 0, "Иванов", "Матан")])
+        second_group = await group_service.create_group("Группа 2")
+        await subject_service.create_subject("Иванов", "Матан", 20, group_id=second_group.id)
+        added = await manual_schedule_service.add_lesson(2, 0, "Иванов", "Матан", second_group.id)
+        assert added["success"], added["message"]
+
+        before = await lessons()
+        result = await manual_schedule_service.move_lesson(0, 0, 2, 0, 1)
+        return second_group.id, before, result, await lessons()
+
+    second_group_id, before, result, after = asyncio.run(scenario())
+
+    assert not result["success"]
+    assert f"группе {second_group_id}" in result["message"]
+    assert after == before
+
+
+def test_swap_exceeding_max_per_day_is_rejected(fresh_db):
+    """Обмен, после которого предмет превысит max_per_day, отклоняется"""
+    async def scenario():
+        await seed([(0, 0, "Петров", "Физика"),
+                    (1, 0, "Петров", "Физика"),
+                    (1, 1, "Иванов", "Матан")])
+        before = await lessons()
+        # Физика из (0, 0) попала бы во вторник ко второй Физике
+        result = await manual_schedule_service.swap_lessons(0, 0, 1, 1, 1)
+        return before, result, await lessons()
+
+    before, result, after = asyncio.run(scenario())
+
+    assert not result["success"]
+    assert "лимит 1 пар в день" in result["message"]
+    assert after == before
+
+
+def test_swap_into_restricted_day_is_rejected(fresh_db):
+    """Обмен, ставящий преподавателя в запрещенный для него день, отклоняется"""
+    async def scenario():
+        await seed([(0, 0, "Петров", "Физика"),
+                    (1, 1, "Иванов", "Матан")])
+        assert await negative_filters_service.save_negative_filter("Петров", [1], [])
+        before = await lessons()
+        result = await manual_schedule_service.swap_lessons(1, 1, 0, 0, 1)
+        return before, result, await lessons()
+
+    before, result, after = asyncio.run(scenario())
+
+    assert not result["success"]
+    assert result["message"] == "Преподаватель недоступен в этот день недели"
+    assert after == before
+
+
+def test_swap_without_conflicts_exchanges_lessons(fresh_db):
+    """Допустимый обмен меняет содержимое ячеек, сохраняя их строки"""
+    async def scenario():
+        await seed([(0, 0, "Петров", "Физика"),
+                    (1, 1, "Иванов", "Матан")])
+        before = await lessons()
+        result = await manual_schedule_service.swap_lessons(0, 0, 1, 1, 1)
+        return before, result, await lessons()
+
+    before, result, after = asyncio.run(scenario())
+
+    assert result["success"], result["message"]
+    assert after[(0, 0)] == (before[(0, 0)][0], "Иванов", "Матан")
+    assert after[(1, 1)] == (before[(1, 1)][0], "Петров", "Физика")